@@ -0,0 +1,69 @@
+import argparse
+import json
+import time
+
+from frame_packet import FramePacket, FrameBufferPool
+from video_feed.video_csi_reader import VideoCSIReader
+
+# Run from the repository root, on any Linux box with the GStreamer python bindings (python3-gi):
+#   python -m benchmarks.camera_sink_benchmark --source test --frames 300
+# and on the Jetson with --source csi.
+#
+# Compares the camera delivering only the BGR frame, with the detector / face / preview images made on the CPU
+# from it, against the tee'd pipeline delivering every image from its own appsink. Reports the frame rate and
+# the CPU time per frame of the sight process
+
+
+def run(source, variants, tee, num_frames, width, height, fps):
+    reader = VideoCSIReader(capture_width=width, capture_height=height, capture_fps=fps,
+                            variants=variants if tee else None, source=source)
+    if tee and reader.frame_variants() != variants:
+        raise RuntimeError("The GStreamer python bindings are needed for the tee'd pipeline")
+
+    pool = FrameBufferPool()
+    packet = None
+
+    start_wall = time.monotonic()
+    start_cpu = time.process_time()
+
+    for _ in range(num_frames):
+        frame = reader.read_frame()
+        if frame is None:
+            break
+
+        if packet is not None:
+            packet.release()
+        packet = FramePacket(frame, pool)
+        for (variant_width, variant_height, color), image in reader.read_variants().items():
+            packet.add_variant(image, variant_width, variant_height, color)
+
+        # What the consumers ask for every frame
+        for variant_width, variant_height, color in variants:
+            packet.resized(variant_width, variant_height, color)
+
+    wall = time.monotonic() - start_wall
+    cpu = time.process_time() - start_cpu
+
+    return {"pipeline": "tee" if tee else "single_sink",
+            "frames": num_frames,
+            "fps": num_frames / wall,
+            "cpu_ms_per_frame": cpu * 1000 / num_frames}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU cost of the camera image conversions")
+    parser.add_argument("--source", choices=["test", "csi", "usb"], default="test")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=400)
+    parser.add_argument("--height", type=int, default=300)
+    parser.add_argument("--fps", type=int, default=30)
+    args = parser.parse_args()
+
+    # Detector input (jetnet), face input, preview thumbnail and motion thumbnail
+    variants = [(args.width, args.height, "rgba"), (args.width, args.height, "rgb"),
+                (args.width // 2, args.height // 2, "bgr"), (32, 24, "gray")]
+
+    results = [run(args.source, variants, tee, args.frames, args.width, args.height, args.fps)
+               for tee in [False, True]]
+
+    print(json.dumps(results, indent=4))
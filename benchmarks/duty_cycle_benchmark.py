@@ -0,0 +1,103 @@
+import argparse
+import json
+import resource
+import time
+
+from brain_state import BrainState
+from const import Const
+from object_captured import ObjectName
+from vision_duty_cycle import VisionDutyCycle
+from benchmarks.object_detection_benchmark import _load_frames, _create_backend
+
+# Run from the repository root:
+#   python -m benchmarks.duty_cycle_benchmark idle_room.mp4 --backend cpu --brain-state Idle
+#
+# Replays a recording paced at the capture frame rate, once with every frame going through the object detector
+# and once gated by the VisionDutyCycle, and reports the process CPU time of both runs and the CPU time the gated run
+# saves against the always on one.
+# The clip should be what the robot sees while idle: mostly the empty room, with somebody passing now and then.
+# A clip with a person in every frame keeps the gated run active all the time and saves nothing
+
+
+def _cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(frames, detector, fps, brain_state, gated):
+    duty_cycle = VisionDutyCycle() if gated else None
+    if duty_cycle is not None:
+        duty_cycle.set_brain_state(brain_state)
+
+    frame_period = 1.0 / fps
+    people_in_view = False
+    num_captured = 0
+    num_detections = 0
+    next_capture_time = 0.0
+
+    cpu_start = _cpu_time()
+    wall_start = time.monotonic()
+
+    for frame_idx, frame in enumerate(frames):
+        # Pace the replay like a live camera
+        frame_time = wall_start + frame_idx * frame_period
+        wait_time = frame_time - time.monotonic()
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+        # While gated the capture thread only hands over a frame every frame_interval()
+        if frame_time < next_capture_time:
+            continue
+        num_captured += 1
+
+        if duty_cycle is not None:
+            active = duty_cycle.update(frame, people_in_view)
+            next_capture_time = frame_time + duty_cycle.frame_interval() - frame_period / 2
+        else:
+            active = True
+
+        if active:
+            frame_captured = detector.detect_batch([frame])[0]
+            people_in_view = len(frame_captured.getObjects(ObjectName.Person)) > 0
+            num_detections += 1
+
+    wall_time = time.monotonic() - wall_start
+    cpu_time = _cpu_time() - cpu_start
+
+    result = {"gated": gated,
+              "frames": len(frames),
+              "captured_frames": num_captured,
+              "detections": num_detections,
+              "wall_time_s": wall_time,
+              "cpu_time_s": cpu_time,
+              "cpu_utilisation": cpu_time / wall_time}
+
+    if duty_cycle is not None:
+        result["active_ticks"] = duty_cycle.active_ticks
+        result["gated_ticks"] = duty_cycle.gated_ticks
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU time of the vision loop with and without the duty cycle")
+    parser.add_argument("clip")
+    parser.add_argument("--backend", default="cpu")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--fps", type=float, default=Const.CaptureFPS)
+    parser.add_argument("--brain-state", default=BrainState.Idle,
+                        choices=[BrainState.Idle, BrainState.Engaging, BrainState.Conversing])
+    parser.add_argument("--max-frames", type=int, default=300)
+    args = parser.parse_args()
+
+    frames = _load_frames(args.clip, args.max_frames)
+    detector = _create_backend(args.backend, args.threads, 1, 300)
+
+    always_on = run(frames, detector, args.fps, args.brain_state, gated=False)
+    gated = run(frames, detector, args.fps, args.brain_state, gated=True)
+
+    print(json.dumps({"always_on": always_on,
+                      "gated": gated,
+                      "detections_saved": always_on["detections"] - gated["detections"],
+                      "cpu_saving": 1.0 - gated["cpu_time_s"] / always_on["cpu_time_s"]
+                      if always_on["cpu_time_s"] > 0 else None}, indent=4))
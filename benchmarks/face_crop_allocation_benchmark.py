@@ -0,0 +1,88 @@
+import argparse
+import json
+import pickle
+import tracemalloc
+import numpy as np
+
+from benchmarks.object_detection_benchmark import _load_frames
+from face_detection import FaceDetection
+from frame_packet import FramePacket, FrameBufferPool
+from person import Person
+
+# Run from the repository root:
+#   python -m benchmarks.face_crop_allocation_benchmark recording.mp4 --frames 100
+#
+# Steady state memory allocated per frame by face detection and the Person built from its focus face, as in
+# the sight loop. "full_frame" keeps the whole RGB frame as the face image like before, "crop" the pooled face
+# crops FaceDetection takes now. Also reports what a face costs to send back from the face recognition worker
+
+
+def _largest_face(faces):
+    if len(faces) == 0:
+        return None
+
+    return max(faces, key=lambda face: face.bounding_box.width() * face.bounding_box.height())
+
+
+def run(face_detection, frames, keep_full_frame, warmup):
+    frame_pool = FrameBufferPool()
+    packet = None
+    person = None
+    faces = []
+    allocated = []
+    pickled_sizes = []
+
+    tracemalloc.start()
+
+    for idx, frame in enumerate(frames):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+        # The previous frame is done with, as in SightObjectDetection.detect
+        if packet is not None:
+            packet.release()
+        packet = FramePacket(frame, frame_pool)
+
+        faces = face_detection.detect(packet)
+        if keep_full_frame:
+            # What the faces held before: the RGB frame, kept away from the pool
+            rgb = packet.rgb()
+            packet.retain(rgb)
+            for face in faces:
+                face.face_image = rgb
+
+        focus_face = _largest_face(faces)
+        person = Person(None, None, focus_face) if focus_face is not None else None
+
+        if idx >= warmup:
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+            pickled_sizes.extend(len(pickle.dumps(face)) for face in faces)
+
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return {"mode": "full_frame" if keep_full_frame else "crop",
+            "frames": len(allocated),
+            "allocated_kb_per_frame": float(np.mean(allocated)) / 1024 if allocated else 0.0,
+            "held_kb": held / 1024,
+            "pickled_face_kb": float(np.mean(pickled_sizes)) / 1024 if pickled_sizes else None,
+            "faces_with_image": sum(1 for face in faces if face.face_image is not None),
+            "person_has_face_image": person is not None and person.face_image is not None}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory allocated per frame by the face images")
+    parser.add_argument("clip")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=10)
+    args = parser.parse_args()
+
+    frames = _load_frames(args.clip, args.frames)
+    face_detection = FaceDetection(watch_folder=False)
+
+    try:
+        results = [run(face_detection, frames, keep_full_frame, args.warmup) for keep_full_frame in [True, False]]
+    finally:
+        face_detection.stop()
+
+    print(json.dumps(results, indent=4))
@@ -0,0 +1,82 @@
+import argparse
+import json
+import time
+import numpy as np
+
+from face_gallery import FaceGallery
+
+# Run from the repository root:
+#   python -m benchmarks.face_match_benchmark --sizes 10 1000 100000 --faces 3
+
+
+def _random_encodings(rng, count):
+    # dlib encodings are roughly unit-length 128-d vectors
+    enc = rng.normal(size=(count, FaceGallery.EncodingSize)).astype(np.float32)
+    enc /= np.linalg.norm(enc, axis=1, keepdims=True)
+    return enc
+
+
+def _legacy_match(face_encoding_db, found_faces_encoding, tolerance):
+    # Mirrors the previous FaceDetection.detect loop: compare_faces followed by face_distance for every face,
+    # each converting the python list to an array and computing the distances again
+    results = []
+    for cur_face in found_faces_encoding:
+        matches = list(np.linalg.norm(np.array(face_encoding_db) - cur_face, axis=1) <= tolerance)
+        face_distances = np.linalg.norm(np.array(face_encoding_db) - cur_face, axis=1)
+        best_idx = np.argmin(face_distances)
+        results.append((best_idx if matches[best_idx] else None, face_distances[best_idx]))
+
+    return results
+
+
+def _time_per_frame(callback, frames):
+    # Returns the median latency in milliseconds
+    durations = []
+    for frame in frames:
+        start = time.perf_counter()
+        callback(frame)
+        durations.append((time.perf_counter() - start) * 1000)
+
+    return float(np.median(durations))
+
+
+def run(sizes, faces_per_frame, num_frames, legacy_max_size, seed=0):
+    rng = np.random.default_rng(seed)
+    results = []
+
+    for size in sizes:
+        db = _random_encodings(rng, size)
+        labels = [f"person{i}" for i in range(size)]
+        frames = [_random_encodings(rng, faces_per_frame) for _ in range(num_frames)]
+
+        result = {"identities": size, "faces_per_frame": faces_per_frame}
+
+        gallery = FaceGallery(use_ann=False)
+        gallery.set(labels, db)
+        result["batched_ms"] = _time_per_frame(gallery.match, frames)
+
+        ann_gallery = FaceGallery(use_ann=True)
+        ann_gallery.set(labels, db)
+        if ann_gallery._ann_index is not None:
+            result["ann_ms"] = _time_per_frame(ann_gallery.match, frames)
+
+        if size <= legacy_max_size:
+            db_list = list(db)
+            result["legacy_ms"] = _time_per_frame(
+                lambda frame: _legacy_match(db_list, frame, FaceGallery.Tolerance), frames)
+
+        results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-frame face gallery match latency")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--faces", type=int, default=3, help="Faces per frame")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--legacy-max-size", type=int, default=100000,
+                        help="Skip the legacy per-face loop above this gallery size")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.sizes, args.faces, args.frames, args.legacy_max_size), indent=4))
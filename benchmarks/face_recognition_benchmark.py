@@ -0,0 +1,192 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from face_bulk_enrollment import FaceBulkEnrollment, EnrollStatus, _encode_image
+from face_gallery import FaceGallery
+from utilities.stageTimer import StageTimer
+
+# Run from the repository root:
+#   python -m benchmarks.face_recognition_benchmark photos/ --upsample 0 1 2 --thresholds 0.4 0.5 0.6
+#
+# photos/ holds a folder of images per person, like for face_bulk_enrollment.py. The first --gallery-images
+# images of every person are enrolled, the other images are the probes. The people in the last
+# --unknown-fraction of the folders are not enrolled at all, their images must be rejected.
+# The probes go through the real FaceDetection.detect in a process pool, once per upsample / scale setting.
+# Reports images per second and stage latency per setting, and precision, recall, false accept rate and
+# misidentification rate for every threshold, as JSON
+
+# FaceDetection of the pool worker
+_face_detection = None
+
+
+def _init_worker(labels, encodings):
+    global _face_detection
+    from face_detection import FaceDetection
+
+    # Match against the benchmark gallery only, the workers must not touch the face store of the robot. Always
+    # report the closest identity so the thresholds can be applied afterwards
+    gallery = FaceGallery(tolerance=float("inf"), dtype=FaceDetection.EmbeddingDType)
+    gallery.set(labels, encodings)
+    _face_detection = FaceDetection(gallery=gallery)
+
+
+def _recognise(image_path, scale, upsample):
+    # Returns (closest label, distance, stage timings) of the largest face, label None when there is no face
+    image = cv2.imread(image_path)
+    if image is None:
+        return None, None, None
+
+    start = time.perf_counter()
+    faces = _face_detection.detect(image, scale=scale, upsample=upsample)
+    timings = dict(_face_detection.last_timings, total=time.perf_counter() - start)
+
+    if len(faces) == 0:
+        return None, None, timings
+
+    face = max(faces, key=lambda face: face.bounding_box.width() * face.bounding_box.height())
+
+    return face.name, face.score, timings
+
+
+def _split(photo_folder, gallery_images, unknown_fraction):
+    # (gallery [(label, path)], probes [(label, path, is_enrolled)])
+    images = FaceBulkEnrollment.collect_images(photo_folder)
+    labels = list(dict.fromkeys(label for label, _ in images))
+    num_unknown = int(round(len(labels) * unknown_fraction))
+    unknown_labels = set(labels[len(labels) - num_unknown:])
+
+    gallery = []
+    probes = []
+    for label in labels:
+        paths = [path for image_label, path in images if image_label == label]
+
+        if label in unknown_labels:
+            probes.extend((label, path, False) for path in paths)
+        else:
+            gallery.extend((label, path) for path in paths[:gallery_images])
+            probes.extend((label, path, True) for path in paths[gallery_images:])
+
+    return gallery, probes
+
+
+def _scores(probes, results, threshold):
+    true_accepts = false_accepts = misidentified = 0
+    num_enrolled = sum(1 for _, _, is_enrolled in probes if is_enrolled)
+    num_unknown = len(probes) - num_enrolled
+
+    for (label, _, is_enrolled), (name, distance, _) in zip(probes, results):
+        if name is None or distance > threshold:
+            continue
+
+        if not is_enrolled:
+            false_accepts += 1
+        elif name == label:
+            true_accepts += 1
+        else:
+            misidentified += 1
+
+    accepts = true_accepts + false_accepts + misidentified
+
+    return {"threshold": threshold,
+            "precision": true_accepts / accepts if accepts > 0 else None,
+            "recall": true_accepts / num_enrolled if num_enrolled > 0 else None,
+            "false_accept_rate": false_accepts / num_unknown if num_unknown > 0 else None,
+            "misidentification_rate": misidentified / num_enrolled if num_enrolled > 0 else None}
+
+
+def run(photo_folder, upsamples, scales, thresholds, gallery_images, unknown_fraction, num_workers):
+    gallery, probes = _split(photo_folder, gallery_images, unknown_fraction)
+    if len(probes) == 0:
+        raise ValueError(f"No probe images in {photo_folder}, every person needs more than {gallery_images} "
+                         f"images or --unknown-fraction must leave people out of the gallery")
+
+    ctx = multiprocessing.get_context("spawn")
+
+    # The gallery is encoded like the bulk enrollment does it
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx) as executor:
+        encoded = list(executor.map(_encode_image, [path for _, path in gallery], [1] * len(gallery)))
+    enrolled = [(label, encoding) for (label, _), (status, encoding) in zip(gallery, encoded)
+                if status == EnrollStatus.Enrolled]
+    labels = [label for label, _ in enrolled]
+    encodings = np.array([encoding for _, encoding in enrolled]).reshape(-1, FaceGallery.EncodingSize)
+
+    settings = []
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(labels, encodings)) as executor:
+        # Load the models in every worker before measuring
+        list(executor.map(_recognise, [probes[0][1]] * num_workers, [1.0] * num_workers, [0] * num_workers))
+
+        for upsample, scale in itertools.product(upsamples, scales):
+            start = time.perf_counter()
+            results = list(executor.map(_recognise, [path for _, path, _ in probes], [scale] * len(probes),
+                                        [upsample] * len(probes)))
+            wall_time = time.perf_counter() - start
+
+            stage_timer = StageTimer()
+            for _, _, timings in results:
+                for stage, duration in (timings or {}).items():
+                    stage_timer.record(stage, duration)
+
+            settings.append({"upsample": upsample,
+                             "scale": scale,
+                             "images_per_s": len(probes) / wall_time,
+                             "no_face": sum(1 for name, _, _ in results if name is None),
+                             "stages": stage_timer.summary(),
+                             "thresholds": [_scores(probes, results, threshold) for threshold in thresholds]})
+
+    return {"gallery_identities": len(set(labels)),
+            "gallery_images": len(labels),
+            "probes": len(probes),
+            "unknown_probes": sum(1 for _, _, is_enrolled in probes if not is_enrolled),
+            "workers": num_workers,
+            "settings": settings}
+
+
+def _best(settings, min_precision, max_false_accept_rate):
+    # The fastest setting and threshold which still meet the accuracy bar, the highest recall among those
+    candidates = []
+    for setting in settings:
+        for scores in setting["thresholds"]:
+            if scores["precision"] is None or scores["precision"] < min_precision:
+                continue
+            if scores["false_accept_rate"] is not None and scores["false_accept_rate"] > max_false_accept_rate:
+                continue
+            candidates.append((setting["images_per_s"], scores["recall"] or 0.0, setting, scores))
+
+    if len(candidates) == 0:
+        return None
+
+    _, _, setting, scores = max(candidates, key=lambda candidate: (candidate[0], candidate[1]))
+
+    return {"upsample": setting["upsample"], "scale": setting["scale"], "images_per_s": setting["images_per_s"],
+            **scores}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy and speed of the face recognition settings")
+    parser.add_argument("photo_folder")
+    parser.add_argument("--upsample", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--thresholds", type=float, nargs="+",
+                        default=[0.4, 0.45, 0.5, 0.55, FaceGallery.Tolerance, 0.65])
+    parser.add_argument("--gallery-images", type=int, default=1, help="Images per person to enroll")
+    parser.add_argument("--unknown-fraction", type=float, default=0.2,
+                        help="Fraction of the people who are not enrolled")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--min-precision", type=float, default=0.99)
+    parser.add_argument("--max-false-accept-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    result = run(args.photo_folder, args.upsample, args.scale, args.thresholds, args.gallery_images,
+                 args.unknown_fraction, args.workers)
+    result["best"] = _best(result["settings"], args.min_precision, args.max_false_accept_rate)
+
+    print(json.dumps(result, indent=4))
@@ -0,0 +1,195 @@
+import argparse
+import json
+import math
+import threading
+import time
+
+import numpy as np
+
+from const import Const
+from head_controller import HeadController
+from servo_kit_fake import ServoKitFake
+
+# Run from the repository root:
+#   python -m benchmarks.head_controller_benchmark
+#
+# Drives the head on a software ServoKit, no hardware needed, through a step to a new target, a person tracked
+# with a new target every frame, and idling. "stepper" is the servo loop HeadController had before the trajectory
+# planner, "planner" the current HeadController. Reports the settle time, tracking lag, I2C transactions, bus
+# time, update interval and CPU use of every phase as JSON
+
+
+class StepperHead(object):
+    # HeadController._move_head before the trajectory planner: a step of at most max_speed servo values, both
+    # servos set one by one with a sleep after each, forever, also when the head is on target
+    servo_deg_to_sv_mappings = HeadController.servo_deg_to_sv_mappings
+    servo_range = HeadController.servo_range
+    HEADING_SERVO = HeadController.HEADING_SERVO
+    PITCH_SERVO = HeadController.PITCH_SERVO
+
+    max_speed = 1.5
+    min_speed = 0.5
+
+    _angle_to_servo_value = HeadController._angle_to_servo_value
+    _servo_value_to_angle = HeadController._servo_value_to_angle
+
+    def __init__(self, kit, deadband):
+        self.kit = kit
+        self.deadband = deadband
+        self.servo_value = {}
+
+        self._target_heading = 90
+        self._target_pitch = 90
+
+        self._run_thread = True
+        self._thread = threading.Thread(target=self._callback)
+        self._thread.start()
+
+    def _move_head(self):
+        target_heading_value = self._angle_to_servo_value(self.HEADING_SERVO, self._target_heading)
+        target_pitch_value = self._angle_to_servo_value(self.PITCH_SERVO, self._target_pitch)
+
+        if self.HEADING_SERVO not in self.servo_value:
+            self._set_servo(self.HEADING_SERVO, target_heading_value, 0)
+            self._set_servo(self.PITCH_SERVO, target_pitch_value, 0)
+            time.sleep(HeadController.InitialMoveTime)
+            return
+
+        heading_delta = (target_heading_value - self.servo_value[self.HEADING_SERVO])
+        pitch_delta = (target_pitch_value - self.servo_value[self.PITCH_SERVO])
+
+        distance = math.sqrt(pow(heading_delta, 2) + pow(pitch_delta, 2))
+        if distance <= self.min_speed:
+            sv_new_heading = target_heading_value
+            sv_new_pitch = target_pitch_value
+            sleep_time = 0.01
+        else:
+            norm_distance = min(distance, self.max_speed) / distance
+            sleep_time = 0.01 + 0.05 * (1.0 - min(1.0, distance / 20.0))
+
+            sv_new_heading = self.servo_value[self.HEADING_SERVO] + heading_delta * norm_distance
+            sv_new_pitch = self.servo_value[self.PITCH_SERVO] + pitch_delta * norm_distance
+
+        self._set_servo(self.HEADING_SERVO, sv_new_heading, sleep_time)
+        self._set_servo(self.PITCH_SERVO, sv_new_pitch, sleep_time)
+
+    def _set_servo(self, servo_no, value, sleep_time):
+        self.kit.servo[servo_no].angle = value
+        time.sleep(sleep_time)
+        self.servo_value[servo_no] = value
+
+    def _callback(self):
+        while self._run_thread:
+            self._move_head()
+
+    def look_at(self, heading, pitch):
+        if abs(heading - self._target_heading) > self.deadband:
+            self._target_heading = heading
+        if abs(pitch - self._target_pitch) > self.deadband:
+            self._target_pitch = pitch
+
+    def current_head_angle(self):
+        return (self._servo_value_to_angle(self.HEADING_SERVO, self.servo_value[self.HEADING_SERVO]),
+                self._servo_value_to_angle(self.PITCH_SERVO, self.servo_value[self.PITCH_SERVO]))
+
+    def stop(self):
+        self._run_thread = False
+        self._thread.join()
+
+
+class _Phase(object):
+    # Bus and CPU use between start and stop
+
+    def __init__(self, kit):
+        self._kit = kit
+        self._writes = kit.bus_writes
+        self._bytes = kit.bytes_written
+        self._bus_time = kit.bus_time()
+        self._num_write_times = len(kit.write_times())
+        self._cpu = time.process_time()
+        self._start = time.monotonic()
+
+    def stop(self):
+        wall_time = time.monotonic() - self._start
+        write_times = self._kit.write_times()[self._num_write_times:]
+        intervals = np.diff(write_times) * 1000 if len(write_times) > 1 else np.zeros(1)
+
+        return {"time_s": wall_time,
+                "bus_writes": self._kit.bus_writes - self._writes,
+                "bus_writes_per_s": (self._kit.bus_writes - self._writes) / wall_time,
+                "bytes_per_s": (self._kit.bytes_written - self._bytes) / wall_time,
+                "bus_time_ms_per_s": (self._kit.bus_time() - self._bus_time) * 1000 / wall_time,
+                "write_interval_p50_ms": float(np.percentile(intervals, 50)),
+                "write_interval_p99_ms": float(np.percentile(intervals, 99)),
+                "cpu_percent": (time.process_time() - self._cpu) * 100 / wall_time}
+
+
+def _wait_settled(head, heading, pitch, timeout, tolerance=0.5):
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        current_heading, current_pitch = head.current_head_angle()
+        if abs(current_heading - heading) <= tolerance and abs(current_pitch - pitch) <= tolerance:
+            return time.monotonic() - start
+        time.sleep(0.001)
+
+    return None
+
+
+def run_head(name, step_heading, step_pitch, track_time, idle_time, track_amplitude, track_rate):
+    kit = ServoKitFake()
+    if name == "stepper":
+        head = StepperHead(kit, Const.HeadTrackingDeadband)
+    else:
+        head = HeadController(deadband=Const.HeadTrackingDeadband, kit=kit)
+
+    # Both send the servos to the start position and wait for them first
+    time.sleep(HeadController.InitialMoveTime + 0.1)
+    result = {}
+
+    try:
+        phase = _Phase(kit)
+        head.look_at(step_heading, step_pitch)
+        settle_time = _wait_settled(head, step_heading, step_pitch, timeout=10.0)
+        result["step"] = dict(phase.stop(), settle_time_s=settle_time)
+
+        # A new target every frame, like EllaBot does
+        head.look_at(90, 90)
+        _wait_settled(head, 90, 90, timeout=10.0)
+        phase = _Phase(kit)
+        lags = []
+        start = time.monotonic()
+        while time.monotonic() - start < track_time:
+            t = time.monotonic() - start
+            target = 90 + track_amplitude * math.sin(2 * math.pi * track_rate * t)
+            lags.append(abs(head.current_head_angle()[0] - target))
+            head.look_at(target, 90)
+            time.sleep(1.0 / Const.CaptureFPS)
+        result["tracking"] = dict(phase.stop(), mean_error_deg=float(np.mean(lags)))
+
+        _wait_settled(head, 90, 90, timeout=10.0)
+        phase = _Phase(kit)
+        time.sleep(idle_time)
+        result["idle"] = phase.stop()
+    finally:
+        head.stop()
+
+    return result
+
+
+def run(step_heading, step_pitch, track_time, idle_time, track_amplitude, track_rate):
+    return {name: run_head(name, step_heading, step_pitch, track_time, idle_time, track_amplitude, track_rate)
+            for name in ["stepper", "planner"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Head servo loop timing, I2C writes and CPU use on a fake ServoKit")
+    parser.add_argument("--step-heading", type=float, default=150.0)
+    parser.add_argument("--step-pitch", type=float, default=60.0)
+    parser.add_argument("--track-time", type=float, default=5.0)
+    parser.add_argument("--track-amplitude", type=float, default=30.0, help="Degrees either side")
+    parser.add_argument("--track-rate", type=float, default=0.3, help="Hz")
+    parser.add_argument("--idle-time", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.step_heading, args.step_pitch, args.track_time, args.idle_time,
+                         args.track_amplitude, args.track_rate), indent=4))
@@ -0,0 +1,199 @@
+import argparse
+import json
+import math
+import random
+
+import numpy as np
+
+from const import Const
+from target_predictor import TargetPredictor
+
+# Run from the repository root:
+#   python -m benchmarks.head_tracking_benchmark --detect-latency 0.15 --noise 1.0
+#
+# Offline simulation of the head following a person, no hardware needed. A person moves around the robot
+# (a step to a new place, walking back and forth, swaying), the camera captures them at --fps with --noise degrees
+# of detection jitter, and the detection reaches the bot --detect-latency seconds after the capture.
+# The head moves like HeadController._move_head steps the servos.
+# "current" re-aims every 5 frames from the stale detection with the 2 degrees deadband, "predictive" aims every
+# frame with the TargetPredictor. Reports the tracking error, settle time and overshoot of the step, and how often
+# the head target changed, as JSON
+
+# Deadband of HeadController.look_at before the target predictor
+CurrentDeadband = 2.0
+
+
+class SimulatedHead(object):
+    # Heading servo of HeadController: the deg to servo value mapping, and the step size and step time of
+    # _move_head. Both servos sleep every step, so a step takes twice the sleep time
+    ValuePerDegree = 100.0 / 86.0
+    ServoRange = (10, 170)
+    MaxSpeed = 1.5
+    MinSpeed = 0.5
+
+    def __init__(self, heading, deadband):
+        self.deadband = deadband
+        self._value = heading * self.ValuePerDegree
+        self._target = heading
+        self._next_step = 0.0
+        self.target_changes = 0
+        # (time, heading) after every step
+        self._history = [(0.0, heading)]
+
+    def look_at(self, heading):
+        heading = min(max(self.ServoRange[0], heading), self.ServoRange[1])
+
+        if abs(heading - self._target) > self.deadband:
+            self._target = heading
+            self.target_changes += 1
+
+    def heading(self):
+        return self._value / self.ValuePerDegree
+
+    def heading_at(self, timestamp):
+        for step_time, heading in reversed(self._history):
+            if step_time <= timestamp:
+                return heading
+
+        return self._history[0][1]
+
+    def step(self, now):
+        if now < self._next_step:
+            return
+
+        delta = self._target * self.ValuePerDegree - self._value
+        distance = abs(delta)
+
+        if distance <= self.MinSpeed:
+            self._value += delta
+            sleep_time = 0.01
+        else:
+            self._value += delta * min(distance, self.MaxSpeed) / distance
+            sleep_time = 0.01 + 0.05 * (1.0 - min(1.0, distance / 20.0))
+
+        self._next_step = now + 2 * sleep_time
+        self._history.append((now, self.heading()))
+
+
+def _person_heading(scenario, t):
+    # Heading of the person around the robot in degrees, 90 is straight ahead
+    if scenario == "step":
+        return 90.0 if t < 1.0 else 120.0
+    if scenario == "walk":
+        # 20 deg/s back and forth between 60 and 120
+        phase = (t * 20.0) % 120.0
+        return 60.0 + (phase if phase < 60.0 else 120.0 - phase)
+    if scenario == "sway":
+        return 90.0 + 15.0 * math.sin(2 * math.pi * 0.4 * t)
+
+    raise ValueError(f"Unknown scenario {scenario}")
+
+
+def _simulate(scenario, mode, fps, detect_latency, noise, duration, command_latency, seed, dt=0.001):
+    rng = random.Random(seed)
+    start_heading = _person_heading(scenario, 0.0)
+    head = SimulatedHead(start_heading, CurrentDeadband if mode == "current" else Const.HeadTrackingDeadband)
+    predictor = TargetPredictor(command_latency=command_latency)
+
+    # (delivery time, capture time, camera heading or None)
+    detections = []
+    next_capture = 0.0
+    ctr = 0
+
+    times = []
+    errors = []
+
+    for i in range(int(duration / dt)):
+        now = i * dt
+
+        if now >= next_capture:
+            person = _person_heading(scenario, now)
+            offset = person - head.heading()
+            camera_heading = None
+            if abs(offset) < Const.CameraHorizontalFOV / 2:
+                camera_heading = 90 + offset + rng.gauss(0.0, noise)
+            detections.append((now + detect_latency, now, camera_heading))
+            next_capture += 1.0 / fps
+
+        while len(detections) > 0 and detections[0][0] <= now:
+            _, capture_time, camera_heading = detections.pop(0)
+
+            if mode == "current":
+                # EllaBot.run before the target predictor
+                if ctr > 5:
+                    ctr = 0
+                    if camera_heading is not None:
+                        head.look_at(head.heading() + camera_heading - 90)
+                ctr += 1
+            elif camera_heading is not None:
+                predictor.update(head.heading_at(capture_time) + camera_heading - 90, 90.0, capture_time)
+                target = predictor.predict(now)
+                if target is not None:
+                    head.look_at(target[0])
+
+        head.step(now)
+
+        times.append(now)
+        errors.append(head.heading() - _person_heading(scenario, now))
+
+    return np.array(times), np.array(errors), head.target_changes
+
+
+def _metrics(scenario, times, errors, target_changes, settle_band=3.0):
+    # The first second is the start up, except for the step which happens after it
+    measured = np.abs(errors[times >= 1.0])
+    result = {"rms_error_deg": float(np.sqrt(np.mean(measured ** 2))),
+              "p90_error_deg": float(np.percentile(measured, 90)),
+              "max_error_deg": float(np.max(measured)),
+              "target_changes": target_changes}
+
+    if scenario == "step":
+        after = times >= 1.0
+        step_times, step_errors = times[after], errors[after]
+
+        # Time until the head stays within settle_band of the person, None when it never does
+        outside = np.nonzero(np.abs(step_errors) > settle_band)[0]
+        if len(outside) == 0:
+            settle_time = 0.0
+        elif outside[-1] == len(step_errors) - 1:
+            settle_time = None
+        else:
+            settle_time = float(step_times[outside[-1] + 1] - 1.0)
+        result["settle_time_s"] = settle_time
+        # The step is towards larger headings, overshoot is going past the person
+        result["overshoot_deg"] = float(max(0.0, np.max(step_errors)))
+
+    return result
+
+
+def run(scenarios, fps, detect_latency, noise, duration, command_latency, seed):
+    results = {}
+
+    for scenario in scenarios:
+        results[scenario] = {}
+        for mode in ["current", "predictive"]:
+            times, errors, target_changes = _simulate(scenario, mode, fps, detect_latency, noise, duration,
+                                                      command_latency, seed)
+            results[scenario][mode] = _metrics(scenario, times, errors, target_changes)
+
+    return {"fps": fps,
+            "detect_latency_s": detect_latency,
+            "noise_deg": noise,
+            "command_latency_s": command_latency,
+            "scenarios": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated head tracking error, current versus predictive aiming")
+    parser.add_argument("--scenarios", nargs="+", default=["step", "walk", "sway"])
+    parser.add_argument("--fps", type=float, default=Const.CaptureFPS)
+    parser.add_argument("--detect-latency", type=float, default=0.15,
+                        help="Seconds from the capture until the bot has the detection")
+    parser.add_argument("--noise", type=float, default=1.0, help="Detection jitter in degrees")
+    parser.add_argument("--duration", type=float, default=8.0)
+    parser.add_argument("--command-latency", type=float, default=Const.HeadCommandLatency)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.scenarios, args.fps, args.detect_latency, args.noise, args.duration,
+                         args.command_latency, args.seed), indent=4))
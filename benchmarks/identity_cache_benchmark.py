@@ -0,0 +1,106 @@
+import argparse
+import json
+import math
+import numpy as np
+
+from const import Const
+from face_object import FaceObject
+from identity_cache import IdentityCache
+from vision_scheduler import VisionScheduler, VisionStage
+from utilities.rectArea import RectArea
+
+# Run from the repository root:
+#   python -m benchmarks.identity_cache_benchmark --duration 300 --reverify 5 10 30
+#
+# Simulates a conversation with one known person in front of the robot, the face detection cycles planned by
+# the VisionScheduler, and the person track being lost now and then (occlusion, walking out of view).
+# Reports the face encodings per minute with and without the IdentityCache
+
+# Same as SightObjectDetection.PersonFaceRegionHeight, without importing the detector backends
+PersonFaceRegionHeight = 0.4
+
+
+def _person_box(t):
+    # Someone standing in front of the robot, swaying a little
+    cx = 0.5 + 0.05 * math.sin(t * 0.7)
+    cy = 0.55 + 0.02 * math.sin(t * 1.3)
+
+    return RectArea(cx - 0.15, cy - 0.4, cx + 0.15, cy + 0.4)
+
+
+def _face_box(person_box):
+    # Face in the head part of the person box, in capture coordinates
+    p_box = person_box.normalisedTo(Const.CaptureWidth, Const.CaptureHeight)
+    cx = (p_box.x1 + p_box.x2) / 2
+    size = p_box.width() * 0.3
+
+    return RectArea(cx - size / 2, p_box.y1 + size * 0.3, cx + size / 2, p_box.y1 + size * 1.3)
+
+
+def run(duration, reverify_interval, track_loss_every, use_cache):
+    scheduler = VisionScheduler()
+    cache = IdentityCache(reverify_interval) if use_cache else None
+    encoding = np.zeros(128)
+
+    track_id = 1
+    num_face_cycles = 0
+    num_encodes = 0
+    recognised = False
+
+    for tick in range(int(duration * Const.CaptureFPS)):
+        t = tick / Const.CaptureFPS
+
+        if track_loss_every > 0 and tick > 0 and tick % int(track_loss_every * Const.CaptureFPS) == 0:
+            # The tracker lost the person and starts a new track, the identity has to be established again
+            track_id += 1
+            recognised = False
+
+        person_box = _person_box(t)
+        if cache is not None:
+            cache.follow({track_id: person_box}, now=t)
+
+        decision = scheduler.plan(unknown_person_engaged=not recognised, face_offloaded=True, now=t)
+        if not decision.runs(VisionStage.FaceDetection):
+            continue
+
+        num_face_cycles += 1
+        face_box = _face_box(person_box)
+
+        known_identities = []
+        if cache is not None:
+            known_identities = cache.known_identities(Const.CaptureWidth, Const.CaptureHeight,
+                                                      PersonFaceRegionHeight)
+
+        if 0 in IdentityCache.match_faces([face_box], known_identities):
+            continue
+
+        num_encodes += 1
+        recognised = True
+        if cache is not None:
+            cache.update(track_id, FaceObject("gus", face_box, 0.4, encoding=encoding), person_box, now=t)
+
+    minutes = duration / 60.0
+
+    return {"cache": use_cache,
+            "reverify_interval_s": reverify_interval if use_cache else None,
+            "face_cycles_per_minute": num_face_cycles / minutes,
+            "encodes_per_minute": num_encodes / minutes}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face encodings saved by the identity cache in a conversation")
+    parser.add_argument("--duration", type=float, default=300, help="Conversation length in seconds")
+    parser.add_argument("--reverify", type=float, nargs="+", default=[IdentityCache.ReverifyInterval])
+    parser.add_argument("--track-loss-every", type=float, default=60,
+                        help="Seconds between track losses, 0 for never")
+    args = parser.parse_args()
+
+    baseline = run(args.duration, None, args.track_loss_every, use_cache=False)
+    results = [baseline]
+
+    for reverify_interval in args.reverify:
+        result = run(args.duration, reverify_interval, args.track_loss_every, use_cache=True)
+        result["encodes_saved_per_minute"] = baseline["encodes_per_minute"] - result["encodes_per_minute"]
+        results.append(result)
+
+    print(json.dumps(results, indent=4))
@@ -0,0 +1,76 @@
+import argparse
+import json
+import time
+import numpy as np
+
+from benchmarks.object_detection_benchmark import _load_frames, _create_backend
+
+# Run from the repository root:
+#   python -m benchmarks.multi_camera_benchmark recording.mp4 --backend cpu --cameras 1 2 3 4
+#
+# Object detection cost of one sight tick with N cameras, the cameras simulated by offset frames of the clip.
+# "batched" is one detect_batch call over the latest frame of every camera as SightObjectDetection does it,
+# "separate" one call per camera. A tick cost growing slower than the number of cameras means the cameras
+# share the inference
+
+
+def _camera_frames(frames, num_cameras, tick):
+    offset = max(len(frames) // num_cameras, 1)
+
+    return [frames[(tick + camera * offset) % len(frames)] for camera in range(num_cameras)]
+
+
+def run(backend, frames, num_cameras, num_ticks, batched):
+    tick_durations = []
+
+    for tick in range(num_ticks):
+        camera_frames = _camera_frames(frames, num_cameras, tick)
+        start_time = time.perf_counter()
+
+        if batched:
+            backend.detect_batch(camera_frames)
+        else:
+            for frame in camera_frames:
+                backend.detect_batch([frame])
+
+        tick_durations.append((time.perf_counter() - start_time) * 1000)
+
+    mean_ms = float(np.mean(tick_durations))
+
+    return {"cameras": num_cameras,
+            "mode": "batched" if batched else "separate",
+            "tick_p50_ms": float(np.percentile(tick_durations, 50)),
+            "tick_mean_ms": mean_ms,
+            "camera_frames_per_s": num_cameras * 1000.0 / mean_ms}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Object detection throughput of the sight with several cameras")
+    parser.add_argument("clip")
+    parser.add_argument("--backend", choices=["cpu", "jetnet"], default="cpu")
+    parser.add_argument("--cameras", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--threads", type=int, default=None, help="OpenCV thread count for the cpu backend")
+    parser.add_argument("--input-size", type=int, default=300)
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    frames = _load_frames(args.clip, args.max_frames)
+    backend = _create_backend(args.backend, args.threads, max(args.cameras), args.input_size)
+
+    for frame in frames[:args.warmup]:
+        backend.detect_batch([frame])
+
+    results = []
+    for num_cameras in args.cameras:
+        for batched in [False, True]:
+            results.append(run(backend, frames, num_cameras, args.ticks, batched))
+
+    # Tick cost relative to a single camera, sublinear scaling stays below the number of cameras
+    single = {result["mode"]: result["tick_mean_ms"] for result in results if result["cameras"] == 1}
+    for result in results:
+        if result["mode"] in single:
+            result["tick_cost_vs_one_camera"] = result["tick_mean_ms"] / single[result["mode"]]
+
+    print(json.dumps(results, indent=4))
@@ -0,0 +1,98 @@
+import argparse
+import json
+import time
+import numpy as np
+
+from video_feed.video_offline_reader import VideoOfflineReader
+
+# Run from the repository root:
+#   python -m benchmarks.object_detection_benchmark recording.mp4 --backends cpu jetnet --threads 4 --batch 1 4
+
+
+def _load_frames(clip_path, max_frames):
+    # Decode the clip up front so decoding is not part of the measured latency
+    reader = VideoOfflineReader(clip_path)
+    frames = []
+
+    while max_frames is None or len(frames) < max_frames:
+        frame = reader.read_frame()
+        if frame is None:
+            break
+        frames.append(frame)
+
+    return frames
+
+
+def _create_backend(name, num_threads, batch_size, input_size):
+    if name == "cpu":
+        from object_detection_cpu import ObjectDetectionCPU
+        return ObjectDetectionCPU(num_threads=num_threads, input_width=input_size, input_height=input_size,
+                                  batch_size=batch_size)
+    if name == "jetnet":
+        from object_detection_jetnet import ObjectDetectionJetNet
+        return ObjectDetectionJetNet()
+
+    raise ValueError(f"Unknown backend {name}")
+
+
+def _percentiles(durations):
+    return {"p50_ms": float(np.percentile(durations, 50)),
+            "p90_ms": float(np.percentile(durations, 90)),
+            "p99_ms": float(np.percentile(durations, 99)),
+            "mean_ms": float(np.mean(durations))}
+
+
+def run_backend(backend, frames, batch_size, warmup):
+    for frame in frames[:warmup]:
+        backend.detect_batch([frame])
+
+    # Per-frame latency, where a batch's time is shared by its frames
+    durations = []
+    num_objects = 0
+    start_all = time.perf_counter()
+
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+        start_time = time.perf_counter()
+        results = backend.detect_batch(batch)
+        duration = (time.perf_counter() - start_time) * 1000
+
+        durations.extend([duration / len(batch)] * len(batch))
+        num_objects += sum(len(frame.getObjects(None)) for frame in results)
+
+    total = time.perf_counter() - start_all
+    result = _percentiles(durations)
+    result["fps"] = len(frames) / total
+    result["objects"] = num_objects
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-frame latency of the object detection backends on a recorded clip")
+    parser.add_argument("clip")
+    parser.add_argument("--backends", nargs="+", default=["cpu", "jetnet"])
+    parser.add_argument("--threads", type=int, default=None, help="OpenCV thread count for the cpu backend")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1])
+    parser.add_argument("--input-size", type=int, default=300)
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    frames = _load_frames(args.clip, args.max_frames)
+    results = []
+
+    for backend_name in args.backends:
+        for batch_size in args.batch:
+            result = {"backend": backend_name, "batch_size": batch_size, "frames": len(frames)}
+            try:
+                backend = _create_backend(backend_name, args.threads, batch_size, args.input_size)
+            except (ImportError, RuntimeError) as e:
+                result["error"] = str(e)
+                results.append(result)
+                continue
+
+            result.update(run_backend(backend, frames, batch_size, args.warmup))
+            results.append(result)
+
+    print(json.dumps(results, indent=4))
@@ -0,0 +1,151 @@
+import argparse
+import json
+import resource
+import subprocess
+import time
+
+from const import Const
+from utilities.stageTimer import StageTimer
+from video_feed.video_offline_reader import VideoOfflineReader, ReplayMode
+from vision_scheduler import VisionScheduler, VisionStage
+from benchmarks.object_detection_benchmark import _create_backend
+
+# Run from the repository root:
+#   python -m benchmarks.vision_pipeline_benchmark recording.mp4 --backend cpu
+#
+# Runs the whole SightObjectDetection.detect loop over every frame of a recorded clip, headless, and prints
+# per stage latency percentiles, throughput and peak RSS as JSON. Store the output per commit to compare them.
+# By default every stage runs on every frame so runs are reproducible, --schedule adaptive uses the
+# latency budget scheduler like the robot does.
+# --replay realtime feeds the clip like the camera at Const.CaptureFPS, dropping the frames the loop is too slow
+# for, --start / --end replay a part of the clip (seconds).
+# Frames the reader dropped, frames the face worker dropped and ticks which skipped a detector (scheduler) or
+# everything (--duty-cycle) are reported separately, all counted after the warm up
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _face_worker_dropped(sight):
+    stats = sight.face_worker_stats()
+    return stats["dropped_frames"] if stats is not None else 0
+
+
+def _duty_cycle_gated(sight):
+    stats = sight.duty_cycle_stats()
+    return stats["gated_ticks"] if stats is not None else 0
+
+
+def run(clip_path, backend, schedule, use_face_worker, max_frames, warmup, replay=ReplayMode.Fast, clip_start=0.0,
+        clip_end=None, use_duty_cycle=False):
+    # Sight picks its default detector from the configured backend at import time
+    Const.ObjectDetectionBackend = backend
+    from sight_object_detection import SightObjectDetection, SightConfig
+
+    stage_timer = StageTimer()
+    scheduler = None
+    if schedule == "every-frame":
+        # An unlimited budget makes every stage due on every tick
+        scheduler = VisionScheduler(target_period=float("inf"))
+
+    video_source = VideoOfflineReader(clip_path, mode=replay, start_time=clip_start, end_time=clip_end)
+    config = SightConfig(display_preview=False,
+                         use_face_worker=use_face_worker,
+                         use_duty_cycle=use_duty_cycle,
+                         print_fps=False,
+                         # A real time replay drops frames like the camera does
+                         drop_frames=replay == ReplayMode.RealTime)
+    sight = SightObjectDetection(config,
+                                 video_source=video_source,
+                                 object_detector=_create_backend(backend, None, 1, 300),
+                                 stage_timer=stage_timer,
+                                 scheduler=scheduler)
+
+    num_frames = 0
+    num_people = 0
+    skipped = {VisionStage.ObjectDetection: 0, VisionStage.FaceDetection: 0}
+    last_decision = None
+
+    # Counters at the end of the warm up
+    start_time = time.perf_counter()
+    start_reader_dropped = start_face_dropped = start_gated = 0
+
+    while max_frames is None or num_frames < max_frames:
+        num_captured = len(stage_timer.durations("capture"))
+        person, _, _ = sight.detect()
+
+        if len(stage_timer.durations("capture")) == num_captured:
+            # End of the clip
+            break
+
+        num_frames += 1
+        if num_frames == warmup:
+            # Drop the warm up frames (model loading, first allocations) from the statistics
+            stage_timer.reset()
+            start_time = time.perf_counter()
+            start_reader_dropped = video_source.dropped_frames
+            start_face_dropped = _face_worker_dropped(sight)
+            start_gated = _duty_cycle_gated(sight)
+        elif num_frames > warmup:
+            if person is not None:
+                num_people += 1
+
+            # A tick gated by the duty cycle makes no new decision
+            decision = sight.last_schedule_decision()
+            if decision is not None and decision is not last_decision:
+                for stage in skipped:
+                    if not decision.runs(stage):
+                        skipped[stage] += 1
+            last_decision = decision
+
+    total_time = time.perf_counter() - start_time
+    measured_frames = max(0, num_frames - warmup)
+
+    sight.stop()
+
+    return {"commit": _git_commit(),
+            "clip": clip_path,
+            "replay": replay,
+            "dropped_frames": video_source.dropped_frames - start_reader_dropped,
+            "face_worker_dropped_frames": _face_worker_dropped(sight) - start_face_dropped,
+            "object_detection_skipped_ticks": skipped[VisionStage.ObjectDetection],
+            "face_detection_skipped_ticks": skipped[VisionStage.FaceDetection],
+            "duty_cycle_gated_ticks": _duty_cycle_gated(sight) - start_gated,
+            "backend": backend,
+            "schedule": schedule,
+            "face_worker": use_face_worker,
+            "frames": measured_frames,
+            "frames_with_person": num_people,
+            "fps": measured_frames / total_time if total_time > 0 else 0.0,
+            "peak_rss_mb": _peak_rss_mb(),
+            "stages": stage_timer.summary()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of every stage of the Sight pipeline on a recorded clip")
+    parser.add_argument("clip")
+    parser.add_argument("--backend", default="cpu", choices=["cpu", "jetnet"])
+    parser.add_argument("--schedule", default="every-frame", choices=["every-frame", "adaptive"])
+    parser.add_argument("--face-worker", action="store_true",
+                        help="Run face recognition in the worker process like the robot does")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--replay", default=ReplayMode.Fast, choices=[ReplayMode.Fast, ReplayMode.RealTime])
+    parser.add_argument("--start", type=float, default=0.0, help="Clip time to start at, in seconds")
+    parser.add_argument("--end", type=float, default=None, help="Clip time to stop at, in seconds")
+    parser.add_argument("--duty-cycle", action="store_true",
+                        help="Gate the detectors with the motion duty cycle like the robot does")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.clip, args.backend, args.schedule, args.face_worker, args.max_frames, args.warmup,
+                         args.replay, args.start, args.end, args.duty_cycle), indent=4))
@@ -0,0 +1,4 @@
+class BrainState(object):
+    Idle = "Idle"
+    Engaging = "Engaging"
+    Conversing = "Conversing"
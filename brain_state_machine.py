@@ -4,12 +4,7 @@ from utilities.stopwatch import Stopwatch
 from intent import Intent, GetRespondState
 from const import Const
 from face_object import FaceObject
-
-
-class BrainState(object):
-    Idle = "Idle"
-    Engaging = "Engaging"
-    Conversing = "Conversing"
+from brain_state import BrainState
 
 
 class StateMachineReturn(object):
@@ -21,8 +16,8 @@ class BrainStateMachine(object):
     TimeToDisengaged = 6    # If the focus person is invisible for longer than 6 seconds, reset the state back to idle
     TimeToConverse = 2      # If face is visible for 2 seconds, start talking
 
-    MinFaceWidthToRegister = Const.CaptureWidth / 20 # Do not register face smaller than 1/20 the capture window size
-    MinFaceHeightToRegister = Const.CaptureHeight / 20
+    MinFaceWidthToRegister = FaceObject.MinWidthToRegister # Do not register face smaller than 1/20 the capture window size
+    MinFaceHeightToRegister = FaceObject.MinHeightToRegister
 
     def __init__(self):
         self._state = BrainState.Idle
@@ -32,6 +27,9 @@ class BrainStateMachine(object):
         self._stop_watch = None
         self._disengaged_stop_watch = None
 
+    def state(self):
+        return self._state
+
     def _update_engaged_person(self, person):
         if person is None:
             return
@@ -136,7 +134,8 @@ class BrainStateMachine(object):
             if self._person.face_bbox.width() >= self.MinFaceWidthToRegister and self._person.face_bbox.height() >= self.MinFaceHeightToRegister:
                 name = self._intent.extract_name()
                 if name is not None:
-                    new_face = FaceObject(name=name, bounding_box=None, score=None, face_image=self._person.face_image)
+                    new_face = FaceObject(name=name, bounding_box=None, score=None, face_image=self._person.face_image,
+                                          encoding=self._person.face_encoding)
 
         return new_face
 
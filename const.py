@@ -6,4 +6,26 @@ class Const(object):
     CaptureHeight = 300
     CaptureFPS = 10
 
+    # Horizontal field of view of the cameras in degrees
+    CameraHorizontalFOV = 100
+
+    # Seconds from sending a head setpoint until the servos get there, the target predictor aims that far ahead
+    HeadCommandLatency = 0.1
+    # Smallest head movement in degrees. The predicted target is smooth enough for a much smaller deadband than
+    # the raw detections need
+    HeadTrackingDeadband = 0.5
+
+    # Object detection backend, "jetnet" (jetson.inference on the Jetson GPU) or "cpu" (OpenCV DNN)
+    ObjectDetectionBackend = "jetnet"
+
+    # Vision pipeline, "thread" (one process plus the face recognition worker) or "process" (capture, object
+    # detection and face recognition each in their own process, frames shared through shared memory)
+    VisionPipeline = "thread"
+
+    # How several images of one person are matched, "multi" (closest image) or "centroid" (their mean encoding)
+    FaceIdentityMode = "multi"
+
+    # Frame rate cap of the MJPEG live view stream
+    LiveViewMaxFPS = 5
+
     MyName = "Ellee"
@@ -16,60 +16,75 @@ else:
 
 from brain_state_machine import BrainStateMachine, StateMachineReturn
 from const import Const
+from target_predictor import TargetPredictor
 
 
 class EllaBot(object):
 
     def __init__(self):
-        self._head = HeadController()
+        self._head = HeadController(deadband=Const.HeadTrackingDeadband)
         self._sight = Sight()
         self._brain_sm = BrainStateMachine()
+        self._target_predictor = TargetPredictor()
 
-    def run(self):
-        ctr = 0
-        camera_heading_range = (40, 140)
+    def _person_head_angle(self, person, timestamp):
+        # (heading, pitch) to turn the head to, to look at the person as seen in the frame captured at timestamp
         camera_pitch_range = (40, 140)
 
+        f_top = person.face_bbox.y1
+        f_bottom = person.face_bbox.y2
+
+        f_center_y = (f_top * 0.2 + f_bottom * 0.8) # Approx eye position
+
+        par_y = f_center_y / Const.CaptureHeight
+
+        heading = person.camera_heading()
+        pitch = camera_pitch_range[0] * (1.0 - par_y) + camera_pitch_range[1] * par_y
+
+        if person.camera_id is None or person.camera_id == 0:
+            # Offset the camera heading/pitch with the head heading/pitch when the frame was captured, the
+            # head has moved on since
+            head_heading, head_pitch = self._head.head_angle_at(timestamp)
+            heading = head_heading + heading - 90
+            pitch = head_pitch + pitch - 90
+        else:
+            # Seen by one of the cameras fixed to the body. Turn the head towards the person and
+            # keep the pitch level, the main camera takes over once the person is in its view
+            pitch = 90
+
+        return heading, pitch
+
+    def run(self):
         while True:
             person, updated_od, updated_fd = self._sight.detect()
             state_return, new_face_to_register = self._brain_sm.update(person)
+            # Let the vision pipeline idle while nobody is around
+            self._sight.set_brain_state(self._brain_sm.state())
 
             if new_face_to_register is not None:
                 self._sight.register_new_face(new_face_to_register)
 
-            if ctr > 5 and updated_od:
-                ctr = 0
-                # adjust head every 5 frames
-                if person is not None and person.face_bbox is not None:
-                    f_left = person.face_bbox.x1
-                    f_top = person.face_bbox.y1
-                    f_right = person.face_bbox.x2
-                    f_bottom = person.face_bbox.y2
-
-                    f_center_x = (f_left + f_right) / 2
-                    f_center_y = (f_top * 0.2 + f_bottom * 0.8) # Approx eye position
-
-                    par_x = 1.0 - f_center_x / Const.CaptureWidth
-                    par_y = f_center_y / Const.CaptureHeight
-
-                    heading = camera_heading_range[0] * (1.0 - par_x) + camera_heading_range[1] * par_x
-                    pitch = camera_pitch_range[0] * (1.0 - par_y) + camera_pitch_range[1] * par_y
-
-                    head_heading, head_pitch = self._head.current_head_angle()
+            # Adjust the head on every frame, aiming where the person will be once the servos get there
+            if person is not None and person.face_bbox is not None:
+                timestamp = person.timestamp if person.timestamp is not None else time.monotonic()
+                heading, pitch = self._person_head_angle(person, timestamp)
+                self._target_predictor.update(heading, pitch, timestamp, person.camera_id)
 
-                    # Offset the camera heading/pitch with the current head heading/pitch
-                    heading = head_heading + heading - 90
-                    pitch = head_pitch + pitch - 90
+                target = self._target_predictor.predict(time.monotonic())
+                if target is not None:
+                    latency_ms = self._target_predictor.latency * 1000
+                    print(f"Heading {target[0]:.1f} pitch {target[1]:.1f} latency {latency_ms:.0f} ms")
 
-                    print(f"Heading {heading:.1f} pitch {pitch:.1f}")
+                    self._head.look_at(*target)
+            elif state_return == StateMachineReturn.HeadReset:
+                # Reset the head
+                self._target_predictor.reset()
+                self._head.look_at(90, 90)
 
-                    self._head.look_at(heading, pitch)
-                else:
-                    # Reset the head
-                    if state_return == StateMachineReturn.HeadReset:
-                        self._head.look_at(90, 90)
-            ctr += 1
 
+# The face recognition worker is a spawned process which re-imports this module, so only start the bot
+# when run as a script
+if __name__ == "__main__":
+    ella_bot = EllaBot()
+    ella_bot.run()
 
-ella_bot = EllaBot()
-ella_bot.run()
@@ -0,0 +1,157 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import face_recognition
+from PIL import Image
+
+from const import Const
+from face_detection import FaceDetection
+from face_embedding_store import FaceEmbeddingStore
+from utilities.fileSearch import FileSearch
+
+# Run from the repository root, while the bot is not running:
+#   python face_bulk_enrollment.py photos/ --workers 4
+#
+# photos/ holds a sub folder per person with any number of images (photos/gus/1.jpg, photos/gus/2.png, ...) and
+# / or single name.jpg images. Every image with exactly one face is copied to resources/faces/<name>/ and its
+# encoding written to the embedding store, so FaceDetection starts without encoding anything.
+# Several images of a person are matched as set by Const.FaceIdentityMode
+
+
+class EnrollStatus(object):
+    Enrolled = "enrolled"
+    NoFace = "no_face"
+    MultipleFaces = "multiple_faces"
+    Unreadable = "unreadable"
+
+
+def _encode_image(image_path, upsample):
+    # Runs in the pool. Returns (status, encoding)
+    try:
+        img = face_recognition.load_image_file(image_path)
+    except (OSError, ValueError):
+        return EnrollStatus.Unreadable, None
+
+    face_locations = face_recognition.face_locations(img, number_of_times_to_upsample=upsample)
+    if len(face_locations) == 0:
+        return EnrollStatus.NoFace, None
+    if len(face_locations) > 1:
+        # We cannot tell which face is the person
+        return EnrollStatus.MultipleFaces, None
+
+    return EnrollStatus.Enrolled, face_recognition.face_encodings(img, face_locations)[0]
+
+
+class FaceBulkEnrollment(object):
+    # Encode folders of photos in a pool of processes, which is kept for several enroll calls
+    ImageExtensions = (".jpg", ".jpeg", ".png")
+
+    def __init__(self, face_folder=None, num_workers=None, upsample=1):
+        if face_folder is None:
+            face_folder = os.path.join(os.getcwd(), FaceDetection.FACE_FOLDER)
+
+        self._face_folder = face_folder
+        self._upsample = upsample
+        self._num_workers = num_workers or os.cpu_count() or 1
+
+        # dlib is not fork safe once used, spawn clean workers
+        self._executor = ProcessPoolExecutor(max_workers=self._num_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+
+    @classmethod
+    def collect_images(cls, photo_folder):
+        # (label, image path) of every image, the label being the sub folder or the file name
+        images = []
+
+        for entry in sorted(os.listdir(photo_folder)):
+            path = os.path.join(photo_folder, entry)
+
+            if os.path.isdir(path):
+                images.extend((entry, image_path) for image_path in
+                              sorted(FileSearch.collectFilesEndsWithNameRecursively(None, path))
+                              if image_path.lower().endswith(cls.ImageExtensions))
+            elif entry.lower().endswith(cls.ImageExtensions):
+                images.append((os.path.splitext(entry)[0], path))
+
+        return images
+
+    def _copy(self, photo_folder, label, image_path):
+        # Into the person folder of the face folder, as a jpg named after its path in the person's photo folder
+        person_folder = os.path.join(photo_folder, label)
+        if not os.path.isdir(person_folder):
+            person_folder = photo_folder
+        rel_path = os.path.splitext(os.path.relpath(image_path, person_folder))[0]
+        save_path = os.path.join(self._face_folder, label, rel_path.replace(os.sep, "_") + ".jpg")
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+
+        if image_path.lower().endswith((".jpg", ".jpeg")):
+            shutil.copyfile(image_path, save_path)
+        else:
+            Image.open(image_path).convert("RGB").save(save_path, format="JPEG")
+
+        return save_path
+
+    def enroll(self, photo_folder):
+        images = self.collect_images(photo_folder)
+        counts = {status: 0 for status in [EnrollStatus.Enrolled, EnrollStatus.NoFace,
+                                           EnrollStatus.MultipleFaces, EnrollStatus.Unreadable]}
+        encodings = {}
+        identities = {}
+
+        start = time.monotonic()
+        chunk_size = max(1, len(images) // (self._num_workers * 8))
+        results = self._executor.map(_encode_image, [image_path for _, image_path in images],
+                                     [self._upsample] * len(images), chunksize=chunk_size)
+
+        for (label, image_path), (status, encoding) in zip(images, results):
+            counts[status] += 1
+            if status != EnrollStatus.Enrolled:
+                print(f"Skipping {image_path}: {status}")
+                continue
+
+            encodings[self._copy(photo_folder, label, image_path)] = encoding
+            identities[label] = identities.get(label, 0) + 1
+        encode_time = time.monotonic() - start
+
+        # Record the new encodings. Images enrolled before are already in the store, others which were
+        # dropped into the face folder by hand are encoded here
+        store = FaceEmbeddingStore(self._face_folder, dtype=FaceDetection.EmbeddingDType)
+        face_files = FileSearch.collectFilesEndsWithNameRecursively(".jpg", self._face_folder)
+        store.sync(face_files, lambda face_file: FaceDetection.face_file_label(self._face_folder, face_file),
+                   lambda face_file: encodings[face_file] if face_file in encodings else
+                   _encode_image(face_file, self._upsample)[1])
+        total_time = time.monotonic() - start
+
+        return {"images": len(images),
+                "identities": len(identities),
+                "identity_mode": Const.FaceIdentityMode,
+                "workers": self._num_workers,
+                "encode_time_s": encode_time,
+                "total_time_s": total_time,
+                "images_per_s": len(images) / encode_time if encode_time > 0 else 0.0,
+                **counts}
+
+    def close(self):
+        self._executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enroll folders of face photos in bulk")
+    parser.add_argument("photo_folders", nargs="+")
+    parser.add_argument("--workers", type=int, default=None, help="Encoding processes, all cores by default")
+    parser.add_argument("--upsample", type=int, default=1, help="Face detection upsampling, for small faces")
+    args = parser.parse_args()
+
+    enrollment = FaceBulkEnrollment(num_workers=args.workers, upsample=args.upsample)
+    try:
+        results = [dict(folder=photo_folder, **enrollment.enroll(photo_folder))
+                   for photo_folder in args.photo_folders]
+    finally:
+        enrollment.close()
+
+    print(json.dumps(results, indent=4))
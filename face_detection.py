@@ -1,51 +1,249 @@
 import face_recognition
 import os
+import time
 import cv2
 import numpy as np
 from utilities.fileSearch import FileSearch
 from utilities.rectArea import RectArea
+from utilities.bufferPool import BufferPool
 from face_object import FaceObject
+from face_gallery import FaceGallery
+from face_embedding_store import FaceEmbeddingStore
+from frame_packet import FramePacket
+from face_enrollment_writer import FaceEnrollmentWriter
+from identity_cache import IdentityCache
+from const import Const
 
 
 class FaceDetection(object):
     FACE_FOLDER = "resources/faces"
 
-    def __init__(self):
-        face_files = FileSearch.collectFilesEndsWithName(".jpg", os.path.join(os.getcwd(), self.FACE_FOLDER))
-        self.face_encoding_db = []
-        self.face_labels = []
-
-        for face in face_files:
-            img = face_recognition.load_image_file(face)
-            name = face.split("/")[-1].replace(".jpg", "")
-            self.face_labels.append(name)
-            self.face_encoding_db.append(face_recognition.face_encodings(img)[0])
-
-    def detect(self, image):
-        # Flip color channel
-        res_img = image[:, :, ::-1]
-        face_locations = face_recognition.face_locations(res_img)
+    # Use np.float16 to halve the memory taken by a big gallery
+    EmbeddingDType = np.float32
+
+    # Regions smaller than this (in pixels) cannot hold a detectable face
+    MinRegionSize = 20
+
+    # Faces which may get registered carry a square crop of FaceCropSize pixels around the face, with
+    # FaceCropMargin of the face size added on every side. At most MaxFaceCrops crops are alive at a time
+    FaceCropSize = 150
+    FaceCropMargin = 0.25
+    MaxFaceCrops = 8
+
+    def __init__(self, watch_folder=True, identity_mode=Const.FaceIdentityMode, gallery=None):
+        # With a gallery, faces are matched against it only. The face folder and its embedding store are not
+        # read nor written then, and registered faces are only added to the gallery
+        face_folder = os.path.join(os.getcwd(), self.FACE_FOLDER)
+        self._face_folder = face_folder
+        self._crop_pool = BufferPool((self.FaceCropSize, self.FaceCropSize, 3), np.uint8, self.MaxFaceCrops)
+
+        # Seconds spent in each stage of the last detect call
+        self.last_timings = {"convert": 0.0, "locate": 0.0, "encode": 0.0, "match": 0.0}
+
+        if gallery is not None:
+            self.gallery = gallery
+            self._embedding_store = None
+            self._enrollment_writer = None
+            return
+
+        face_files = FileSearch.collectFilesEndsWithNameRecursively(".jpg", face_folder)
+
+        # Only new or changed images are encoded, the rest is memory-mapped from the embedding store
+        self._embedding_store = FaceEmbeddingStore(face_folder, dtype=self.EmbeddingDType)
+        face_labels, face_encodings = self._embedding_store.sync(face_files, self._face_file_label,
+                                                                 self._encode_face_file)
+
+        # Several images of a person are matched one by one, or averaged into one identity
+        self.gallery = FaceGallery(dtype=self.EmbeddingDType, identity_mode=identity_mode)
+        self.gallery.set(face_labels, face_encodings)
+
+        # From now on new faces are written, and the face folder watched, on a background thread
+        self._enrollment_writer = FaceEnrollmentWriter(face_folder, self._embedding_store, self.gallery,
+                                                       self._face_file_label, self._encode_face_file,
+                                                       watch_folder=watch_folder)
+
+    @staticmethod
+    def face_file_label(face_folder, face_file):
+        # Either name.jpg in the face folder or any image in a name/ sub folder, for several images per person
+        parts = os.path.relpath(face_file, face_folder).split(os.sep)
+
+        if len(parts) > 1:
+            return parts[0]
+
+        return parts[0].replace(".jpg", "")
+
+    def _face_file_label(self, face_file):
+        return self.face_file_label(self._face_folder, face_file)
+
+    @staticmethod
+    def _encode_face_file(face_file):
+        img = face_recognition.load_image_file(face_file)
+        encodings = face_recognition.face_encodings(img)
+
+        if len(encodings) == 0:
+            print(f"No face found in {face_file}")
+            return None
+
+        return encodings[0]
+
+    @staticmethod
+    def _merge_regions(regions):
+        # Union overlapping regions so no part of the frame is scanned twice
+        merged = []
+
+        for region in regions:
+            while True:
+                overlapping = [r for r in merged if r.isOverlap(region)]
+                if len(overlapping) == 0:
+                    break
+
+                for r in overlapping:
+                    merged.remove(r)
+                    region = region.union(r)
+
+            merged.append(region)
+
+        return merged
+
+    def _locate_faces(self, packet, regions, scale, upsample):
+        # Return face locations (top, right, bottom, left) in image coordinates. Only the given regions
+        # (RectArea in image coordinates) are searched, each on a copy downscaled by scale
+        if regions is None:
+            # A full frame scan uses the downscaled RGB frame of the packet, shared with the other consumers
+            face_locations = face_recognition.face_locations(packet.scaled(scale, "rgb"),
+                                                             number_of_times_to_upsample=upsample)
+
+            return [(int(top / scale), int(right / scale), int(bottom / scale), int(left / scale))
+                    for top, right, bottom, left in face_locations]
+
+        image = packet.rgb()
+        height, width = image.shape[:2]
+
+        face_locations = []
+        for region in self._merge_regions(regions):
+            x1 = max(0, int(region.x1))
+            y1 = max(0, int(region.y1))
+            x2 = min(width, int(region.x2))
+            y2 = min(height, int(region.y2))
+
+            if x2 - x1 < self.MinRegionSize or y2 - y1 < self.MinRegionSize:
+                continue
+
+            crop = image[y1:y2, x1:x2]
+            if scale != 1.0:
+                crop = cv2.resize(crop, (max(1, int((x2 - x1) * scale)), max(1, int((y2 - y1) * scale))),
+                                  interpolation=cv2.INTER_AREA)
+
+            for top, right, bottom, left in face_recognition.face_locations(crop,
+                                                                           number_of_times_to_upsample=upsample):
+                face_locations.append((int(top / scale) + y1, int(right / scale) + x1,
+                                       int(bottom / scale) + y1, int(left / scale) + x1))
+
+        return face_locations
+
+    def _crop_face(self, image, face_bbox, must_crop=False):
+        # Square crop centered on the face, moved inside the frame at the frame borders, resized into a pooled
+        # buffer. None when all crops are in use, unless must_crop which then allocates a crop of its own
+        crop = self._crop_pool.acquire()
+        if crop is None:
+            if not must_crop:
+                return None
+            crop = np.empty((self.FaceCropSize, self.FaceCropSize, 3), dtype=np.uint8)
+
+        height, width = image.shape[:2]
+        center_x, center_y = face_bbox.center()
+        size = max(face_bbox.width(), face_bbox.height()) * (1.0 + 2 * self.FaceCropMargin)
+        size = int(max(1, min(size, width, height)))
+
+        x1 = int(min(max(0, center_x - size / 2), width - size))
+        y1 = int(min(max(0, center_y - size / 2), height - size))
+
+        cv2.resize(image[y1:y1 + size, x1:x1 + size], (self.FaceCropSize, self.FaceCropSize), dst=crop,
+                   interpolation=cv2.INTER_AREA)
+
+        return crop
+
+    def detect(self, image, regions=None, scale=1.0, upsample=1, known_identities=None):
+        # image is a BGR image or a FramePacket. The RGB frame is converted once per packet into a contiguous
+        # buffer, so dlib does not need to copy it again.
+        # Faces found inside the region of one of known_identities take that identity without being encoded
+        packet = FramePacket.wrap(image)
+        convert_start = time.monotonic()
+        res_img = packet.rgb()
+        start = time.monotonic()
+        face_locations = self._locate_faces(packet, regions, scale, upsample)
+        located = time.monotonic()
         found_faces = []
+        encoded = matched = located
 
         if len(face_locations) > 0:
-            found_faces_encoding = face_recognition.face_encodings(res_img, face_locations)
+            cached = IdentityCache.match_faces([RectArea(left, top, right, bottom)
+                                                for top, right, bottom, left in face_locations],
+                                               known_identities or [])
+            to_encode = [i for i in range(len(face_locations)) if i not in cached]
 
-            for i, cur_face in enumerate(found_faces_encoding):
-                matches = face_recognition.compare_faces(self.face_encoding_db, cur_face)
-                face_distances = face_recognition.face_distance(self.face_encoding_db, cur_face)
-                cur_best_face_distance_idx = np.argmin(face_distances)
+            # Encode at full resolution even when the faces were located on a downscaled copy
+            found_faces_encoding = []
+            if len(to_encode) > 0:
+                found_faces_encoding = face_recognition.face_encodings(res_img,
+                                                                       [face_locations[i] for i in to_encode])
+            encoded = time.monotonic()
 
-                found_face_name = None
+            # Match every face in the frame against the whole gallery in one go
+            matches = dict(zip(to_encode, zip(self.gallery.match(found_faces_encoding), found_faces_encoding)))
+            matched = time.monotonic()
 
-                if matches[cur_best_face_distance_idx]:
-                    found_face_name = self.face_labels[cur_best_face_distance_idx]
+            # The biggest face is the one the robot engages with. It always gets its crop, so a person we talked
+            # to can be registered even when the crops of the other faces are still held on to
+            focus_index = max(range(len(face_locations)),
+                              key=lambda i: (face_locations[i][2] - face_locations[i][0]) *
+                                            (face_locations[i][1] - face_locations[i][3]))
 
-                top, left, bottom, right = face_locations[i]
+            for i, (top, right, bottom, left) in enumerate(face_locations):
                 face_bbox = RectArea(left, top, right, bottom)
-                found_faces.append(FaceObject(found_face_name, face_bbox, face_distances[cur_best_face_distance_idx], res_img))
+
+                if i in cached:
+                    name, face_distance, encoding = cached[i]
+                    found_faces.append(FaceObject(name, face_bbox, face_distance, encoding=encoding,
+                                                  is_cached=True))
+                else:
+                    (name, face_distance), encoding = matches[i]
+                    face = FaceObject(name, face_bbox, face_distance, encoding=encoding)
+
+                    # Only a face we may register keeps a picture, the frame itself is not held on to
+                    if face.can_register():
+                        face.face_image = self._crop_face(res_img, face_bbox, must_crop=i == focus_index)
+
+                    found_faces.append(face)
+
+        self.last_timings = {"convert": start - convert_start, "locate": located - start,
+                             "encode": encoded - located, "match": matched - encoded}
 
         return found_faces
 
     def register_new_face(self, face_object):
-        save_path = os.path.join(os.getcwd(), f"{self.FACE_FOLDER}/{face_obj.name}.jpg")
-        face_object.face_image.save(save_path)
+        # The new face is recognised from the next detect call on, its image and encoding are saved in the
+        # background. The encoding computed while we talked to the person is reused when there is one
+        if face_object.face_image is None:
+            print(f"No face image to register {face_object.name}")
+            return False
+
+        encoding = face_object.encoding
+        if encoding is None:
+            encodings = face_recognition.face_encodings(face_object.face_image)
+            if len(encodings) == 0:
+                print(f"No face found to register {face_object.name}")
+                return False
+
+            encoding = encodings[0]
+
+        if self._enrollment_writer is None:
+            self.gallery.add(face_object.name, encoding)
+        else:
+            self._enrollment_writer.enroll(face_object.name, face_object.face_image, encoding)
+
+        return True
+
+    def stop(self):
+        if self._enrollment_writer is not None:
+            self._enrollment_writer.stop()
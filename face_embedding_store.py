@@ -0,0 +1,213 @@
+import os
+import uuid
+import hashlib
+import numpy as np
+
+from utilities.jsonFile import JsonFile
+
+
+class FaceEmbeddingStore(object):
+    # Persistent cache of face encodings, keyed by image path, mtime and content hash. The encodings live in a
+    # single .npy matrix which is memory-mapped read-only, so startup does not re-encode unchanged images and
+    # several processes share the same pages.
+    # Every matrix is written under a new name and the index names the matrix its rows point into, so swapping in
+    # the index commits both at once. A crash in between leaves the old index with its old matrix
+    STORE_FOLDER = ".embeddings"
+    INDEX_FILE = "index.json"
+    EMBEDDINGS_FILE = "embeddings.npy"      # Matrix of stores written before the index named it
+    EMBEDDINGS_PREFIX = "embeddings-"
+
+    EncodingSize = 128
+    HashBlockSize = 1 << 20
+
+    def __init__(self, face_folder, dtype=np.float32):
+        self._face_folder = face_folder
+        self._store_folder = os.path.join(face_folder, self.STORE_FOLDER)
+        self._index_path = os.path.join(self._store_folder, self.INDEX_FILE)
+        self._embeddings_file = None
+        self._dtype = np.dtype(dtype)
+
+        self._entries = {}
+        self._embeddings = np.empty((0, self.EncodingSize), dtype=self._dtype)
+        self._dtype_changed = False
+
+        # Incremented on every write, so callers can tell whether a sync changed anything
+        self.version = 0
+
+        self._load()
+
+    def _key(self, file_path):
+        return os.path.relpath(file_path, self._face_folder)
+
+    @classmethod
+    def _file_hash(cls, file_path):
+        sha1 = hashlib.sha1()
+        with open(file_path, "rb") as handle:
+            for block in iter(lambda: handle.read(cls.HashBlockSize), b""):
+                sha1.update(block)
+
+        return sha1.hexdigest()
+
+    def _load(self):
+        if not os.path.exists(self._index_path):
+            return
+
+        try:
+            index = JsonFile.jsonFromFile(self._index_path)
+            embeddings_file = index.get("embeddings", self.EMBEDDINGS_FILE)
+            embeddings = np.load(os.path.join(self._store_folder, embeddings_file), mmap_mode="r")
+        except Exception as e:
+            print(f"Ignoring unreadable face embedding store: {e}")
+            return
+
+        if embeddings.ndim != 2 or embeddings.shape[1] != self.EncodingSize:
+            return
+
+        # The index rows must point into this very matrix, otherwise faces would get the labels of others.
+        # Start over, sync encodes the images again
+        rows = [entry.get("row") for entry in index.get("entries", {}).values()]
+        if index.get("rows", embeddings.shape[0]) != embeddings.shape[0] or \
+                any(row is not None and row >= embeddings.shape[0] for row in rows):
+            print("Ignoring face embedding store whose index does not match its embeddings")
+            return
+
+        # A store written with another dtype is converted and rewritten on the next sync
+        if index.get("dtype") != self._dtype.name:
+            embeddings = np.asarray(embeddings, dtype=self._dtype)
+            self._dtype_changed = True
+
+        self._entries = index.get("entries", {})
+        self._embeddings = embeddings
+        self._embeddings_file = embeddings_file
+
+    def sync(self, face_files, label_callback, encode_callback):
+        # Bring the store up to date with face_files and return (labels, embeddings).
+        # Only new or changed images are passed to encode_callback(file_path), which returns an encoding or None
+        # when the image has no usable face. Unchanged images only cost an os.stat
+        entries = {}
+        sources = []    # For each output row, either a row of the current matrix or a new encoding
+        index_changed = len(face_files) != len(self._entries)
+        embeddings_changed = self._dtype_changed
+
+        for file_path in face_files:
+            key = self._key(file_path)
+            stat = os.stat(file_path)
+            old_entry = self._entries.get(key)
+
+            if old_entry is not None and old_entry["mtime"] == stat.st_mtime_ns and old_entry["size"] == stat.st_size:
+                file_hash = old_entry["hash"]
+            else:
+                file_hash = self._file_hash(file_path)
+                index_changed = True
+
+            if old_entry is None or old_entry["hash"] != file_hash:
+                source = encode_callback(file_path)
+                embeddings_changed = True
+            else:
+                source = old_entry["row"]
+
+            entry = {"hash": file_hash, "mtime": stat.st_mtime_ns, "size": stat.st_size,
+                     "label": label_callback(file_path), "row": None}
+
+            if source is not None:
+                entry["row"] = len(sources)
+                sources.append(source)
+
+            if old_entry is None or old_entry["row"] != entry["row"]:
+                index_changed = True
+                embeddings_changed = True
+            elif old_entry["label"] != entry["label"]:
+                index_changed = True
+
+            entries[key] = entry
+
+        if len(sources) != self._embeddings.shape[0]:
+            embeddings_changed = True
+
+        if embeddings_changed:
+            embeddings = np.empty((len(sources), self.EncodingSize), dtype=self._dtype)
+
+            kept = [(row, source) for row, source in enumerate(sources) if isinstance(source, int)]
+            if len(kept) > 0:
+                dst_rows, src_rows = zip(*kept)
+                embeddings[list(dst_rows)] = self._embeddings[list(src_rows)]
+
+            for row, source in enumerate(sources):
+                if not isinstance(source, int):
+                    embeddings[row] = source
+
+            self._save(entries, embeddings)
+        elif index_changed:
+            self._save(entries, None)
+
+        return self.labels(), self._embeddings
+
+    def add(self, file_path, label, encoding):
+        # Record a single new or replaced image with an already computed encoding, without touching the
+        # other images. The matrix is rewritten, so call it off the latency critical threads
+        key = self._key(file_path)
+        stat = os.stat(file_path)
+        entries = dict(self._entries)
+        old_entry = entries.get(key)
+
+        num_rows = self._embeddings.shape[0]
+        row = old_entry["row"] if old_entry is not None and old_entry["row"] is not None else num_rows
+
+        embeddings = np.empty((max(num_rows, row + 1), self.EncodingSize), dtype=self._dtype)
+        embeddings[:num_rows] = self._embeddings
+        embeddings[row] = encoding
+
+        entries[key] = {"hash": self._file_hash(file_path), "mtime": stat.st_mtime_ns, "size": stat.st_size,
+                        "label": label, "row": row}
+        self._save(entries, embeddings)
+
+    def labels(self):
+        labels = [None] * self._embeddings.shape[0]
+        for entry in self._entries.values():
+            if entry["row"] is not None:
+                labels[entry["row"]] = entry["label"]
+
+        return labels
+
+    def _save(self, entries, embeddings):
+        os.makedirs(self._store_folder, exist_ok=True)
+
+        # A new matrix goes to a file of its own, nothing refers to it until the index is swapped in. The index
+        # is written next to its final location and swapped in, so a crash never leaves a half written store
+        # behind. Processes that already mapped the old matrix keep valid pages
+        if embeddings is None and self._embeddings_file is None:
+            # Nothing written yet, the index needs a matrix to point into
+            embeddings = np.asarray(self._embeddings)
+
+        embeddings_file = self._embeddings_file
+        if embeddings is not None:
+            embeddings_file = f"{self.EMBEDDINGS_PREFIX}{uuid.uuid4().hex}.npy"
+            np.save(os.path.join(self._store_folder, embeddings_file), embeddings)
+            num_rows = embeddings.shape[0]
+        else:
+            num_rows = self._embeddings.shape[0]
+
+        tmp_index_path = self._index_path + ".tmp"
+        JsonFile.jsonToFile(tmp_index_path, {"dtype": self._dtype.name, "embeddings": embeddings_file,
+                                             "rows": num_rows, "entries": entries})
+        os.replace(tmp_index_path, self._index_path)
+
+        self._entries = entries
+        self._dtype_changed = False
+        self.version += 1
+        if embeddings is not None:
+            self._embeddings = np.load(os.path.join(self._store_folder, embeddings_file), mmap_mode="r")
+            self._embeddings_file = embeddings_file
+            self._remove_stale_embeddings()
+
+    def _remove_stale_embeddings(self):
+        # Matrices no index refers to any more, left by earlier saves or by a crash before the index swap
+        for file_name in os.listdir(self._store_folder):
+            if file_name == self._embeddings_file or not file_name.endswith(".npy"):
+                continue
+
+            if file_name.startswith(self.EMBEDDINGS_PREFIX) or file_name == self.EMBEDDINGS_FILE:
+                try:
+                    os.remove(os.path.join(self._store_folder, file_name))
+                except OSError:
+                    pass
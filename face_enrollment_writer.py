@@ -0,0 +1,94 @@
+import os
+import queue
+import threading
+import numpy as np
+from PIL import Image
+
+from utilities.fileSearch import FileSearch
+
+
+class FaceEnrollmentWriter(object):
+    # Background thread which owns the face folder and the embedding store once FaceDetection is running.
+    # It persists faces enrolled at runtime (image and encoding) and picks up images dropped into the face
+    # folder from outside, so neither blocks detect() nor needs a restart
+    WatchInterval = 5.0     # Seconds between face folder scans
+    StopTimeOut = 5.0
+
+    def __init__(self, face_folder, embedding_store, gallery, label_callback, encode_callback, watch_folder=True):
+        self._face_folder = face_folder
+        self._embedding_store = embedding_store
+        self._gallery = gallery
+        self._label_callback = label_callback
+        self._encode_callback = encode_callback
+        self._watch_folder = watch_folder
+
+        # Faces enrolled but not written yet. A folder sync must not drop them from the gallery
+        self._lock = threading.Lock()
+        self._pending = []
+
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def enroll(self, label, face_image, encoding):
+        # Add the face to the gallery right away and queue writing it. face_image is an RGB image
+        job = (label, face_image, np.asarray(encoding))
+
+        with self._lock:
+            self._gallery.add(label, job[2])
+            self._pending.append(job)
+
+        self._jobs.put(job)
+
+    def stop(self):
+        # Finish the queued writes
+        self._jobs.put(None)
+        self._thread.join(self.StopTimeOut)
+
+    def _run(self):
+        while True:
+            try:
+                job = self._jobs.get(timeout=self.WatchInterval if self._watch_folder else None)
+            except queue.Empty:
+                self._sync_folder()
+                continue
+
+            if job is None:
+                break
+
+            try:
+                self._write_face(*job)
+            except Exception as e:
+                print(f"Could not save the face of {job[0]}: {e}")
+
+            with self._lock:
+                self._pending = [pending for pending in self._pending if pending is not job]
+
+    def _write_face(self, label, face_image, encoding):
+        save_path = os.path.join(self._face_folder, f"{label}.jpg")
+
+        # Write next to the final file and swap it in, so the folder scan never sees a half written image
+        tmp_path = save_path + ".tmp"
+        Image.fromarray(face_image).save(tmp_path, format="JPEG")
+        os.replace(tmp_path, save_path)
+
+        self._embedding_store.add(save_path, label, encoding)
+
+    def _sync_folder(self):
+        # Only images which are new or changed since the last sync are encoded
+        version = self._embedding_store.version
+        face_files = FileSearch.collectFilesEndsWithNameRecursively(".jpg", self._face_folder)
+
+        try:
+            labels, encodings = self._embedding_store.sync(face_files, self._label_callback, self._encode_callback)
+        except OSError as e:
+            # A file may disappear while we scan, try again on the next round
+            print(f"Could not sync the face folder: {e}")
+            return
+
+        if self._embedding_store.version != version:
+            with self._lock:
+                self._gallery.set(labels, encodings)
+                for label, _, encoding in self._pending:
+                    self._gallery.add(label, encoding)
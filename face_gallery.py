@@ -0,0 +1,261 @@
+import threading
+import collections
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+class FaceIdentity(object):
+    Multi = "multi"         # Every image of a person is a gallery row, a face matches the closest image
+    Centroid = "centroid"   # The images of a person are averaged into one row
+
+
+class FaceGallery(object):
+    # Same tolerance face_recognition.compare_faces uses by default
+    Tolerance = 0.6
+    EncodingSize = 128
+    MatchBlockSize = 16384
+
+    # Switch to the approximate nearest neighbour index once the gallery is bigger than this
+    # (only if hnswlib is installed)
+    AnnMinIdentities = 5000
+    AnnNeighbours = 8
+    AnnEfConstruction = 200
+    AnnM = 16
+
+    # Rows allocated up front once identities are added one by one, the capacity doubles when full
+    MinCapacity = 64
+
+    def __init__(self, tolerance=Tolerance, use_ann=None, dtype=np.float32, identity_mode=FaceIdentity.Multi):
+        self.tolerance = tolerance
+        self.identity_mode = identity_mode
+        self._dtype = dtype
+        self._use_ann = use_ann
+        self._lock = threading.Lock()
+
+        self._encodings = np.empty((0, self.EncodingSize), dtype=dtype)
+        self._sq_norms = np.empty((0,), dtype=np.float32)
+        self.labels = []
+        self._ann_index = None
+        # Centroid mode: label -> (row, number of images averaged into the row)
+        self._centroids = {}
+
+        # Growable copy of the encodings used by add(). None while the encodings are a (mapped) set() matrix
+        self._buffer = None
+        self._sq_norms_buffer = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def set(self, labels, encodings):
+        # Replace the gallery content. encodings can be any (N, 128) array, including a memory-mapped one,
+        # and will not be copied when it already has the gallery dtype
+        encodings = np.asarray(encodings)
+        if encodings.ndim != 2 or encodings.shape[1] != self.EncodingSize:
+            encodings = encodings.reshape(-1, self.EncodingSize)
+        if encodings.dtype != self._dtype:
+            encodings = encodings.astype(self._dtype)
+
+        if len(labels) != encodings.shape[0]:
+            raise ValueError(f"Got {len(labels)} labels for {encodings.shape[0]} encodings")
+
+        centroids = {}
+        if self.identity_mode == FaceIdentity.Centroid:
+            counts = collections.Counter(labels)
+            labels, encodings = self.centroids(labels, encodings)
+            centroids = {label: (row, counts[label]) for row, label in enumerate(labels)}
+
+        sq_norms = np.einsum("ij,ij->i", encodings, encodings, dtype=np.float32)
+        # Built aside and swapped in with the rows it indexes
+        ann_index = self._build_ann_index(encodings)
+
+        with self._lock:
+            self._encodings = encodings
+            self._sq_norms = sq_norms
+            self.labels = list(labels)
+            self._ann_index = ann_index
+            self._centroids = centroids
+            self._buffer = None
+            self._sq_norms_buffer = None
+
+    @classmethod
+    def centroids(cls, labels, encodings):
+        # One mean encoding per label, in the order the labels first appear
+        label_rows = {}
+        for label in labels:
+            label_rows.setdefault(label, len(label_rows))
+
+        rows = np.fromiter((label_rows[label] for label in labels), dtype=np.intp, count=len(labels))
+        sums = np.zeros((len(label_rows), cls.EncodingSize), dtype=np.float64)
+        np.add.at(sums, rows, np.asarray(encodings, dtype=np.float64))
+        counts = np.bincount(rows, minlength=len(label_rows))
+
+        return list(label_rows.keys()), (sums / np.maximum(counts, 1)[:, None]).astype(encodings.dtype)
+
+    def add(self, label, encoding):
+        # Append one identity, e.g. a face enrolled at runtime. Amortised O(1): the encodings are copied into
+        # a growable buffer the first time, and only again when its capacity doubles. Rows are only ever written
+        # past the end of the current encodings, so the snapshots matches work on never change under them.
+        # In centroid mode a known label has its row moved to the mean with the new encoding instead
+        encoding = np.asarray(encoding, dtype=self._dtype).reshape(self.EncodingSize)
+
+        with self._lock:
+            if self.identity_mode == FaceIdentity.Centroid and label in self._centroids:
+                self._update_centroid(label, encoding)
+                return
+
+            size = len(self.labels)
+            sq_norm = np.dot(encoding.astype(np.float32), encoding.astype(np.float32))
+
+            if self._buffer is None or size >= self._buffer.shape[0]:
+                capacity = max(self.MinCapacity, 2 * size)
+                buffer = np.empty((capacity, self.EncodingSize), dtype=self._dtype)
+                buffer[:size] = self._encodings
+                sq_norms_buffer = np.empty((capacity,), dtype=np.float32)
+                sq_norms_buffer[:size] = self._sq_norms
+
+                self._buffer = buffer
+                self._sq_norms_buffer = sq_norms_buffer
+
+            self._buffer[size] = encoding
+            self._sq_norms_buffer[size] = sq_norm
+
+            self._encodings = self._buffer[:size + 1]
+            self._sq_norms = self._sq_norms_buffer[:size + 1]
+            # A new list, the snapshot of a running match keeps the old one
+            self.labels = self.labels + [label]
+            if self.identity_mode == FaceIdentity.Centroid:
+                self._centroids[label] = (size, 1)
+
+            # The index is changed in place, it is only ever queried under the lock
+            if self._ann_index is not None:
+                if size >= self._ann_index.get_max_elements():
+                    self._ann_index.resize_index(max(self.MinCapacity, 2 * size))
+                self._ann_index.add_items(encoding.astype(np.float32)[None, :], np.array([size]))
+            elif self._should_use_ann(size + 1):
+                self._ann_index = self._build_ann_index(self._encodings)
+
+    def _update_centroid(self, label, encoding):
+        # Running mean of the row of label. The row may be part of a running match's snapshot, so the encodings
+        # are copied (a rare O(N), a known person registered again) rather than written in place
+        row, count = self._centroids[label]
+        mean = (np.asarray(self._encodings[row], dtype=np.float64) * count + encoding) / (count + 1)
+        mean = mean.astype(self._dtype)
+
+        size = len(self.labels)
+        capacity = max(self.MinCapacity, size) if self._buffer is None else self._buffer.shape[0]
+        buffer = np.empty((capacity, self.EncodingSize), dtype=self._dtype)
+        buffer[:size] = self._encodings
+        buffer[row] = mean
+        sq_norms_buffer = np.empty((capacity,), dtype=np.float32)
+        sq_norms_buffer[:size] = self._sq_norms
+        sq_norms_buffer[row] = np.dot(mean.astype(np.float32), mean.astype(np.float32))
+
+        self._buffer = buffer
+        self._sq_norms_buffer = sq_norms_buffer
+        self._encodings = buffer[:size]
+        self._sq_norms = sq_norms_buffer[:size]
+        self._centroids[label] = (row, count + 1)
+
+        # hnswlib replaces the point of an id which is already in the index
+        if self._ann_index is not None:
+            self._ann_index.add_items(mean.astype(np.float32)[None, :], np.array([row]))
+
+    def _should_use_ann(self, size):
+        if hnswlib is None or self._use_ann is False:
+            return False
+
+        return self._use_ann is True or size >= self.AnnMinIdentities
+
+    def _build_ann_index(self, encodings):
+        if not self._should_use_ann(encodings.shape[0]):
+            return None
+
+        index = hnswlib.Index(space="l2", dim=self.EncodingSize)
+        index.init_index(max_elements=encodings.shape[0], ef_construction=self.AnnEfConstruction, M=self.AnnM)
+        index.add_items(np.asarray(encodings, dtype=np.float32), np.arange(encodings.shape[0]))
+        index.set_ef(max(self.AnnNeighbours * 4, 32))
+
+        return index
+
+    def _snapshot(self):
+        # Labels and the rows they belong to, taken together. set() and add() run on the enrollment thread
+        with self._lock:
+            return self.labels, self._encodings, self._sq_norms
+
+    def distances(self, query_encodings):
+        # Euclidean distance matrix (num_queries, num_identities) computed in one batch using
+        # |a - b|^2 = |a|^2 + |b|^2 - 2ab
+        queries = np.asarray(query_encodings, dtype=np.float32).reshape(-1, self.EncodingSize)
+        _, encodings, sq_norms = self._snapshot()
+
+        return self._distances(queries, encodings, sq_norms)
+
+    def _distances(self, queries, encodings, sq_norms):
+        if encodings.shape[0] == 0 or queries.shape[0] == 0:
+            return np.empty((queries.shape[0], encodings.shape[0]), dtype=np.float32)
+
+        q_sq_norms = np.einsum("ij,ij->i", queries, queries)
+        sq_dist = np.empty((queries.shape[0], encodings.shape[0]), dtype=np.float32)
+
+        # Work through the gallery in blocks so a compact (e.g. float16) gallery is only ever
+        # up-cast a block at a time
+        for start in range(0, encodings.shape[0], self.MatchBlockSize):
+            end = min(start + self.MatchBlockSize, encodings.shape[0])
+            block = np.asarray(encodings[start:end], dtype=np.float32)
+            np.matmul(queries, block.T, out=sq_dist[:, start:end])
+
+        sq_dist *= -2.0
+        sq_dist += q_sq_norms[:, None]
+        sq_dist += sq_norms[None, :]
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+
+        return np.sqrt(sq_dist, out=sq_dist)
+
+    def match(self, query_encodings):
+        # Return a list of (name, distance) per query encoding. name is None when the best match is further
+        # than the tolerance or the gallery is empty
+        queries = np.asarray(query_encodings, dtype=np.float32).reshape(-1, self.EncodingSize)
+        num_queries = queries.shape[0]
+
+        if num_queries == 0:
+            return []
+
+        # Everything below works on one snapshot, so a concurrent set() or add() cannot pair new rows with
+        # old labels
+        candidates = None
+        with self._lock:
+            labels, encodings, sq_norms = self.labels, self._encodings, self._sq_norms
+            if self._ann_index is not None and len(labels) > 0:
+                candidates, _ = self._ann_index.knn_query(queries, k=min(self.AnnNeighbours, len(labels)))
+
+        if len(labels) == 0:
+            return [(None, None)] * num_queries
+
+        if candidates is not None:
+            best_idx, best_dist = self._rerank(candidates, queries, encodings)
+        else:
+            face_distances = self._distances(queries, encodings, sq_norms)
+            best_idx = np.argmin(face_distances, axis=1)
+            best_dist = face_distances[np.arange(num_queries), best_idx]
+
+        results = []
+        for idx, dist in zip(best_idx, best_dist):
+            name = labels[idx] if dist <= self.tolerance else None
+            results.append((name, float(dist)))
+
+        return results
+
+    def _rerank(self, candidates, queries, encodings):
+        # Re-rank the few ANN candidates exactly so reported distances match the brute force path
+        k = candidates.shape[1]
+        candidate_enc = np.asarray(encodings[candidates.ravel()], dtype=np.float32).reshape(
+            candidates.shape[0], k, self.EncodingSize)
+        exact = np.linalg.norm(candidate_enc - queries[:, None, :], axis=2)
+        best = np.argmin(exact, axis=1)
+        rows = np.arange(candidates.shape[0])
+
+        return candidates[rows, best], exact[rows, best]
@@ -1,10 +1,26 @@
 import os
 
+from const import Const
+
 
 class FaceObject(object):
+    # Faces smaller than 1/20 of the capture window size are not registered
+    MinWidthToRegister = Const.CaptureWidth / 20
+    MinHeightToRegister = Const.CaptureHeight / 20
 
-    def __init__(self, name, bounding_box, score, face_image=None):
+    def __init__(self, name, bounding_box, score, face_image=None, encoding=None, is_cached=False):
         self.name = name
         self.bounding_box = bounding_box
         self.score = score
+        # Small RGB crop around the face, only taken for faces which may get registered
         self.face_image = face_image
+        # 128-d face encoding, reused to enroll the face without encoding it again
+        self.encoding = encoding
+        # The identity came from the IdentityCache instead of a new encoding and match
+        self.is_cached = is_cached
+
+    def can_register(self):
+        # Unknown and big enough to be recognised again from its picture
+        return self.name is None and not self.is_cached and self.bounding_box is not None and \
+            self.bounding_box.width() >= self.MinWidthToRegister and \
+            self.bounding_box.height() >= self.MinHeightToRegister
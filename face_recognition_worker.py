@@ -0,0 +1,210 @@
+import multiprocessing
+import queue
+import time
+
+from face_detection import FaceDetection
+
+
+class FaceRecognitionResult(object):
+
+    def __init__(self, frame_id, frame_timestamp, faces, processing_time, timings):
+        self.frame_id = frame_id
+        self.frame_timestamp = frame_timestamp
+        self.faces = faces
+        self.processing_time = processing_time
+        # Per stage durations reported by FaceDetection
+        self.timings = timings
+
+
+class FaceRecognitionWorker(object):
+    # Run FaceDetection in its own process so the dlib detection and encoding never stall the caller.
+    # Only one frame is in flight at a time, and only the newest submitted frame waits behind it (latest frame wins).
+    # With a SharedFrameRing, frames of the ring are passed by slot instead of being copied and pickled.
+    # A worker which dies is restarted, up to MaxRestarts times. After that faces are no longer recognised
+    StopTimeOut = 5
+    MaxRestarts = 3
+
+    def __init__(self, frame_ring=None):
+        # Spawn a clean process rather than forking one which may already hold camera / CUDA handles
+        self._ctx = multiprocessing.get_context("spawn")
+        self._frame_ring = frame_ring
+        self._frame_queue = None
+        self._start_process()
+
+        self._frame_id = 0
+        self._in_flight = False
+        # Ring slot of the frame in flight. Released here when its result arrives or the worker dies with it
+        self._in_flight_slot = None
+        self._pending = None
+
+        self.restarts = 0
+        self.disabled = False
+        self.dropped_frames = 0
+        self.processed_frames = 0
+        self.last_processing_time = None
+
+    def _start_process(self):
+        # Fresh queues as well, a worker which died may have held the lock of the old ones. Registrations the old
+        # worker had not taken yet are carried over
+        commands = []
+        while self._frame_queue is not None:
+            try:
+                item = self._frame_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[0] == "register":
+                commands.append(item)
+
+        self._frame_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        self._stop_event = self._ctx.Event()
+        for command in commands:
+            self._frame_queue.put(command)
+
+        self._process = self._ctx.Process(target=_worker_main,
+                                          args=(self._frame_queue, self._result_queue, self._stop_event,
+                                                self._frame_ring))
+        self._process.daemon = True
+        self._process.start()
+
+    def submit(self, image, timestamp=None, **detect_args):
+        # Never blocks. A frame waiting for the worker is replaced by this one.
+        # detect_args are passed on to FaceDetection.detect
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        # The frame may live in a reused capture buffer, keep our own copy until it has been sent
+        self._set_pending(("frame", self._frame_id + 1, timestamp, image.copy(), detect_args))
+
+    def submit_slot(self, slot, timestamp, **detect_args):
+        # Like submit, for a frame of the SharedFrameRing given to the constructor. The slot is held until the
+        # worker is done with it
+        self._frame_ring.retain(slot)
+        self._set_pending(("slot", self._frame_id + 1, timestamp, slot, detect_args))
+
+    def _set_pending(self, item):
+        self._frame_id += 1
+        self._drop_pending()
+        self._pending = item
+        self._dispatch_pending()
+
+    def register_new_face(self, face_obj):
+        # Commands are processed by the worker in order with frames, ahead of any pending frame
+        self._frame_queue.put(("register", face_obj))
+
+    def _dispatch_pending(self):
+        if self._in_flight or self._pending is None:
+            return
+
+        if self.disabled:
+            self._drop_pending()
+            return
+
+        self._frame_queue.put(self._pending)
+        if self._pending[0] == "slot":
+            self._in_flight_slot = self._pending[3]
+        self._pending = None
+        self._in_flight = True
+
+    def poll(self):
+        # Return the newest result that arrived since the last poll, or None. Never blocks
+        latest = None
+
+        while True:
+            try:
+                result = self._result_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            self._release_in_flight()
+            self.processed_frames += 1
+            self.last_processing_time = result.processing_time
+
+            if latest is None or result.frame_id > latest.frame_id:
+                latest = result
+
+        if not self.disabled and not self._process.is_alive():
+            self._on_worker_died()
+
+        self._dispatch_pending()
+
+        return latest
+
+    def _release_in_flight(self):
+        if self._in_flight_slot is not None:
+            self._frame_ring.release(self._in_flight_slot)
+
+        self._in_flight = False
+        self._in_flight_slot = None
+
+    def _drop_pending(self):
+        if self._pending is not None:
+            self.dropped_frames += 1
+            if self._pending[0] == "slot":
+                self._frame_ring.release(self._pending[3])
+
+        self._pending = None
+
+    def _on_worker_died(self):
+        # The frame in flight never comes back, free its slot so the ring is not starved. The results which
+        # arrived before are still returned by poll
+        if self._in_flight:
+            self.dropped_frames += 1
+        self._release_in_flight()
+
+        if self.restarts >= self.MaxRestarts:
+            print(f"Face recognition worker died with exit code {self._process.exitcode}, "
+                  f"giving up after {self.restarts} restarts. Faces are not recognised any more")
+            self.disabled = True
+            self._drop_pending()
+            return
+
+        print(f"Face recognition worker died with exit code {self._process.exitcode}, restarting it")
+        self.restarts += 1
+        self._start_process()
+
+    def queue_depth(self):
+        # Frames submitted but not yet returned
+        return int(self._in_flight) + int(self._pending is not None)
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def stop(self):
+        self._stop_event.set()
+        self._frame_queue.put(None)
+        self._process.join(self.StopTimeOut)
+
+        if self._process.is_alive():
+            self._process.terminate()
+
+        self._release_in_flight()
+        self._drop_pending()
+
+
+def _worker_main(frame_queue, result_queue, stop_event, frame_ring):
+    face_detection = FaceDetection()
+
+    while not stop_event.is_set():
+        item = frame_queue.get()
+        if item is None:
+            break
+
+        if item[0] == "register":
+            face_detection.register_new_face(item[1])
+            continue
+
+        kind, frame_id, frame_timestamp, image, detect_args = item
+        start = time.monotonic()
+
+        if kind == "slot":
+            # The slot is released by FaceRecognitionWorker once it has the result
+            faces = face_detection.detect(frame_ring.buffer(image), **detect_args)
+        else:
+            faces = face_detection.detect(image, **detect_args)
+
+        result_queue.put(FaceRecognitionResult(frame_id, frame_timestamp, faces, time.monotonic() - start,
+                                               face_detection.last_timings))
+
+    # Let the enrollment writer finish saving new faces
+    face_detection.stop()
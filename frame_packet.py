@@ -0,0 +1,136 @@
+import threading
+import numpy as np
+import cv2
+
+
+class FrameBufferPool(object):
+    # Free lists of image buffers by (shape, dtype), so the per frame variants reuse the same memory every frame
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = {}
+
+    def acquire(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype))
+
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                return free.pop()
+
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, buffer):
+        key = (buffer.shape, buffer.dtype)
+
+        with self._lock:
+            self._free.setdefault(key, []).append(buffer)
+
+
+class FramePacket(object):
+    # One captured BGR frame plus its derived formats. Every variant is computed at most once per frame, on first
+    # use, into a buffer from the pool. release() hands the buffers back once nobody uses the frame any more.
+    # The variants are shared, consumers must not write into them
+    Colors = ("bgr", "rgb", "rgba", "gray")
+
+    _ConvertCodes = {"rgb": cv2.COLOR_BGR2RGB,
+                     "rgba": cv2.COLOR_BGR2RGBA,
+                     "gray": cv2.COLOR_BGR2GRAY}
+
+    _Channels = {"bgr": 3, "rgb": 3, "rgba": 4, "gray": None}
+
+    @staticmethod
+    def wrap(image):
+        # Accept either a FramePacket or a plain BGR image
+        if isinstance(image, FramePacket):
+            return image
+
+        return FramePacket(image)
+
+    def __init__(self, bgr, pool=None, timestamp=None):
+        self.bgr = bgr
+        self.timestamp = timestamp
+        self.height, self.width = bgr.shape[:2]
+
+        self._pool = pool
+        self._lock = threading.Lock()
+        # (width, height, color) -> image
+        self._variants = {(self.width, self.height, "bgr"): bgr}
+        self._retained = set()
+
+    def _allocate(self, width, height, color):
+        channels = self._Channels[color]
+        shape = (height, width) if channels is None else (height, width, channels)
+
+        if self._pool is None:
+            return np.empty(shape, dtype=self.bgr.dtype)
+
+        return self._pool.acquire(shape, self.bgr.dtype)
+
+    def _variant(self, width, height, color):
+        key = (width, height, color)
+
+        with self._lock:
+            image = self._variants.get(key)
+            if image is not None:
+                return image
+
+            if color == "bgr":
+                # Downscale from the full frame
+                image = self._allocate(width, height, color)
+                cv2.resize(self.bgr, (width, height), dst=image, interpolation=cv2.INTER_AREA)
+            else:
+                # Convert the (memoised) bgr image of the same size
+                bgr_key = (width, height, "bgr")
+                source = self._variants.get(bgr_key)
+                if source is None:
+                    source = self._allocate(width, height, "bgr")
+                    cv2.resize(self.bgr, (width, height), dst=source, interpolation=cv2.INTER_AREA)
+                    self._variants[bgr_key] = source
+
+                image = self._allocate(width, height, color)
+                cv2.cvtColor(source, self._ConvertCodes[color], dst=image)
+
+            self._variants[key] = image
+
+            return image
+
+    def rgb(self):
+        return self._variant(self.width, self.height, "rgb")
+
+    def rgba(self):
+        return self._variant(self.width, self.height, "rgba")
+
+    def gray(self):
+        return self._variant(self.width, self.height, "gray")
+
+    def resized(self, width, height, color="bgr"):
+        return self._variant(int(width), int(height), color)
+
+    def scaled(self, scale, color="bgr"):
+        return self.resized(max(1, int(self.width * scale)), max(1, int(self.height * scale)), color)
+
+    def add_variant(self, image, width, height, color):
+        # Use an image which arrived with the frame (e.g. scaled and converted by the camera pipeline) instead
+        # of computing it. The image is not ours, it never goes to the pool
+        with self._lock:
+            self._variants[(int(width), int(height), color)] = image
+            self._retained.add(id(image))
+
+    def retain(self, image):
+        # Keep a variant alive after release, e.g. when a result holds on to it. Its buffer leaves the pool
+        with self._lock:
+            self._retained.add(id(image))
+
+    def release(self):
+        # Return the variant buffers to the pool. The captured bgr frame is owned by the capture
+        if self._pool is None:
+            return
+
+        with self._lock:
+            for key, image in self._variants.items():
+                if image is not self.bgr and id(image) not in self._retained:
+                    self._pool.release(image)
+
+            self._variants = {(self.width, self.height, "bgr"): self.bgr}
+            self._retained = set()
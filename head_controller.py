@@ -1,11 +1,10 @@
 import os
-from adafruit_servokit import ServoKit
-import board
-import busio
 import time
-import math
+import struct
 import threading
-from queue import Queue
+import collections
+
+from head_trajectory import AxisTrajectory
 
 
 class HeadController(object):
@@ -17,11 +16,67 @@ class HeadController(object):
     HEADING_SERVO = 0
     PITCH_SERVO = 1
 
-    max_speed = 1.5
-    min_speed = 0.5
-
-    def __init__(self):
+    # Head speed (deg/s) and acceleration (deg/s^2) of the planned trajectories
+    MaxSpeed = 90.0
+    MaxAcceleration = 360.0
+
+    # The servos take a new pulse width once per 50 Hz PWM period, there is no point in updating them faster
+    TickTime = 0.02
+    # We do not know where the servos are at start up, they are sent to the target directly and given this long
+    InitialMoveTime = 1.0
+
+    # Smallest change of target in degrees, smaller ones are detection noise
+    Deadband = 2.0
+    # Seconds of head angles kept, to look up where the head was when a frame was captured
+    AngleHistoryTime = 2.0
+
+    # PCA9685 registers. The 4 PWM registers (on, off) of channel n start at LED0_ON_L + 4 * n, and auto
+    # increment is on, so consecutive channels are written in one transaction
+    LED0_ON_L = 0x06
+    # Pulse range of the ServoKit servos
+    MinPulse = 750
+    MaxPulse = 2250
+    ActuationRange = 180
+
+    def __init__(self, deadband=Deadband, kit=None):
         self.servo_value = {}
+        self.deadband = deadband
+
+        if kit is None:
+            kit = self._create_servo_kit()
+        self.kit = kit
+
+        # Servo value to PWM off count, from the frequency the board runs at. Reading it is a bus transaction
+        frequency = self.kit._pca.frequency
+        self._min_duty = int(self.MinPulse * frequency / 1000000 * 0xFFFF)
+        self._duty_range = int(self.MaxPulse * frequency / 1000000 * 0xFFFF - self._min_duty)
+        # Off count last written per channel
+        self._written = {}
+
+        self._target_heading = 90
+        self._target_pitch = 90
+        self._axes = {self.HEADING_SERVO: AxisTrajectory(self._target_heading, self.MaxSpeed, self.MaxAcceleration),
+                      self.PITCH_SERVO: AxisTrajectory(self._target_pitch, self.MaxSpeed, self.MaxAcceleration)}
+
+        # (time.monotonic(), heading, pitch) after every tick
+        self._angle_history = collections.deque()
+
+        # Guards the targets and the trajectories. The thread sleeps on it while the head is idle
+        self._condition = threading.Condition()
+        self._run_thread = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = False
+        self._thread.start()
+
+    def __del__(self):
+        self.stop()
+
+    @staticmethod
+    def _create_servo_kit():
+        # The hardware libraries are only needed for the real servos
+        from adafruit_servokit import ServoKit
+        import board
+        import busio
 
         # On the Jetson Nano
         # Bus 0 (pins 28,27) is board SCL_1, SDA_1 in the jetson board definition file
@@ -30,19 +85,16 @@ class HeadController(object):
         print("Initializing Servos")
         i2c_bus0 = (busio.I2C(board.SCL_1, board.SDA_1))
         print("Initializing ServoKit")
-        self.kit = ServoKit(channels=16, i2c=i2c_bus0)
 
-        self._target_heading = 90
-        self._target_pitch = 90
+        return ServoKit(channels=16, i2c=i2c_bus0)
 
-        self._run_thread = True
-        self._thread = threading.Thread(target=self._callback, args=(1,))
-        self._thread.daemon = False
-        self._thread.start()
+    def stop(self):
+        with self._condition:
+            self._run_thread = False
+            self._condition.notify()
 
-    def __del__(self):
-        self._run_thread = False
-        self._thread.join()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
 
     def _angle_to_servo_value(self, servo_no, angle):
         # Make sure we do not pass the servo range
@@ -74,55 +126,90 @@ class HeadController(object):
 
         return angle
 
-    def _move_to(self, servo_no, angle):
-        sv = self._angle_to_servo_value(servo_no, angle)
-        print(f"Moving servo {servo_no} to {angle} deg => {sv}")
-
-        new_value = max(0, min(180, sv))
-        self.kit.servo[servo_no].angle = new_value
-        self.servo_value[servo_no] = new_value
-
-    def _move_head(self):
-        if self.HEADING_SERVO not in self.servo_value or self.PITCH_SERVO not in self.servo_value:
-            # If we never recorded one of the servo value, just move the servo without
-            # speed throttling and wait for 1 sec as we don't know our current servo position
-            self._move_to(self.HEADING_SERVO, self._target_heading)
-            self._move_to(self.PITCH_SERVO, self._target_pitch)
-            time.sleep(1)
-        else:
-            # Calculate the next step
-            target_heading_value = self._angle_to_servo_value(self.HEADING_SERVO, self._target_heading)
-            target_pitch_value = self._angle_to_servo_value(self.PITCH_SERVO, self._target_pitch)
-
-            heading_delta = (target_heading_value - self.servo_value[self.HEADING_SERVO])
-            pitch_delta = (target_pitch_value - self.servo_value[self.PITCH_SERVO])
-
-            # calculate distance
-            distance = math.sqrt(pow(heading_delta, 2) + pow(pitch_delta, 2))
-            if distance <= self.min_speed:
-                sv_new_heading = self._angle_to_servo_value(self.HEADING_SERVO, self._target_heading)
-                sv_new_pitch = self._angle_to_servo_value(self.PITCH_SERVO, self._target_pitch)
-                sleep_time = 0.01
-            else:
-                capped_distance = min(distance, self.max_speed)
-                norm_distance = capped_distance / distance
-                # Add a further slowdown by using sleep_time
-                sleep_time = 0.01 + 0.05 * (1.0 - min(1.0, distance / 20.0))
-
-                sv_new_heading = self.servo_value[self.HEADING_SERVO] + heading_delta * norm_distance
-                sv_new_pitch = self.servo_value[self.PITCH_SERVO] + pitch_delta * norm_distance
+    def _off_count(self, value):
+        # PWM off count of a servo value, like adafruit_motor and adafruit_pca9685 compute it
+        duty = self._min_duty + int(value / self.ActuationRange * self._duty_range)
 
-            # print(f"Heading {sv_new_heading:.1f} pitch {sv_new_pitch:.1f}")
-            self._set_servo(self.HEADING_SERVO, sv_new_heading, sleep_time)
-            self._set_servo(self.PITCH_SERVO, sv_new_pitch, sleep_time)
-            # Sleep enough to make sure the servo has reached the destination for the current step
+        return (duty + 1) >> 4
 
-    def _set_servo(self, servo_no, value, sleep_time):
-        self.kit.servo[servo_no].angle = value
-        # Sleep enough to make sure the servo has reached the destination for the current step
-        time.sleep(sleep_time)
+    def _write_servos(self, values):
+        # Set {servo no: servo value} with one I2C transaction per run of consecutive channels. Channels whose
+        # pulse does not change are not written
+        counts = {servo_no: self._off_count(value) for servo_no, value in values.items()}
+        changed = sorted(servo_no for servo_no, count in counts.items() if self._written.get(servo_no) != count)
 
-        self.servo_value[servo_no] = value
+        runs = []
+        for servo_no in changed:
+            if len(runs) > 0 and runs[-1][-1] == servo_no - 1:
+                runs[-1].append(servo_no)
+            else:
+                runs.append([servo_no])
+
+        if len(runs) > 0:
+            # The ServoKit does not batch channels, write the registers of its PCA9685 ourselves
+            with self.kit._pca.i2c_device as i2c:
+                for run in runs:
+                    data = bytearray([self.LED0_ON_L + 4 * run[0]])
+                    for servo_no in run:
+                        data += struct.pack("<HH", 0, counts[servo_no])
+                    i2c.write(data)
+
+        for servo_no in changed:
+            self._written[servo_no] = counts[servo_no]
+        self.servo_value.update(values)
+
+    def _write_angles(self, heading, pitch):
+        self._write_servos({self.HEADING_SERVO: self._angle_to_servo_value(self.HEADING_SERVO, heading),
+                            self.PITCH_SERVO: self._angle_to_servo_value(self.PITCH_SERVO, pitch)})
+        self._record_angles(heading, pitch)
+
+    def _record_angles(self, heading, pitch):
+        now = time.monotonic()
+        self._angle_history.append((now, heading, pitch))
+
+        while self._angle_history[0][0] < now - self.AngleHistoryTime:
+            self._angle_history.popleft()
+
+    def _is_idle(self):
+        return all(axis.is_idle() for axis in self._axes.values())
+
+    def _run(self):
+        # We never recorded the servo values, move the servos without a trajectory and wait for them as we do not
+        # know where they are
+        with self._condition:
+            heading, pitch = self._target_heading, self._target_pitch
+        self._write_angles(heading, pitch)
+
+        with self._condition:
+            self._condition.wait_for(lambda: not self._run_thread, self.InitialMoveTime)
+            for axis, angle in [(self._axes[self.HEADING_SERVO], heading), (self._axes[self.PITCH_SERVO], pitch)]:
+                axis.position = angle
+
+        next_tick = time.monotonic()
+        while True:
+            with self._condition:
+                if self._run_thread and self._is_idle():
+                    # Nothing to do until look_at gives us a new target
+                    self._condition.wait_for(lambda: not self._run_thread or not self._is_idle())
+                    next_tick = time.monotonic()
+
+                if not self._run_thread:
+                    break
+
+                for axis in self._axes.values():
+                    axis.step(self.TickTime)
+                heading = self._axes[self.HEADING_SERVO].position
+                pitch = self._axes[self.PITCH_SERVO].position
+
+            self._write_angles(heading, pitch)
+
+            next_tick += self.TickTime
+            sleep_time = next_tick - time.monotonic()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+            else:
+                # Fell behind, do not try to catch up with a burst of ticks
+                next_tick = time.monotonic()
 
     def look_at(self, heading, pitch):
         min_heading = self.servo_range[self.HEADING_SERVO][0]
@@ -133,19 +220,32 @@ class HeadController(object):
         max_pitch = self.servo_range[self.PITCH_SERVO][1]
         pitch = min(max(min_pitch, pitch), max_pitch)
 
-        # Avoid doing too many small head movement due to detection noise
-        if abs(heading - self._target_heading) > 2:
-            self._target_heading = heading
+        with self._condition:
+            # Avoid doing too many small head movement due to detection noise
+            if abs(heading - self._target_heading) > self.deadband:
+                self._target_heading = heading
 
-        if abs(pitch - self._target_pitch) > 2:
-            self._target_pitch = pitch
+            if abs(pitch - self._target_pitch) > self.deadband:
+                self._target_pitch = pitch
 
-    def _callback(self, data):
-        while self._run_thread:
-            self._move_head()
+            self._axes[self.HEADING_SERVO].target = self._target_heading
+            self._axes[self.PITCH_SERVO].target = self._target_pitch
+            self._condition.notify()
 
     def current_head_angle(self):
-        heading = self._servo_value_to_angle(self.HEADING_SERVO, self.servo_value[self.HEADING_SERVO])
-        pitch = self._servo_value_to_angle(self.PITCH_SERVO, self.servo_value[self.PITCH_SERVO])
-
-        return heading, pitch
\ No newline at end of file
+        with self._condition:
+            return self._axes[self.HEADING_SERVO].position, self._axes[self.PITCH_SERVO].position
+
+    def head_angle_at(self, timestamp):
+        # (heading, pitch) of the head at timestamp (time.monotonic()), e.g. when a frame was captured
+        history = list(self._angle_history)
+        if len(history) == 0:
+            return self.current_head_angle()
+
+        _, heading, pitch = history[0]
+        for step_time, step_heading, step_pitch in reversed(history):
+            if step_time <= timestamp:
+                heading, pitch = step_heading, step_pitch
+                break
+
+        return heading, pitch
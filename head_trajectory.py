@@ -0,0 +1,37 @@
+import math
+
+
+class AxisTrajectory(object):
+    # Trapezoidal speed profile of one head axis in degrees: accelerate up to max_speed, cruise, and brake so the
+    # axis stops on the target. It is replanned on every step from the current position and speed, so the target
+    # can move at any time (every frame while tracking) without a jump in speed
+
+    def __init__(self, position, max_speed, max_acceleration):
+        self.position = position
+        self.speed = 0.0
+        self.target = position
+
+        self._max_speed = max_speed
+        self._max_acceleration = max_acceleration
+
+    def is_idle(self):
+        return self.position == self.target and self.speed == 0.0
+
+    def step(self, dt):
+        distance = self.target - self.position
+
+        # The fastest speed we can still brake from before the target, and never past it within this step
+        desired_speed = min(self._max_speed, math.sqrt(2 * self._max_acceleration * abs(distance)),
+                            abs(distance) / dt)
+        desired_speed = math.copysign(desired_speed, distance)
+
+        max_change = self._max_acceleration * dt
+        self.speed += min(max(desired_speed - self.speed, -max_change), max_change)
+        self.position += self.speed * dt
+
+        # Arrived, or crossed the target at a speed we can stop from within one step
+        remaining = self.target - self.position
+        if (remaining == 0.0 or math.copysign(1.0, remaining) != math.copysign(1.0, distance)) and \
+                abs(self.speed) <= max_change:
+            self.position = self.target
+            self.speed = 0.0
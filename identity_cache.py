@@ -0,0 +1,99 @@
+import time
+
+from utilities.rectArea import RectArea
+
+
+class CachedIdentity(object):
+
+    def __init__(self, track_id, name, score, encoding, person_box, verified_at):
+        self.track_id = track_id
+        self.name = name
+        self.score = score
+        self.encoding = encoding
+        self.person_box = person_box    # Normalised person box when the identity was last verified
+        self.verified_at = verified_at
+
+
+class IdentityCache(object):
+    # Remember who a tracked person is once their face has been recognised, so the face found on that person
+    # later on does not have to be encoded and matched again. An entry is dropped when its track is lost, when
+    # the track box jumps (likely a different person took over the track) and it expires after
+    # ReverifyInterval seconds so the identity gets confirmed again now and then
+    ReverifyInterval = 10.0
+
+    # Max move of the person box center between two updates, relative to the box size
+    MaxBoxJump = 0.5
+
+    def __init__(self, reverify_interval=ReverifyInterval):
+        self.reverify_interval = reverify_interval
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def _is_jump(cls, old_box, new_box):
+        old_x, old_y = old_box.center()
+        new_x, new_y = new_box.center()
+        size = max(old_box.width(), old_box.height(), 1e-6)
+
+        return max(abs(new_x - old_x), abs(new_y - old_y)) / size > cls.MaxBoxJump
+
+    def update(self, track_id, face, person_box, now=None):
+        # Record a freshly recognised face on a track. Unknown faces are not cached
+        if now is None:
+            now = time.monotonic()
+
+        if face.name is None or face.encoding is None:
+            self._entries.pop(track_id, None)
+            return
+
+        self._entries[track_id] = CachedIdentity(track_id, face.name, face.score, face.encoding, person_box, now)
+
+    def follow(self, tracks, now=None):
+        # Called with the current {track_id: normalised person box} after every tracker update.
+        # Drops lost, jumped and expired tracks. Returns the valid entries
+        if now is None:
+            now = time.monotonic()
+
+        for track_id in list(self._entries.keys()):
+            entry = self._entries[track_id]
+            person_box = tracks.get(track_id)
+
+            if person_box is None or self._is_jump(entry.person_box, person_box) or \
+                    now - entry.verified_at > self.reverify_interval:
+                del self._entries[track_id]
+                continue
+
+            entry.person_box = person_box
+
+        return list(self._entries.values())
+
+    def invalidate(self, track_id):
+        self._entries.pop(track_id, None)
+
+    def known_identities(self, capture_width, capture_height, face_region_height):
+        # (region, name, score, encoding) for every cached track, with region the head part of the person box
+        # in capture coordinates. Passed to FaceDetection.detect so faces found there skip the encoding
+        identities = []
+
+        for entry in self._entries.values():
+            p_box = entry.person_box.normalisedTo(capture_width, capture_height)
+            region = RectArea(p_box.x1, p_box.y1, p_box.x2, p_box.y1 + p_box.height() * face_region_height)
+            identities.append((region, entry.name, entry.score, entry.encoding))
+
+        return identities
+
+    @staticmethod
+    def match_faces(face_boxes, known_identities):
+        # Map face index -> (name, score, encoding) for the faces which are the only face inside the region of
+        # one of known_identities
+        cached = {}
+
+        for region, name, score, encoding in known_identities:
+            inside = [i for i, box in enumerate(face_boxes) if region.isPointInside(*box.center())]
+
+            if len(inside) == 1 and inside[0] not in cached:
+                cached[inside[0]] = (name, score, encoding)
+
+        return cached
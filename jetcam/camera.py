@@ -20,12 +20,22 @@ class Camera(traitlets.HasTraits):
     def _read(self):
         """Blocking call to read frame from camera"""
         raise NotImplementedError
+
+    def _read_into(self, out):
+        """Blocking call to read frame from camera into the preallocated out buffer"""
+        np.copyto(out, self._read())
+        return out
         
     def read(self):
         if self._running:
             raise RuntimeError('Cannot read directly while camera is running')
         self.value = self._read()
         return self.value
+
+    def read_into(self, out):
+        if self._running:
+            raise RuntimeError('Cannot read directly while camera is running')
+        return self._read_into(out)
     
     def _capture_frames(self):
         while True:
@@ -29,7 +29,7 @@ class CSICamera(Camera):
         atexit.register(self.cap.release)
                 
     def _gst_str(self, kwargs):
-        return 'nvarguscamerasrc sensor-id=%d ! video/x-raw(memory:NVMM), width=%d, height=%d, format=(string)NV12, framerate=(fraction)%d/1 ! nvvidconv flip-method=%d ! video/x-raw, width=(int)%d, height=(int)%d, format=(string)BGRx ! videoconvert ! appsink' % (
+        return 'nvarguscamerasrc sensor-id=%d ! video/x-raw(memory:NVMM), width=%d, height=%d, format=(string)NV12, framerate=(fraction)%d/1 ! nvvidconv flip-method=%d ! video/x-raw, width=(int)%d, height=(int)%d, format=(string)BGRx ! videoconvert ! appsink drop=true max-buffers=1' % (
                 0, kwargs['capture_width'], kwargs['capture_height'], kwargs['capture_fps'], kwargs['flip_method'], kwargs['capture_width'], kwargs['capture_height'])
     
     def _read(self):
@@ -38,3 +38,12 @@ class CSICamera(Camera):
             return image
         else:
             raise RuntimeError('Could not read image from camera')
+
+    def _read_into(self, out):
+        # OpenCV decodes straight into out when its shape and type match the stream
+        re, image = self.cap.read(out)
+        if not re:
+            raise RuntimeError('Could not read image from camera')
+        if image is not out:
+            np.copyto(out, image)
+        return out
@@ -0,0 +1,199 @@
+from .camera import Camera
+import atexit
+import numpy as np
+import traitlets
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+
+class CameraSink(object):
+    """One output of a MultiSinkCamera: an appsink delivering frames of its own size and color
+       (bgr, rgb, rgba or gray, the color names of FramePacket)"""
+
+    GstFormats = {'bgr': 'BGR', 'rgb': 'RGB', 'rgba': 'RGBA', 'gray': 'GRAY8'}
+    Channels = {'bgr': 3, 'rgb': 3, 'rgba': 4, 'gray': None}
+
+    def __init__(self, name, width, height, color='bgr'):
+        if color not in self.GstFormats:
+            raise ValueError('Unsupported sink color %s' % color)
+
+        self.name = name
+        self.width = int(width)
+        self.height = int(height)
+        self.color = color
+
+    def shape(self):
+        channels = self.Channels[self.color]
+        return (self.height, self.width) if channels is None else (self.height, self.width, channels)
+
+
+class MultiSinkCamera(Camera):
+    """Camera with one GStreamer pipeline tee'd into several appsinks, each scaling and converting the frames for
+       one consumer (e.g. the detector input, the face input and a preview thumbnail). The first sink is the
+       frame returned by read(). On the Jetson the CSI branches scale and convert with nvvidconv, other sources
+       with videoscale / videoconvert. source='test' uses videotestsrc, so the pipeline runs on any Linux box"""
+
+    source = traitlets.Unicode(default_value='csi')
+    capture_device = traitlets.Integer(default_value=0)
+    capture_fps = traitlets.Integer(default_value=30)
+    capture_width = traitlets.Integer(default_value=640)
+    capture_height = traitlets.Integer(default_value=480)
+    flip_method = traitlets.Integer(default_value=0)
+    test_pattern = traitlets.Unicode(default_value='ball')
+
+    # Nanoseconds to wait for a frame
+    PullTimeOut = 2 * Gst.SECOND
+
+    # Formats nvvidconv can write to system memory. 3 channel frames need a videoconvert from the 4 channel one
+    _NvFormats = {'bgr': 'BGRx', 'rgb': 'RGBA', 'rgba': 'RGBA', 'gray': 'GRAY8'}
+
+    def __init__(self, sinks, *args, **kwargs):
+        if len(sinks) == 0:
+            raise ValueError('MultiSinkCamera needs at least one sink')
+
+        self.sinks = list(sinks)
+        kwargs.setdefault('width', self.sinks[0].width)
+        kwargs.setdefault('height', self.sinks[0].height)
+        super(MultiSinkCamera, self).__init__(*args, **kwargs)
+
+        # Presentation timestamp (ns) of the last frame read from every sink
+        self.timestamps = {sink.name: None for sink in self.sinks}
+        # Sample pulled from a sink while looking for an older frame, it belongs to a later read
+        self._pending = {sink.name: None for sink in self.sinks}
+        # Longest wait for the frame of a branch which is a bit behind the first sink
+        self._match_timeout = 2 * Gst.SECOND // max(1, self.capture_fps)
+
+        Gst.init(None)
+        try:
+            self.pipeline = Gst.parse_launch(self._gst_str())
+            self._appsinks = {sink.name: self.pipeline.get_by_name(sink.name) for sink in self.sinks}
+            self.pipeline.set_state(Gst.State.PLAYING)
+
+            if self.read_sink(self.sinks[0].name) is None:
+                raise RuntimeError('Could not read image from camera.')
+        except Exception:
+            raise RuntimeError(
+                'Could not initialize camera.  Please see error trace.')
+
+        atexit.register(self.release)
+
+    def _gst_source(self):
+        if self.source == 'csi':
+            return 'nvarguscamerasrc sensor-id=%d ! video/x-raw(memory:NVMM), width=%d, height=%d, format=(string)NV12, framerate=(fraction)%d/1' % (
+                self.capture_device, self.capture_width, self.capture_height, self.capture_fps)
+        if self.source == 'usb':
+            return 'v4l2src device=/dev/video%d ! video/x-raw, width=(int)%d, height=(int)%d, framerate=(fraction)%d/1' % (
+                self.capture_device, self.capture_width, self.capture_height, self.capture_fps)
+        if self.source == 'test':
+            return 'videotestsrc is-live=true pattern=%s ! video/x-raw, width=(int)%d, height=(int)%d, framerate=(fraction)%d/1' % (
+                self.test_pattern, self.capture_width, self.capture_height, self.capture_fps)
+
+        raise ValueError('Unknown camera source %s' % self.source)
+
+    def _gst_branch(self, sink):
+        caps = 'video/x-raw, width=(int)%d, height=(int)%d, format=(string)%s' % (
+            sink.width, sink.height, CameraSink.GstFormats[sink.color])
+
+        if self.source == 'csi':
+            # Scale and convert on the VIC, only dropping the 4th channel is left to the CPU
+            nv_format = self._NvFormats[sink.color]
+            branch = 'nvvidconv flip-method=%d ! video/x-raw, width=(int)%d, height=(int)%d, format=(string)%s' % (
+                self.flip_method, sink.width, sink.height, nv_format)
+            if nv_format != CameraSink.GstFormats[sink.color]:
+                branch += ' ! videoconvert ! ' + caps
+        else:
+            branch = 'videoscale ! videoconvert ! ' + caps
+
+        # A slow consumer only drops frames of its own branch
+        return 'queue leaky=downstream max-size-buffers=1 ! %s ! appsink name=%s drop=true max-buffers=1 sync=false' % (
+            branch, sink.name)
+
+    def _gst_str(self):
+        return '%s ! tee name=t %s' % (self._gst_source(),
+                                        ' '.join('t. ! ' + self._gst_branch(sink) for sink in self.sinks))
+
+    def _sink(self, name):
+        for sink in self.sinks:
+            if sink.name == name:
+                return sink
+
+        raise KeyError(name)
+
+    def _next_sample(self, name, timeout):
+        sample, self._pending[name] = self._pending[name], None
+        if sample is not None:
+            return sample
+
+        return self._appsinks[name].emit('try-pull-sample', timeout)
+
+    def _pull(self, name, out, pts=None):
+        # With pts, return the frame of the sink with that presentation timestamp. Older frames are skipped, and
+        # None is returned when the branch dropped the frame
+        sink = self._sink(name)
+        timeout = self.PullTimeOut if pts is None else self._match_timeout
+
+        while True:
+            sample = self._next_sample(name, timeout)
+            if sample is None:
+                return None
+
+            buffer = sample.get_buffer()
+            if pts is None or buffer.pts == pts:
+                break
+            if buffer.pts > pts:
+                self._pending[name] = sample
+                return None
+
+        ok, map_info = buffer.map(Gst.MapFlags.READ)
+        if not ok:
+            return None
+
+        try:
+            # Rows may be padded to 4 bytes
+            shape = sink.shape()
+            stride = map_info.size // sink.height
+            strides = (stride,) if len(shape) == 2 else (stride, shape[2])
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=map_info.data, strides=strides + (1,))
+
+            if out is None:
+                out = np.empty(shape, dtype=np.uint8)
+            np.copyto(out, frame)
+        finally:
+            buffer.unmap(map_info)
+
+        self.timestamps[name] = buffer.pts
+
+        return out
+
+    def read_sink(self, name):
+        """Blocking read of the next frame of one sink"""
+        return self._pull(name, None)
+
+    def read_sink_into(self, name, out):
+        """Blocking read of the next frame of one sink into the preallocated out buffer"""
+        return self._pull(name, out)
+
+    def read_sink_at(self, name, pts, out=None):
+        """Read the frame of one sink with the presentation timestamp pts, e.g. the one of the frame last read
+           from the first sink, into out if given. Returns None when the branch dropped that frame"""
+        return self._pull(name, out, pts)
+
+    def frame_timestamp(self):
+        """Presentation timestamp (ns) of the frame last returned by read()"""
+        return self.timestamps[self.sinks[0].name]
+
+    def _read(self):
+        image = self.read_sink(self.sinks[0].name)
+        if image is None:
+            raise RuntimeError('Could not read image from camera')
+        return image
+
+    def _read_into(self, out):
+        if self.read_sink_into(self.sinks[0].name, out) is None:
+            raise RuntimeError('Could not read image from camera')
+        return out
+
+    def release(self):
+        self.pipeline.set_state(Gst.State.NULL)
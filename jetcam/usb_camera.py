@@ -27,10 +27,11 @@ class USBCamera(Camera):
             raise RuntimeError(
                 'Could not initialize camera.  Please see error trace.')
 
+        self._capture_buffer = None
         atexit.register(self.cap.release)
                 
     def _gst_str(self):
-        return 'v4l2src device=/dev/video{} ! video/x-raw, width=(int){}, height=(int){}, framerate=(fraction){}/1 ! videoconvert !  video/x-raw, format=(string)BGR ! appsink'.format(self.capture_device, self.capture_width, self.capture_height, self.capture_fps)
+        return 'v4l2src device=/dev/video{} ! video/x-raw, width=(int){}, height=(int){}, framerate=(fraction){}/1 ! videoconvert !  video/x-raw, format=(string)BGR ! appsink drop=true max-buffers=1'.format(self.capture_device, self.capture_width, self.capture_height, self.capture_fps)
     
     def _read(self):
         re, image = self.cap.read()
@@ -39,3 +40,11 @@ class USBCamera(Camera):
             return image_resized
         else:
             raise RuntimeError('Could not read image from camera')
+
+    def _read_into(self, out):
+        # Reuse one full size capture buffer and resize straight into out
+        re, self._capture_buffer = self.cap.read(self._capture_buffer)
+        if not re:
+            raise RuntimeError('Could not read image from camera')
+        cv2.resize(self._capture_buffer, (int(self.width), int(self.height)), dst=out)
+        return out
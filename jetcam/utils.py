@@ -2,4 +2,4 @@ import cv2
 
 
 def bgr8_to_jpeg(value, quality=75):
-    return bytes(cv2.imencode('.jpg', value)[1])
\ No newline at end of file
+    return bytes(cv2.imencode('.jpg', value, [cv2.IMWRITE_JPEG_QUALITY, quality])[1])
\ No newline at end of file
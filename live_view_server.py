@@ -0,0 +1,176 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from jetcam.utils import bgr8_to_jpeg
+
+
+class LiveViewServer(object):
+    # Stream annotated frames as MJPEG over HTTP (http://<robot>:<port>/stream).
+    # Frames are JPEG encoded once on the encoder thread and the same bytes are shared by every client.
+    # Nothing is copied or encoded while no client is connected. max_fps 0 or None does not cap the frame rate
+    Boundary = "ellee-frame"
+    # While no new frame comes the last one is sent again this often, so a client which went away is noticed
+    KeepAliveInterval = 5.0
+
+    def __init__(self, port=8080, host="0.0.0.0", max_fps=10, jpeg_quality=75):
+        self.max_fps = max_fps
+        self.jpeg_quality = jpeg_quality
+
+        self._cond = threading.Condition()
+        self._image = None
+        self._image_seq = 0
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._num_clients = 0
+        self._running = True
+
+        self._encoder_thread = threading.Thread(target=self._encode_frames)
+        self._encoder_thread.daemon = True
+        self._encoder_thread.start()
+
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._server_thread = threading.Thread(target=self._server.serve_forever)
+        self._server_thread.daemon = True
+        self._server_thread.start()
+
+    def num_clients(self):
+        with self._cond:
+            return self._num_clients
+
+    def has_clients(self):
+        # Nothing needs to be drawn for the live view while this is false
+        return self.num_clients() > 0
+
+    def publish(self, image):
+        # Called for every annotated frame, never blocks on the encoder or the clients
+        with self._cond:
+            if self._num_clients == 0:
+                return
+
+            self._image = image.copy()
+            self._image_seq += 1
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _encode_frames(self):
+        encoded_seq = 0
+        last_encode_time = 0.0
+
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or
+                                    (self._num_clients > 0 and self._image_seq > encoded_seq))
+                if not self._running:
+                    return
+
+            # Cap the stream frame rate, frames published meanwhile are simply skipped
+            if self.max_fps:
+                wait_time = last_encode_time + 1.0 / self.max_fps - time.monotonic()
+                if wait_time > 0:
+                    time.sleep(wait_time)
+
+            with self._cond:
+                image = self._image
+                encoded_seq = self._image_seq
+
+            jpeg = bgr8_to_jpeg(image, self.jpeg_quality)
+            last_encode_time = time.monotonic()
+
+            with self._cond:
+                self._jpeg = jpeg
+                self._jpeg_seq += 1
+                self._cond.notify_all()
+
+    def _next_jpeg(self, after_seq):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._running or self._jpeg_seq > after_seq, self.KeepAliveInterval)
+
+            if not self._running or self._jpeg_seq <= after_seq:
+                return None, after_seq
+
+            return self._jpeg, self._jpeg_seq
+
+    def _last_jpeg(self):
+        with self._cond:
+            return self._jpeg
+
+    def _add_client(self, count):
+        with self._cond:
+            self._num_clients += count
+            self._cond.notify_all()
+
+    def _make_handler(self):
+        server = self
+
+        class LiveViewHandler(BaseHTTPRequestHandler):
+            # A client which does not take a frame for this long is given up as well
+            timeout = 2 * LiveViewServer.KeepAliveInterval
+
+            def do_GET(self):
+                if self.path == "/":
+                    self._send_index()
+                elif self.path == "/stream":
+                    self._send_stream()
+                else:
+                    self.send_error(404)
+
+            def _send_index(self):
+                body = b'<html><body style="margin:0"><img src="/stream"></body></html>'
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self):
+                self.send_response(200)
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={LiveViewServer.Boundary}")
+                self.end_headers()
+
+                server._add_client(1)
+                try:
+                    seq = 0
+                    while True:
+                        jpeg, seq = server._next_jpeg(seq)
+                        if jpeg is None:
+                            if not server._running:
+                                break
+
+                            # The stream is idle. Write anyway, a client which went away only shows when a
+                            # write fails. Before the first frame an empty line is part of the multipart preamble
+                            jpeg = server._last_jpeg()
+                            if jpeg is None:
+                                self.wfile.write(b"\r\n")
+                                self.wfile.flush()
+                                continue
+
+                        self._write_frame(jpeg)
+                except (BrokenPipeError, ConnectionResetError, socket.timeout):
+                    pass
+                finally:
+                    server._add_client(-1)
+
+            def _write_frame(self, jpeg):
+                self.wfile.write(f"--{LiveViewServer.Boundary}\r\n".encode())
+                self.wfile.write(b"Content-Type: image/jpeg\r\n")
+                self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                # Keep the console for the bot
+                pass
+
+        return LiveViewHandler
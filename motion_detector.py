@@ -0,0 +1,35 @@
+import numpy as np
+import cv2
+
+from frame_packet import FramePacket
+
+
+class MotionDetector(object):
+    # Cheap frame difference motion detector on a tiny grayscale thumbnail
+    ThumbnailWidth = 32
+    ThumbnailHeight = 24
+
+    PixelThreshold = 12             # Grey level change for a thumbnail pixel to count as moving
+    MotionFraction = 0.02           # Fraction of moving thumbnail pixels to report motion
+    BackgroundAdaptRate = 0.1       # How fast the reference frame follows slow lighting changes
+
+    def __init__(self):
+        self._background = None
+        self._diff = np.empty((self.ThumbnailHeight, self.ThumbnailWidth), dtype=np.float32)
+
+        self.last_motion_fraction = 0.0
+
+    def update(self, image):
+        # Returns True if image (a BGR image or a FramePacket) differs enough from the recent frames
+        gray = FramePacket.wrap(image).resized(self.ThumbnailWidth, self.ThumbnailHeight, "gray")
+
+        if self._background is None:
+            self._background = gray.astype(np.float32)
+            return True
+
+        cv2.absdiff(gray.astype(np.float32), self._background, dst=self._diff)
+        self.last_motion_fraction = float(np.count_nonzero(self._diff > self.PixelThreshold)) / self._diff.size
+
+        cv2.accumulateWeighted(gray, self._background, self.BackgroundAdaptRate)
+
+        return self.last_motion_fraction >= self.MotionFraction
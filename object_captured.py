@@ -7,10 +7,19 @@ class ObjectCaptured(object):
     _MIN_PERSON_LENGTH = 3 / 100   # 3% of screen width
     _MIN_OBJ_LENGTH = 2 / 100 # 2% of screen width
 
-    def __init__(self, name, boundingBox, confScore):
+    def __init__(self, name, boundingBox, confScore, trackId=None, cameraId=None):
         self.name = name
         self.boundingBox = boundingBox
         self.confScore = confScore
+        # Stable id assigned by the ObjectTracker, None for raw detections
+        self.trackId = trackId
+        # Camera the bounding box belongs to, None when there is only one camera
+        self.cameraId = cameraId
+
+    @classmethod
+    def isBigEnoughMask(cls, names, lengths):
+        # Vectorised isBigEnough for arrays of names and bounding box lengths
+        return ((names == ObjectName.Person) & (lengths >= cls._MIN_PERSON_LENGTH)) | (lengths >= cls._MIN_OBJ_LENGTH)
 
     def getEstimatedDistance(self):
         # Distance is the inverse of bounding box length
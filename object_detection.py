@@ -0,0 +1,213 @@
+import numpy as np
+from utilities.rectArea import RectArea
+from utilities.boxArray import BoxArray
+from object_captured import ObjectCaptured, ObjectName
+from frame_packet import FramePacket
+
+
+class FrameCaptured(object):
+    # Detected objects kept as a BoxArray. ObjectCaptured instances are only created for the objects asked for
+
+    @staticmethod
+    def fromObjects(objects):
+        frame = FrameCaptured(BoxArray.fromRects([obj.boundingBox for obj in objects],
+                                                 [obj.confScore for obj in objects],
+                                                 [obj.name for obj in objects]))
+        frame._objects = list(objects)
+
+        return frame
+
+    def __init__(self, boxes=None):
+        if boxes is None:
+            boxes = BoxArray(np.empty((0, 4)))
+
+        self._boxes = boxes
+        self._objects = [None] * len(boxes)
+
+    def addObject(self, objCaptured):
+        self._boxes = self._boxes.append(objCaptured.boundingBox, objCaptured.confScore, objCaptured.name)
+        self._objects.append(objCaptured)
+
+    def boxes(self):
+        return self._boxes
+
+    def _object(self, i):
+        if self._objects[i] is None:
+            self._objects[i] = ObjectCaptured(self._boxes.names[i], self._boxes.rect(i), float(self._boxes.scores[i]))
+
+        return self._objects[i]
+
+    def _candidateMask(self, objectName, exclusionNames):
+        names = None if objectName is None else [objectName]
+        mask = self._boxes.nameMask(names, exclusionNames)
+
+        return mask & ObjectCaptured.isBigEnoughMask(self._boxes.names, self._boxes.lengths())
+
+    def findExistingObject(self, existingObj, objectName=ObjectName.Person, exclusionNames={},
+                           find_new_obj_if_needed=True):
+        # Find the object with the largest overlap with existingObj
+        if len(self._boxes) > 0:
+            areas = np.where(self._candidateMask(objectName, exclusionNames),
+                             self._boxes.intersectArea(existingObj.boundingBox), 0.0)
+            best_idx = int(np.argmax(areas))
+
+            if areas[best_idx] > 0:
+                best_object = self._object(best_idx)
+                return best_object, best_object.getEstimatedDistance()
+
+        # If we cannot find an overlapping object, just return the largest object
+        if find_new_obj_if_needed:
+            return self.findNewObject(objectName, exclusionNames)
+
+        return None, None
+
+    def findObjectByTrackId(self, trackId):
+        for obj in self._objects:
+            if obj is not None and obj.trackId == trackId:
+                return obj, obj.getEstimatedDistance()
+
+        return None, None
+
+    def getObjects(self, objectName=ObjectName.Person):
+        return [self._object(i) for i in range(len(self._boxes))
+                if objectName is None or self._boxes.names[i] == objectName]
+
+    def findNewObject(self, objectName=ObjectName.Person, exclusionNames={}):
+        # Find the largest object
+        if len(self._boxes) > 0:
+            areas = np.where(self._candidateMask(objectName, exclusionNames), self._boxes.area(), 0.0)
+            largest_idx = int(np.argmax(areas))
+
+            if areas[largest_idx] > 0:
+                largest_obj = self._object(largest_idx)
+                return largest_obj, largest_obj.getEstimatedDistance()
+
+        return None, None
+
+
+class ObjectDetection(object):
+    # Base class of the object detection backends. A backend implements _detect_batch, and every backend
+    # produces the same FrameCaptured / ObjectCaptured results
+
+    # Supported coco labels
+    class_labels = {1: ObjectName.Person,
+                    18: ObjectName.Dog}
+
+    min_confidence = 0.1
+    nms_threshold = 0.5
+
+    def __init__(self, max_detected_object=None):
+        self.max_detected_object = max_detected_object
+        self._lastFrameCaptured = None
+
+    @classmethod
+    def input_variant(cls, width, height):
+        # (width, height, color) of the packet image the backend reads for a width x height frame, so the
+        # camera can deliver it ready made. None when the backend has no preference
+        return None
+
+    def _detect_batch(self, packets):
+        # Return, for every FramePacket, a list of (class_id, score, x1, y1, x2, y2) with coordinates normalised
+        # to 0-1. Take the input format the network needs from the packet, so it is shared with other consumers
+        raise NotImplementedError
+
+    def _to_frame_captured(self, detections):
+        if len(detections) == 0:
+            return FrameCaptured()
+
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 6)
+        class_ids = detections[:, 0].astype(np.int64)
+        scores = detections[:, 1]
+
+        # Only care about some objects
+        keep = (scores >= self.min_confidence) & np.isin(class_ids, list(self.class_labels.keys()))
+        names = [self.class_labels.get(class_id) for class_id in class_ids[keep]]
+        boxes = BoxArray(detections[keep, 2:6], scores[keep], names)
+
+        # Drop duplicated boxes of the same class, the result is sorted by score
+        boxes = boxes.select(boxes.nms(self.nms_threshold))
+        if self.max_detected_object is not None:
+            boxes = boxes.select(slice(0, self.max_detected_object))
+
+        return FrameCaptured(boxes)
+
+    def detect_batch(self, images):
+        # Detect objects on several images (BGR images or FramePackets) with shared inference calls.
+        # Returns one FrameCaptured per image
+        packets = [FramePacket.wrap(image) for image in images]
+        frames = [self._to_frame_captured(detections) for detections in self._detect_batch(packets)]
+
+        if len(frames) > 0:
+            # The first image is the main camera frame
+            self._lastFrameCaptured = frames[0]
+
+        return frames
+
+    def _update(self, img):
+        self.detect_batch([img])
+
+    def getLastFrameCaptured(self, image):
+        self._update(image)
+        return self._lastFrameCaptured
+
+    def getLastFrame(self):
+        # The last captured frame without running a new detection
+        return self._lastFrameCaptured
+
+    def findExistingObject(self, existingObj, objectName):
+        return self._lastFrameCaptured.findExistingObject(existingObj, objectName)
+
+    def findNewObject(self, objectName):
+        return self._lastFrameCaptured.findNewObject(objectName)
+
+
+class ObjectDetectionFake(object):
+
+    def __init__(self):
+        self._lastFrameCaptured = None
+        self._ctr = 0
+
+    # Update should happen inside a separate thread
+    # Need to make the code below thread safe
+    def _update(self):
+        # Get from video feed
+        # image = self._readFromVideoFeed()
+        # Call object detection model
+        # frame = self._objDetect(image)
+        # self._framesCaptured.append(frame)
+        # if len(self._framesCaptured) > self._MAX_FRAME_CAPTURED:
+        #    self._framesCaptured = self._framesCaptured[-self._MAX_FRAME_CAPTURED:]
+        self._lastFrameCaptured = FrameCaptured()
+
+        self._ctr += 1
+        mod = self._ctr % 2500
+        # return True
+
+        if mod < 250:
+            self._lastFrameCaptured.addObject(ObjectCaptured(ObjectName.Person, RectArea(0.0, 0.0, 0.1, 0.1), 0.9))
+        elif mod < 500:
+            self._lastFrameCaptured.addObject(ObjectCaptured(ObjectName.Person, RectArea(0.9, 0.9, 1.0, 1.0), 0.9))
+        elif mod < 750:
+            self._lastFrameCaptured.addObject(ObjectCaptured(ObjectName.Person, RectArea(0.9, 0.0, 1.0, 0.1), 0.9))
+        # elif mod < 1000:
+        #     self._lastFrameCaptured.addObject(ObjectCaptured(ObjectName.Person, RectArea(0.0, 0.9, 0.1, 1.0), 0.9))
+        elif mod < 1500:
+            self._lastFrameCaptured.addObject(ObjectCaptured(ObjectName.Person, RectArea(0.0, 0.9, 0.1, 1.0), 0.9))
+            self._lastFrameCaptured.addObject(ObjectCaptured("Horse", RectArea(0.0, 0.9, 0.1, 1.0), 0.9))
+        elif mod < 1900:
+            self._lastFrameCaptured.addObject(ObjectCaptured(ObjectName.Person, RectArea(0.0, 0.9, 0.1, 1.0), 0.9))
+            self._lastFrameCaptured.addObject(ObjectCaptured("Giraffe", RectArea(0.0, 0.9, 0.1, 1.0), 0.9))
+        else:
+            # no object
+            pass
+
+
+    def getLastFrameCaptured(self):
+        self._update()
+        return self._lastFrameCaptured
+
+    def findExistingObject(self, existingObj):
+        return self._lastFrameCaptured.findExistingObject(existingObj)
+
+    def findNewObject(self):
+        return self._lastFrameCaptured.findNewObject()
@@ -0,0 +1,72 @@
+import os
+import cv2
+from object_detection import ObjectDetection
+
+
+class ObjectDetectionCPU(ObjectDetection):
+    # SSD-MobileNet-V2 (COCO) on the CPU through OpenCV DNN, so the vision stack runs on ordinary x86 machines.
+    # Uses the TensorFlow frozen graph and the matching OpenCV text graph:
+    #   ssd_mobilenet_v2_coco_2018_03_29/frozen_inference_graph.pb from the TensorFlow detection model zoo
+    #   ssd_mobilenet_v2_coco_2018_03_29.pbtxt from opencv_extra (testdata/dnn)
+    MODEL_FOLDER = "resources/models"
+    MODEL_FILE = "ssd_mobilenet_v2_coco_2018_03_29.pb"
+    CONFIG_FILE = "ssd_mobilenet_v2_coco_2018_03_29.pbtxt"
+
+    InputWidth = 300
+    InputHeight = 300
+
+    def __init__(self, max_detected_object=None, num_threads=None, input_width=InputWidth,
+                 input_height=InputHeight, batch_size=1):
+        super(ObjectDetectionCPU, self).__init__(max_detected_object)
+
+        self.input_width = input_width
+        self.input_height = input_height
+        self.batch_size = max(1, batch_size)
+
+        if num_threads is not None:
+            cv2.setNumThreads(num_threads)
+
+        self._setup_object_detection()
+
+    @classmethod
+    def input_variant(cls, width, height):
+        # With the default input size
+        return cls.InputWidth, cls.InputHeight, "rgb"
+
+    def _setup_object_detection(self):
+        model_path = os.path.join(os.getcwd(), self.MODEL_FOLDER, self.MODEL_FILE)
+        config_path = os.path.join(os.getcwd(), self.MODEL_FOLDER, self.CONFIG_FILE)
+
+        if not os.path.exists(model_path) or not os.path.exists(config_path):
+            raise RuntimeError(f"Could not find {self.MODEL_FILE} and {self.CONFIG_FILE} in {self.MODEL_FOLDER}")
+
+        self._net = cv2.dnn.readNetFromTensorflow(model_path, config_path)
+        self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def _detect_batch(self, packets):
+        results = []
+
+        for start in range(0, len(packets), self.batch_size):
+            # The network input sized RGB frames are cached on the packets
+            batch = [packet.resized(self.input_width, self.input_height, "rgb")
+                     for packet in packets[start:start + self.batch_size]]
+            blob = cv2.dnn.blobFromImages(batch, size=(self.input_width, self.input_height), swapRB=False,
+                                          crop=False)
+            self._net.setInput(blob)
+
+            # Output is (1, 1, N, 7): image index, class id, score, x1, y1, x2, y2 (normalised)
+            output = self._net.forward()
+            batch_results = [[] for _ in batch]
+
+            for image_idx, class_id, score, x1, y1, x2, y2 in output[0, 0]:
+                # Rows with a negative image index are padding
+                if image_idx < 0:
+                    continue
+
+                x1, y1, x2, y2 = [min(max(float(v), 0.0), 1.0) for v in (x1, y1, x2, y2)]
+                batch_results[int(image_idx)].append((int(class_id), float(score), x1, y1, x2, y2))
+
+            results.extend(batch_results)
+
+        return results
@@ -0,0 +1,91 @@
+import multiprocessing
+import queue
+import time
+
+
+class ObjectDetectionResult(object):
+
+    def __init__(self, frame_seq, frame_timestamp, frame_captured, processing_time):
+        self.frame_seq = frame_seq
+        self.frame_timestamp = frame_timestamp
+        self.frame_captured = frame_captured
+        self.processing_time = processing_time
+
+
+class ObjectDetectionWorker(object):
+    # Run the object detector in its own process straight on the frames of a SharedFrameRing. The worker always
+    # takes the newest frame when it is done with the previous one, so it runs as fast as the detector allows
+    # without queueing up stale frames. detector_factory must be picklable (e.g. the detector class)
+    ReadTimeOut = 1.0
+    StopTimeOut = 5
+
+    def __init__(self, frame_ring, detector_factory):
+        ctx = multiprocessing.get_context("spawn")
+        self._result_queue = ctx.Queue()
+        self._stop_event = ctx.Event()
+        self._active = ctx.RawValue("b", 1)
+
+        self._process = ctx.Process(target=_worker_main,
+                                    args=(detector_factory, frame_ring, self._result_queue, self._active,
+                                          self._stop_event))
+        self._process.daemon = True
+        self._process.start()
+
+        self.processed_frames = 0
+        self.last_processing_time = None
+
+    def set_active(self, active):
+        # An inactive worker skips the frames, e.g. while the vision loop is gated
+        self._active.value = int(active)
+
+    def poll(self):
+        # Return the newest result that arrived since the last poll, or None. Never blocks
+        latest = None
+
+        while True:
+            try:
+                result = self._result_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            self.processed_frames += 1
+            self.last_processing_time = result.processing_time
+
+            if latest is None or result.frame_seq > latest.frame_seq:
+                latest = result
+
+        return latest
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def stop(self):
+        self._stop_event.set()
+        self._process.join(self.StopTimeOut)
+
+        if self._process.is_alive():
+            self._process.terminate()
+
+
+def _worker_main(detector_factory, frame_ring, result_queue, active, stop_event):
+    detector = detector_factory()
+    seq = 0
+
+    while not stop_event.is_set():
+        slot, image, new_seq, timestamp = frame_ring.latest(seq, ObjectDetectionWorker.ReadTimeOut)
+        if slot is None:
+            if frame_ring.is_closed():
+                break
+            continue
+
+        seq = new_seq
+        try:
+            if not active.value:
+                continue
+
+            start = time.monotonic()
+            frame_captured = detector.detect_batch([image])[0]
+        finally:
+            frame_ring.release(slot)
+
+        result_queue.put(ObjectDetectionResult(seq, timestamp, frame_captured, time.monotonic() - start))
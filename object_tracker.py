@@ -0,0 +1,190 @@
+import numpy as np
+from object_captured import ObjectCaptured
+from object_detection import FrameCaptured
+from utilities.rectArea import RectArea
+from utilities.boxArray import BoxArray
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+
+class TrackedObject(object):
+    # Constant velocity Kalman filter on the box center and size, one step per frame.
+    # State is [cx, cy, w, h, vx, vy, vw, vh] in normalised coordinates
+    _F = np.eye(8)
+    _F[:4, 4:] = np.eye(4)
+    _H = np.eye(4, 8)
+
+    PositionNoise = 1e-2
+    VelocityNoise = 1e-4
+    MeasurementNoise = 1e-4
+    InitialVelocityVariance = 1e-2
+
+    def __init__(self, track_id, obj):
+        self.track_id = track_id
+        self.name = obj.name
+        self.conf_score = obj.confScore
+        self.hits = 1
+        # Detection runs since the track was created, and whether it was detected in enough of them to be real
+        self.age = 1
+        self.confirmed = False
+        self.missed_detections = 0
+
+        self._x = np.zeros(8)
+        self._x[:4] = self._box_to_measurement(obj.boundingBox)
+        self._P = np.diag([self.MeasurementNoise] * 4 + [self.InitialVelocityVariance] * 4)
+        self._Q = np.diag([self.PositionNoise * self.MeasurementNoise] * 4 + [self.VelocityNoise] * 4)
+        self._R = np.eye(4) * self.MeasurementNoise
+
+    @staticmethod
+    def _box_to_measurement(box):
+        cx, cy = box.center()
+        return np.array([cx, cy, box.width(), box.height()])
+
+    def predict(self):
+        self._x = self._F @ self._x
+        # Do not let the box collapse
+        self._x[2:4] = np.maximum(self._x[2:4], 1e-3)
+        self._P = self._F @ self._P @ self._F.T + self._Q
+
+    def correct(self, obj):
+        z = self._box_to_measurement(obj.boundingBox)
+        y = z - self._H @ self._x
+        S = self._H @ self._P @ self._H.T + self._R
+        K = self._P @ self._H.T @ np.linalg.inv(S)
+
+        self._x = self._x + K @ y
+        self._P = (np.eye(8) - K @ self._H) @ self._P
+
+        self.conf_score = obj.confScore
+        self.hits += 1
+        self.missed_detections = 0
+
+    def box(self):
+        cx, cy, w, h = self._x[:4]
+        return np.clip([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], 0.0, 1.0)
+
+    def velocity(self):
+        # Center velocity in normalised units per frame
+        return self._x[4], self._x[5]
+
+    def to_object(self, camera_id=None):
+        x1, y1, x2, y2 = self.box().tolist()
+        return ObjectCaptured(self.name, RectArea(x1, y1, x2, y2), self.conf_score, trackId=self.track_id,
+                              cameraId=camera_id)
+
+
+class ObjectTracker(object):
+    # SORT style multi object tracker. Detections are matched to the predicted tracks using an IoU cost matrix,
+    # and tracks keep a stable id. Between detection runs the tracks are only predicted.
+    # A track is only reported once it was detected in min_hits detection runs, so a single false detection never
+    # becomes a person. During the first min_hits runs of the stream, tracks detected in every run so far are
+    # reported right away. A confirmed track keeps being reported while it coasts through missed detections
+    IouThreshold = 0.3
+    MaxMissedDetections = 2     # Drop a track after this many detection runs without a match
+    MinHits = 3
+
+    def __init__(self, camera_id=None, first_track_id=1, track_id_step=1, min_hits=MinHits):
+        # With several cameras every camera has its own tracker. Give them interleaved track ids
+        # (first_track_id = camera index + 1, track_id_step = number of cameras) so ids stay unique
+        self.camera_id = camera_id
+        self._min_hits = min_hits
+        self._num_updates = 0
+        self._tracks = []
+        self._next_track_id = first_track_id
+        self._track_id_step = track_id_step
+
+    def _match(self, iou):
+        # Return a list of (track_idx, detection_idx) pairs
+        if iou.size == 0:
+            return []
+
+        if linear_sum_assignment is not None:
+            rows, cols = linear_sum_assignment(-iou)
+            pairs = zip(rows, cols)
+        else:
+            # Greedy matching, best overlap first
+            order = np.dstack(np.unravel_index(np.argsort(-iou, axis=None), iou.shape))[0]
+            used_rows = set()
+            used_cols = set()
+            pairs = []
+            for row, col in order:
+                if row not in used_rows and col not in used_cols:
+                    used_rows.add(row)
+                    used_cols.add(col)
+                    pairs.append((row, col))
+
+        return [(row, col) for row, col in pairs if iou[row, col] >= self.IouThreshold]
+
+    def predict(self):
+        # Advance all tracks by one frame without a detection
+        for track in self._tracks:
+            track.predict()
+
+        return self._frame()
+
+    def update(self, frame_captured):
+        # Advance all tracks by one frame and correct them with the detections in frame_captured
+        self._num_updates += 1
+        for track in self._tracks:
+            track.predict()
+            track.age += 1
+
+        detection_boxes = frame_captured.boxes()
+
+        if len(self._tracks) > 0 and len(detection_boxes) > 0:
+            track_boxes = BoxArray(np.array([track.box() for track in self._tracks]),
+                                   names=[track.name for track in self._tracks])
+            iou = track_boxes.iou(detection_boxes)
+
+            # Never match objects of different classes
+            iou[track_boxes.names[:, None] != detection_boxes.names[None, :]] = 0.0
+
+            matches = self._match(iou)
+        else:
+            matches = []
+
+        matched_tracks = set()
+        matched_detections = set()
+        detections = frame_captured.getObjects(None)
+        for track_idx, detection_idx in matches:
+            self._tracks[track_idx].correct(detections[detection_idx])
+            matched_tracks.add(track_idx)
+            matched_detections.add(detection_idx)
+
+        for track_idx, track in enumerate(self._tracks):
+            if track_idx not in matched_tracks:
+                track.missed_detections += 1
+
+        self._tracks = [track for track in self._tracks if track.missed_detections <= self.MaxMissedDetections]
+
+        for detection_idx, obj in enumerate(detections):
+            if detection_idx not in matched_detections:
+                self._tracks.append(TrackedObject(self._next_track_id, obj))
+                self._next_track_id += self._track_id_step
+
+        for track in self._tracks:
+            if track.hits >= self._min_hits:
+                track.confirmed = True
+
+        return self._frame()
+
+    def _is_reported(self, track):
+        if track.confirmed:
+            return track.missed_detections <= self.MaxMissedDetections
+
+        # Warm up: not confirmed yet, but matched in every run since the stream started
+        return self._num_updates <= self._min_hits and track.hits == track.age
+
+    def _frame(self):
+        return FrameCaptured.fromObjects([track.to_object(self.camera_id) for track in self._tracks
+                                          if self._is_reported(track)])
+
+    def get_track(self, track_id):
+        for track in self._tracks:
+            if track.track_id == track_id:
+                return track
+
+        return None
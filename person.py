@@ -4,11 +4,19 @@ from const import Const
 
 class Person(object):
 
-    def __init__(self, person_obj, person_face_rect, face_obj):
+    def __init__(self, person_obj, person_face_rect, face_obj, heading_offset=0.0, timestamp=None):
         self.person_name = None
         self.face_bbox = None
         self.person_bbox = None
         self.face_image = None
+        self.face_encoding = None
+
+        # Camera the person was seen by (None with a single camera) and the heading of that camera relative
+        # to the main camera, in degrees
+        self.camera_id = person_obj.cameraId if person_obj is not None else None
+        self.heading_offset = heading_offset
+        # Capture time (time.monotonic()) of the frame the person was seen in
+        self.timestamp = timestamp
 
         self.is_face_detected = face_obj is not None
 
@@ -22,6 +30,7 @@ class Person(object):
         if face_obj is not None:
             self.person_name = face_obj.name
             self.face_image = face_obj.face_image
+            self.face_encoding = face_obj.encoding
 
             # We use the face constructed from the body bounding box instead of using the real face
             # as the real face is detected with a much lower frequency, hence causes the head movement
@@ -33,3 +42,12 @@ class Person(object):
             # If we do not have person bounding box, use the detected as as the bounding box
             if self.person_bbox is None:
                 self.person_bbox = self.face_bbox
+
+    def camera_heading(self):
+        # Heading of the person in degrees as seen from the camera, 90 is the main camera looking straight ahead
+        if self.face_bbox is None:
+            return None
+
+        center_x = (self.face_bbox.x1 + self.face_bbox.x2) / 2 / Const.CaptureWidth
+
+        return 90 + (0.5 - center_x) * Const.CameraHorizontalFOV + self.heading_offset
@@ -0,0 +1,125 @@
+import threading
+import numpy as np
+import cv2
+
+from video_feed.frame_ring import FrameRing
+from frame_packet import FramePacket
+
+
+class PreviewAnnotations(object):
+
+    def __init__(self, person, person_face_rect, detected_faces, focus_face, fps):
+        self.person = person
+        self.person_face_rect = person_face_rect
+        self.detected_faces = detected_faces
+        self.focus_face = focus_face
+        self.fps = fps
+
+
+class PreviewRenderer(object):
+    # Draw the sight results on a dedicated thread. submit() only downscales the frame into a reused buffer,
+    # all the drawing and the window update happen on the renderer thread from the latest submitted results.
+    # Without a window, frames are neither copied nor drawn while no listener wants them
+    WindowName = "Camera"
+    RefreshTimeOut = 0.5
+
+    def __init__(self, display_width, display_height, capture_width, capture_height, show_window=True):
+        self.display_width = display_width
+        self.display_height = display_height
+        self.capture_width = capture_width
+        self.capture_height = capture_height
+        self.show_window = show_window
+
+        self._ring = FrameRing((display_height, display_width, 3), np.uint8)
+        self._annotations = {}
+        self._listeners = []
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add_listener(self, callback, is_active=None):
+        # callback(annotated_image) is called on the renderer thread for every rendered frame while is_active()
+        # is true, e.g. while a client is connected. The image is only valid during the call
+        self._listeners.append((callback, is_active))
+
+    def _active_listeners(self):
+        return [callback for callback, is_active in self._listeners if is_active is None or is_active()]
+
+    def submit(self, image, person, person_face_rect, detected_faces, focus_face, fps):
+        # image is a BGR image or a FramePacket. The display sized frame is copied as the renderer draws on it
+        if not self.show_window and len(self._active_listeners()) == 0:
+            return
+
+        slot, buffer = self._ring.acquire_write_slot()
+        np.copyto(buffer, FramePacket.wrap(image).resized(self.display_width, self.display_height))
+
+        self._annotations[slot] = PreviewAnnotations(person, person_face_rect, detected_faces, focus_face, fps)
+        self._ring.publish(slot, None)
+
+    def stop(self):
+        self._running = False
+        self._ring.close()
+        self._thread.join()
+
+    def _run(self):
+        if self.show_window:
+            cv2.namedWindow(self.WindowName, cv2.WINDOW_AUTOSIZE)
+
+        seq = 0
+        while self._running:
+            image, new_seq, _ = self._ring.latest(seq, self.RefreshTimeOut)
+
+            if image is not None:
+                seq = new_seq
+
+            listeners = self._active_listeners() if image is not None else []
+            if image is not None and (self.show_window or len(listeners) > 0):
+                # The ring never hands out the slot we are holding, so it is safe to draw on it
+                self._draw(image, self._annotations[self._ring.reader_slot()])
+
+                for listener in listeners:
+                    listener(image)
+
+                if self.show_window:
+                    cv2.imshow(self.WindowName, image)
+
+            if self.show_window:
+                cv2.waitKey(1)
+
+    def _display_rect(self, rect):
+        return rect.normalisedFrom(self.capture_width, self.capture_height).normalisedTo(
+            self.display_width, self.display_height).round()
+
+    def _draw(self, image, annotations):
+        person = annotations.person
+        if person is not None:
+            # Draw person bounding box
+            p_box = person.boundingBox.normalisedTo(self.display_width, self.display_height).round()
+            cv2.rectangle(image, (p_box.x1, p_box.y1), (p_box.x2, p_box.y2), (255, 0, 0), 4)
+
+            if annotations.person_face_rect is not None:
+                # Draw face bounding box estimated from the person
+                f_box = self._display_rect(annotations.person_face_rect)
+                cv2.rectangle(image, (f_box.x1, f_box.y1), (f_box.x2, f_box.y2), (100, 100, 100), 4)
+
+        for face in annotations.detected_faces:
+            f_box = self._display_rect(face.bounding_box)
+
+            # Draw face bounding box
+            if annotations.focus_face == face:
+                cv2.rectangle(image, (f_box.x1, f_box.y1), (f_box.x2, f_box.y2), (0, 255, 0), 4)
+            else:
+                cv2.rectangle(image, (f_box.x1, f_box.y1), (f_box.x2, f_box.y2), (150, 150, 0), 2)
+
+            # Draw face name
+            name = face.name
+            if name is None:
+                name = "None"
+
+            cv2.putText(image, f"{name}", (f_box.x1, f_box.y1 + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                        (255, 255, 255), 1, cv2.LINE_AA)
+
+        cv2.putText(image, f"FPS {annotations.fps:.1f}", (5, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0,
+                    (255, 255, 255), 2, cv2.LINE_AA)
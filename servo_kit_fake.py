@@ -0,0 +1,106 @@
+import struct
+import threading
+import time
+
+
+class _FakeI2CDevice(object):
+    # Stands in for the I2CDevice of the PCA9685, transactions are recorded instead of sent
+
+    def __init__(self, pca):
+        self._pca = pca
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def write(self, buf, start=0, end=None):
+        self._pca.write(bytes(buf[start:end]))
+
+
+class _FakePCA9685(object):
+    # The PWM registers of a PCA9685 with auto increment on, like adafruit_pca9685 sets it up.
+    # Counts the I2C transactions and the time they would take on the bus
+    LED0_ON_L = 0x06
+    BusFrequency = 100000   # Hz, standard mode I2C like the Jetson bus 0
+
+    def __init__(self, frequency):
+        self.frequency = frequency
+        self.i2c_device = _FakeI2CDevice(self)
+        self.registers = bytearray(256)
+
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.bytes_written = 0
+        # time.monotonic() of every transaction
+        self.write_times = []
+
+    def write(self, data):
+        register = data[0]
+
+        with self._lock:
+            self.registers[register:register + len(data) - 1] = data[1:]
+            self.writes += 1
+            self.bytes_written += len(data)
+            self.write_times.append(time.monotonic())
+
+    def off_count(self, channel):
+        return struct.unpack_from("<HH", self.registers, self.LED0_ON_L + 4 * channel)[1]
+
+    def bus_time(self):
+        # Address byte plus the data, 9 clocks per byte with the ack
+        with self._lock:
+            return (self.writes + self.bytes_written) * 9 / self.BusFrequency
+
+
+class _FakeServo(object):
+    # Like adafruit_motor.servo.Servo on a PCA9685 channel: every angle set is one 4 register transaction
+
+    def __init__(self, pca, channel, min_pulse=750, max_pulse=2250, actuation_range=180):
+        self._pca = pca
+        self._channel = channel
+        self.actuation_range = actuation_range
+
+        self._min_duty = int((min_pulse * pca.frequency) / 1000000 * 0xFFFF)
+        max_duty = (max_pulse * pca.frequency) / 1000000 * 0xFFFF
+        self._duty_range = int(max_duty - self._min_duty)
+
+    @property
+    def angle(self):
+        duty = self._pca.off_count(self._channel) << 4
+        if duty == 0:
+            return None
+
+        return (duty - self._min_duty) / self._duty_range * self.actuation_range
+
+    @angle.setter
+    def angle(self, value):
+        duty = self._min_duty + int(value / self.actuation_range * self._duty_range)
+        data = struct.pack("<BHH", self._pca.LED0_ON_L + 4 * self._channel, 0, (duty + 1) >> 4)
+
+        with self._pca.i2c_device as i2c:
+            i2c.write(data)
+
+
+class ServoKitFake(object):
+    # Software ServoKit, to run HeadController without the PCA9685 board and measure how much it talks to it
+
+    def __init__(self, channels=16, i2c=None, frequency=50):
+        self._pca = _FakePCA9685(frequency)
+        self.servo = [_FakeServo(self._pca, channel) for channel in range(channels)]
+
+    @property
+    def bus_writes(self):
+        return self._pca.writes
+
+    @property
+    def bytes_written(self):
+        return self._pca.bytes_written
+
+    def write_times(self):
+        with self._pca._lock:
+            return list(self._pca.write_times)
+
+    def bus_time(self):
+        return self._pca.bus_time()
@@ -0,0 +1,58 @@
+from frame_packet import FramePacket
+from video_feed.threaded_video_reader import ThreadedVideoReader
+
+
+class SightCamera(object):
+    # One of the extra cameras of SightObjectDetection, e.g. looking behind the robot. The camera is fixed to
+    # the body, heading is the head heading (90 is straight ahead, 270 behind) its optical axis points to.
+    # Object detection runs on its frames together with the main camera frame, faces are only looked for on
+    # the main camera
+
+    def __init__(self, camera_id, video_source, heading, tracker, drop_frames=True):
+        self.camera_id = camera_id
+        self.heading = heading
+        self.tracker = tracker
+        self.tracked_frame = tracker.predict()
+
+        self._video_source = ThreadedVideoReader(video_source, drop_frames=drop_frames)
+        self._frame_seq = 0
+        self._detected_seq = 0
+        self._packet = None
+
+    def read(self, pool):
+        # Take the newest frame without waiting. Returns the packet of the newest frame seen so far, or None
+        # before the first frame
+        image, seq, timestamp = self._video_source.read_latest(self._frame_seq, 0)
+
+        if image is not None:
+            self._frame_seq = seq
+            if self._packet is not None:
+                self._packet.release()
+            self._packet = FramePacket(image, pool, timestamp)
+
+        return self._packet
+
+    def packet(self):
+        return self._packet
+
+    def has_new_frame(self):
+        # A frame arrived which has not been through the object detection yet
+        return self._packet is not None and self._frame_seq > self._detected_seq
+
+    def update(self, frame_captured):
+        self._detected_seq = self._frame_seq
+        self.tracked_frame = self.tracker.update(frame_captured)
+
+        return self.tracked_frame
+
+    def predict(self):
+        self.tracked_frame = self.tracker.predict()
+
+        return self.tracked_frame
+
+    def stop(self):
+        self._video_source.stop()
+
+        if self._packet is not None:
+            self._packet.release()
+            self._packet = None
@@ -1,17 +1,68 @@
 import os
+import functools
 import numpy as np
 import cv2
 import time
+import math
 
-from object_detection_jetnet import ObjectDetectionJetNet, ObjectName, ObjectCaptured
+from object_detection import ObjectName, ObjectCaptured
 from face_detection import FaceDetection, FaceObject
+from face_recognition_worker import FaceRecognitionWorker
+from object_detection_worker import ObjectDetectionWorker
+from object_tracker import ObjectTracker
 from video_feed.video_csi_reader import VideoCSIReader
-from PIL import ImageDraw, ImageFont, Image
+from video_feed.threaded_video_reader import ThreadedVideoReader
+from video_feed.process_video_reader import ProcessVideoReader
 from utilities.rectArea import RectArea
+from utilities.boxArray import BoxArray
 from utilities.fpsCalc import FpsCalc
 from person import Person
+from sight_camera import SightCamera
+from frame_packet import FramePacket, FrameBufferPool
+from identity_cache import IdentityCache
+from preview_renderer import PreviewRenderer
+from live_view_server import LiveViewServer
+from vision_scheduler import VisionScheduler, VisionStage
+from vision_duty_cycle import VisionDutyCycle
+from motion_detector import MotionDetector
 from const import Const
 
+if Const.ObjectDetectionBackend == "cpu":
+    from object_detection_cpu import ObjectDetectionCPU as ObjectDetection
+else:
+    from object_detection_jetnet import ObjectDetectionJetNet as ObjectDetection
+
+
+class VisionPipeline(object):
+    Thread = "thread"       # Capture thread, detectors in the sight loop and face recognition in a worker process
+    Process = "process"     # Capture, object detection and face recognition in their own processes
+
+
+class SightConfig(object):
+    # Options of SightObjectDetection, the defaults are the ones of the robot
+
+    def __init__(self, display_preview=True, live_view_port=None, use_face_worker=True, use_duty_cycle=True,
+                 use_identity_cache=True, print_fps=True, pipeline=Const.VisionPipeline, drop_frames=True,
+                 camera_headings=None):
+        # Local preview window, and the port of the MJPEG live view (None for none)
+        self.display_preview = display_preview
+        self.live_view_port = live_view_port
+        # VisionPipeline.Process always recognises faces in a worker process, and takes the video source and
+        # the object detector as picklable factories
+        self.pipeline = pipeline
+        self.use_face_worker = use_face_worker or pipeline == VisionPipeline.Process
+        self.use_duty_cycle = use_duty_cycle
+        self.use_identity_cache = use_identity_cache
+        self.print_fps = print_fps
+        # False hands every frame of the video sources to detect(), for replaying recordings. A live camera drops
+        # the frames the pipeline is too slow for
+        self.drop_frames = drop_frames
+        # Heading of every extra camera relative to the robot, spread evenly around it when None
+        self.camera_headings = camera_headings
+
+    def has_preview(self):
+        return self.display_preview or self.live_view_port is not None
+
 
 class SightObjectDetection(object):
     CaptureWidth = Const.CaptureWidth
@@ -26,188 +77,664 @@ class SightObjectDetection(object):
     FaceTopOffset = 0.1
     FaceBottomOffset = 0.15
 
-    def __init__(self):
+    # Face search regions around known people and faces. The person region only covers the upper part of the
+    # body, and previously detected faces are grown so a moving face stays inside
+    PersonFaceRegionHeight = 0.4
+    FaceRegionGrowth = 2.0
+
+    def __init__(self, config=None, video_source=None, object_detector=None, video_source_factory=None,
+                 object_detector_factory=None, extra_video_sources=None, scheduler=None, stage_timer=None):
+        # config is a SightConfig, the defaults run the robot. The other arguments replace the parts built by
+        # default, e.g. to replay a recording (see SightConfig.pipeline for which ones a pipeline takes)
+        if config is None:
+            config = SightConfig()
+        self._config = config
+
         self._fps_calc = FpsCalc()
-        self._font = ImageFont.truetype("resources/Arial.ttf", 30)
-        self._small_font = ImageFont.truetype("resources/Arial.ttf", 15)
 
-        self._video_source = VideoCSIReader(capture_width=self.CaptureWidth, capture_height=self.CaptureHeight,
-                                           capture_fps=Const.CaptureFPS, flip_method=2)
+        # Optional StageTimer which collects the duration of every pipeline stage, for benchmarking
+        self._stage_timer = stage_timer
+
+        self._pipeline = config.pipeline
+        if self._pipeline == VisionPipeline.Process:
+            # The capture process writes into a shared memory ring, the frames are never pickled. Sources are
+            # created in that process, so they are given as a picklable factory
+            if video_source is not None or object_detector is not None:
+                raise ValueError("The process pipeline takes video_source_factory and object_detector_factory")
+
+            if extra_video_sources:
+                raise ValueError("The process pipeline supports a single camera")
+
+        self._video_source = self._create_video_source(video_source, video_source_factory)
+        self._frame_seq = 0
 
-        self._od = ObjectDetectionJetNet()
-        self._fd = FaceDetection()
+        # Every frame travels through the pipeline as a FramePacket, the derived formats (RGB for the detectors,
+        # thumbnails, ...) are computed once per frame into pooled buffers
+        self._frame_pool = FrameBufferPool()
+        self._frame_packet = None
+
+        self._create_object_detection(object_detector, object_detector_factory, len(extra_video_sources or []))
+        self._create_cameras(extra_video_sources or [])
+
+        # Tracks keep the focus person between detection runs and predict where people moved in between
+        self._tracked_frame = None
         self._focus_person = None
         self._focus_person_face_rect = None
         self._focus_face = None
         self._detected_faces = []
+        self._detected_faces_timestamp = None
+
+        # Identities of recognised people follow their tracks, so their faces are not encoded every cycle
+        self._identity_cache = IdentityCache() if config.use_identity_cache else None
+        self._encoded_faces = 0
+        self._cached_faces = 0
+
+        # Decides every frame which detectors to run within the frame period
+        if scheduler is None:
+            scheduler = VisionScheduler(target_period=1.0 / Const.CaptureFPS)
+
+        self._scheduler = scheduler
+        self._last_decision = None
+
+        # Motion gated, brain state aware duty cycle. Without it every frame runs the scheduled detectors
+        self._duty_cycle = VisionDutyCycle() if config.use_duty_cycle else None
+
+        # Face detection runs on crops around known people / faces. A (cheaper, downscaled) full frame scan to
+        # pick up new people only happens every _face_full_scan_freq face detection cycles
+        self._face_full_scan_freq = 3
+        self._face_roi_scale = 1.0
+        self._face_roi_upsample = 1
+        self._face_full_scan_scale = 0.5
+        self._face_full_scan_upsample = 1
+        self._face_detection_ctr = 0
+
+        self._create_face_recognition()
+        self._create_preview()
+
+    def _create_video_source(self, video_source, video_source_factory):
+        config = self._config
+
+        if self._pipeline == VisionPipeline.Process:
+            if video_source_factory is None:
+                video_source_factory = functools.partial(VideoCSIReader, capture_width=self.CaptureWidth,
+                                                         capture_height=self.CaptureHeight,
+                                                         capture_fps=Const.CaptureFPS, flip_method=2)
+
+            return ProcessVideoReader(video_source_factory, (self.CaptureHeight, self.CaptureWidth, 3),
+                                      drop_frames=config.drop_frames)
+
+        if video_source is None:
+            if video_source_factory is None:
+                # The camera pipeline scales and converts the images the detectors and the preview read
+                video_source_factory = functools.partial(VideoCSIReader, capture_width=self.CaptureWidth,
+                                                         capture_height=self.CaptureHeight,
+                                                         capture_fps=Const.CaptureFPS, flip_method=2,
+                                                         variants=self._camera_variants(
+                                                             config.has_preview(), config.use_duty_cycle,
+                                                             not config.use_face_worker))
+            video_source = video_source_factory()
+
+        # Capture on a dedicated thread into a ring of preallocated frames, so the sensor read overlaps
+        # with processing of the previous frame
+        return ThreadedVideoReader(video_source, drop_frames=config.drop_frames)
+
+    def _create_object_detection(self, object_detector, object_detector_factory, num_extra_cameras):
+        if object_detector_factory is None:
+            object_detector_factory = ObjectDetection
+
+        if self._pipeline == VisionPipeline.Process:
+            # Runs on every new frame at its own pace, the sight loop only merges the results
+            self._od = None
+            self._od_worker = ObjectDetectionWorker(self._video_source.ring(), object_detector_factory)
+            return
+
+        if object_detector is None:
+            # The extra camera frames go through the detector in one batch with the main camera frame
+            object_detector = object_detector_factory(batch_size=1 + num_extra_cameras)
+
+        self._od = object_detector
+        self._od_worker = None
+
+    def _create_cameras(self, extra_video_sources):
+        # Extra cameras (e.g. looking behind the robot) fixed to the body. Their frames go through the object
+        # detection in one batch with the main camera frame. Every camera tracks its own people, with
+        # interleaved track ids so they are unique across cameras
+        camera_headings = self._config.camera_headings
+        if camera_headings is None:
+            # Spread the extra cameras evenly around the robot
+            camera_headings = [90 + 360.0 * (idx + 1) / (len(extra_video_sources) + 1)
+                               for idx in range(len(extra_video_sources))]
+        if len(camera_headings) != len(extra_video_sources):
+            raise ValueError("camera_headings needs one heading per extra video source")
+
+        num_cameras = len(extra_video_sources) + 1
+        self._camera_id = 0 if num_cameras > 1 else None
+        self._cameras = [SightCamera(idx + 1, extra_video_source, heading,
+                                     ObjectTracker(idx + 1, first_track_id=idx + 2, track_id_step=num_cameras),
+                                     drop_frames=self._config.drop_frames)
+                         for idx, (extra_video_source, heading) in enumerate(zip(extra_video_sources,
+                                                                                 camera_headings))]
+        self._tracker = ObjectTracker(self._camera_id, first_track_id=1, track_id_step=num_cameras)
+
+    def _create_face_recognition(self):
+        # Run face recognition in a background process so it never stalls the sight loop
+        if self._pipeline == VisionPipeline.Process:
+            # Takes the frames from the shared memory ring
+            self._fd = None
+            self._face_worker = FaceRecognitionWorker(frame_ring=self._video_source.ring())
+        elif self._config.use_face_worker:
+            self._fd = None
+            self._face_worker = FaceRecognitionWorker()
+        else:
+            self._fd = FaceDetection()
+            self._face_worker = None
+
+    def _create_preview(self):
+        # Without preview (headless) no rendering work is done at all
+        self._preview = None
+        self._live_view = None
+
+        if self._config.has_preview():
+            # Drawing and the window refresh happen on the renderer thread
+            self._preview = PreviewRenderer(self.DisplayWidth, self.DisplayHeight,
+                                            self.CaptureWidth, self.CaptureHeight,
+                                            show_window=self._config.display_preview)
+
+        if self._config.live_view_port is not None:
+            # Stream the annotated frames for remote monitoring of a headless robot
+            self._live_view = LiveViewServer(port=self._config.live_view_port, max_fps=Const.LiveViewMaxFPS)
+            self._preview.add_listener(self._live_view.publish, self._live_view.has_clients)
+
+    def _camera_variants(self, with_preview, with_motion, with_face_rgb):
+        # Images of every frame read by the object detection, the face detection, the preview and the motion
+        # detector. The face worker is sent the BGR frame, the RGB frame is only read by in-process face detection
+        variants = [ObjectDetection.input_variant(self.CaptureWidth, self.CaptureHeight)]
+
+        if with_face_rgb:
+            variants.append((self.CaptureWidth, self.CaptureHeight, "rgb"))
+
+        if with_preview:
+            variants.append((self.DisplayWidth, self.DisplayHeight, "bgr"))
 
-        self._display_preview = True
-        self._object_detection_freq = 2
-        self._face_detection_freq = 10
+        if with_motion:
+            variants.append((MotionDetector.ThumbnailWidth, MotionDetector.ThumbnailHeight, "gray"))
 
-        if self._display_preview:
-            self._windowHandle = cv2.namedWindow("Camera", cv2.WINDOW_AUTOSIZE)
+        # The frame itself is BGR at the capture size
+        return [variant for variant in dict.fromkeys(variants)
+                if variant is not None and variant != (self.CaptureWidth, self.CaptureHeight, "bgr")]
 
-        self._ctr = 0
+    def _detect_objects(self, packet):
+        # One detection call over the main camera frame and the new frames of the extra cameras, so the
+        # backend shares the inference between them. Extra cameras without a new frame only predict
+        cameras = [camera for camera in self._cameras if camera.has_new_frame()]
+        frames = self._od.detect_batch([packet] + [camera.packet() for camera in cameras])
 
-    def _find_person(self, image):
-        last_frame = self._od.getLastFrameCaptured(image)
+        for camera, frame_captured in zip(cameras, frames[1:]):
+            camera.update(frame_captured)
 
-        if last_frame is None:
-            return None, None
+        for camera in self._cameras:
+            if camera not in cameras:
+                camera.predict()
 
-        # Find a focus person
-        if self._focus_person is not None:
-            person, distance = self._od.findExistingObject(self._focus_person, objectName=ObjectName.Person)
+        return frames[0]
+
+    def _tracked_frame_of(self, camera_id):
+        if camera_id == self._camera_id:
+            return self._tracked_frame
+
+        for camera in self._cameras:
+            if camera.camera_id == camera_id:
+                return camera.tracked_frame
+
+        return None
+
+    def _camera_heading_offset(self, camera_id):
+        for camera in self._cameras:
+            if camera.camera_id == camera_id:
+                # Relative to the main camera which looks straight ahead at heading 90
+                return camera.heading - 90
+
+        return 0.0
+
+    def _is_on_main_camera(self, obj):
+        return obj is not None and obj.cameraId == self._camera_id
+
+    def _tracked_people(self):
+        # Every tracked person of all cameras, main camera first
+        people = []
+
+        if self._tracked_frame is not None:
+            people.extend(self._tracked_frame.getObjects(ObjectName.Person))
+
+        for camera in self._cameras:
+            people.extend(camera.tracked_frame.getObjects(ObjectName.Person))
+
+        return people
+
+    def _find_new_person_on_extra_cameras(self):
+        # The largest (closest) person of the merged person list seen by one of the extra cameras
+        people = [person for person in self._tracked_people() if not self._is_on_main_camera(person)]
+        if len(people) == 0:
+            return None
+
+        return max(people, key=lambda person: person.boundingBox.area())
+
+    def _person_face_rect(self, person):
+        # Generate face bounding box from person bounding box
+        face_x1 = person.boundingBox.x1 + person.boundingBox.length() * self.FaceLeftOffset
+        face_x2 = person.boundingBox.x1 + person.boundingBox.length() * self.FaceRightOffset
+        face_y1 = person.boundingBox.y1 + person.boundingBox.height() * self.FaceTopOffset
+        face_y2 = person.boundingBox.y1 + person.boundingBox.height() * self.FaceBottomOffset
+
+        return RectArea(face_x1 * self.CaptureWidth,
+                        face_y1 * self.CaptureHeight,
+                        face_x2 * self.CaptureWidth,
+                        face_y2 * self.CaptureHeight)
+
+    def _find_person(self, packet, run_detection, frame_captured=None):
+        # frame_captured is a detection result which arrived from the object detection worker
+        for camera in self._cameras:
+            camera.read(self._frame_pool)
+
+        if frame_captured is not None:
+            self._tracked_frame = self._tracker.update(frame_captured)
+        elif run_detection:
+            self._tracked_frame = self._tracker.update(self._detect_objects(packet))
         else:
-            person, distance = self._od.findNewObject(objectName=ObjectName.Person)
+            # Predict where everyone moved since the last detection
+            self._tracked_frame = self._tracker.predict()
+            for camera in self._cameras:
+                camera.predict()
+
+        if self._identity_cache is not None:
+            self._identity_cache.follow({person.trackId: person.boundingBox
+                                         for person in self._tracked_frame.getObjects(ObjectName.Person)})
+
+        # Find a focus person, following its track when it still exists
+        person = None
+        if self._focus_person is not None and self._focus_person.trackId is not None:
+            person, distance = self._tracked_frame_of(self._focus_person.cameraId).findObjectByTrackId(
+                self._focus_person.trackId)
+
+            if person is not None and not self._is_on_main_camera(person):
+                # Somebody in front of the main camera takes over, usually the same person after the head
+                # turned towards them
+                main_person, distance = self._tracked_frame.findNewObject(objectName=ObjectName.Person)
+                if main_person is not None:
+                    person = main_person
+
+        if person is None:
+            if self._is_on_main_camera(self._focus_person):
+                person, distance = self._tracked_frame.findExistingObject(self._focus_person,
+                                                                         objectName=ObjectName.Person)
+            else:
+                person, distance = self._tracked_frame.findNewObject(objectName=ObjectName.Person)
+
+        if person is None:
+            # Nobody in front of us, look for people around us
+            person = self._find_new_person_on_extra_cameras()
 
         face_rect = None
         if person is not None:
-            # Generate face bounding box from person bounding box
-            face_x1 = person.boundingBox.x1 + person.boundingBox.length() * self.FaceLeftOffset
-            face_x2 = person.boundingBox.x1 + person.boundingBox.length() * self.FaceRightOffset
-            face_y1 = person.boundingBox.y1 + person.boundingBox.height() * self.FaceTopOffset
-            face_y2 = person.boundingBox.y1 + person.boundingBox.height() * self.FaceBottomOffset
-
-            face_rect = RectArea(face_x1 * self.CaptureWidth,
-                          face_y1 * self.CaptureHeight,
-                          face_x2 * self.CaptureWidth,
-                          face_y2 * self.CaptureHeight)
+            face_rect = self._person_face_rect(person)
 
         return person, face_rect
 
-    def _draw_person(self, person, face_rect, draw):
-        if person is not None:
-            if self._display_preview:
-                # Draw person bounding box
-                p_box = person.boundingBox.normalisedTo(self.DisplayWidth, self.DisplayHeight).round()
+    def _face_search_regions(self):
+        # Regions in capture coordinates likely to contain a face, or None when a full frame scan is due
+        regions = []
 
-                draw.rectangle((p_box.x1, p_box.y1, p_box.x2, p_box.y2),
-                               fill=None, outline=(255, 0, 0), width=4)
+        if self._tracked_frame is not None:
+            for person in self._tracked_frame.getObjects(ObjectName.Person):
+                p_box = person.boundingBox.normalisedTo(self.CaptureWidth, self.CaptureHeight)
+                regions.append(RectArea(p_box.x1, p_box.y1, p_box.x2,
+                                        p_box.y1 + p_box.height() * self.PersonFaceRegionHeight))
 
-            if self._display_preview:
-                f_box = face_rect.normalisedTo(self.DisplayWidth, self.DisplayHeight).round()
+        if self._focus_person_face_rect is not None and self._is_on_main_camera(self._focus_person):
+            regions.append(self._focus_person_face_rect.grow(self.FaceRegionGrowth))
 
-                # Draw face bounding box
-                draw.rectangle((f_box.x1, f_box.y1, f_box.x2, f_box.y2),
-                               fill=None, outline=(100, 100, 100), width=4)
+        for face in self._detected_faces:
+            regions.append(face.bounding_box.grow(self.FaceRegionGrowth))
 
-    def _find_face(self, image):
-        detected_faces = self._fd.detect(image)
+        is_full_scan_due = self._face_detection_ctr % self._face_full_scan_freq == 0
+        self._face_detection_ctr += 1
 
-        return detected_faces
+        if is_full_scan_due or len(regions) == 0:
+            return None
+
+        return regions
+
+    def _face_detect_args(self):
+        regions = self._face_search_regions()
 
-    def _draw_face(self, detected_faces, focus_face, draw):
-        if not self._display_preview:
+        if regions is None:
+            args = {"regions": None, "scale": self._face_full_scan_scale, "upsample": self._face_full_scan_upsample}
+        else:
+            args = {"regions": regions, "scale": self._face_roi_scale, "upsample": self._face_roi_upsample}
+
+        if self._identity_cache is not None:
+            args["known_identities"] = self._identity_cache.known_identities(self.CaptureWidth, self.CaptureHeight,
+                                                                             self.PersonFaceRegionHeight)
+
+        return args
+
+    def _cache_identities(self, detected_faces):
+        # Attach every newly recognised face to the person track whose head region it is in
+        if self._identity_cache is None or self._tracked_frame is None:
             return
 
-        for face in detected_faces:
-            f_box = face.bounding_box.normalisedFrom(
-                self.CaptureWidth, self.CaptureHeight).normalisedTo(
-                self.DisplayWidth, self.DisplayHeight).round()
+        for person in self._tracked_frame.getObjects(ObjectName.Person):
+            p_box = person.boundingBox.normalisedTo(self.CaptureWidth, self.CaptureHeight)
+            head_region = RectArea(p_box.x1, p_box.y1, p_box.x2,
+                                   p_box.y1 + p_box.height() * self.PersonFaceRegionHeight)
 
-            # Draw face bounding box
-            if focus_face == face:
-                draw.rectangle((f_box.x1, f_box.y1, f_box.x2, f_box.y2),
-                               fill=None, outline=(0, 255, 0), width=4)
-            else:
-                draw.rectangle((f_box.x1, f_box.y1, f_box.x2, f_box.y2),
-                               fill=None, outline=(150, 150, 0), width=2)
+            faces = [face for face in detected_faces if head_region.isPointInside(*face.bounding_box.center())]
+            if len(faces) != 1:
+                # Nobody or several people, do not guess
+                continue
+
+            if not faces[0].is_cached:
+                self._identity_cache.update(person.trackId, faces[0], person.boundingBox)
 
-            # Draw face name
-            name = face.name
-            if name is None:
-                name = "None"
+    def _find_face(self, packet):
+        detected_faces = self._fd.detect(packet, **self._face_detect_args())
 
-            draw.text((f_box.x1, f_box.y1), f"{name}", stroke_fill=(0, 255, 0), font=self._small_font)
+        return detected_faces
 
     def _find_largest_face(self, detected_faces):
-        # Find the face with the maximum overlap to focus_person
-        largest_face_area = 0
-        largest_face = None
+        if len(detected_faces) == 0:
+            return None
 
-        for face in detected_faces:
-            face_area = face.bounding_box.area()
+        face_areas = BoxArray.fromRects([face.bounding_box for face in detected_faces]).area()
+        largest_idx = int(np.argmax(face_areas))
 
-            if face_area > largest_face_area:
-                largest_face_area = face_area
-                largest_face = face
+        if face_areas[largest_idx] > 0:
+            return detected_faces[largest_idx]
 
-        return largest_face
+        return None
 
     def _find_focus_face(self, detected_faces, focus_person):
-        max_overlap_area = 0
-        best_face = None
-
-        if focus_person is None:
+        if focus_person is None or len(detected_faces) == 0:
             return self._find_largest_face(detected_faces)
 
-        for face in detected_faces:
-            cur_overlap_rect = face.bounding_box.intersect(focus_person.boundingBox.normalisedTo(
-                self.CaptureWidth, self.CaptureHeight
-            ))
-
-            if cur_overlap_rect is not None:
-                cur_overlap_area = cur_overlap_rect.area()
+        # Find the face with the maximum overlap to focus_person
+        face_boxes = BoxArray.fromRects([face.bounding_box for face in detected_faces])
+        overlap_areas = face_boxes.intersectArea(focus_person.boundingBox.normalisedTo(
+            self.CaptureWidth, self.CaptureHeight
+        ))
+        best_idx = int(np.argmax(overlap_areas))
 
-                if cur_overlap_area > max_overlap_area:
-                    max_overlap_area = cur_overlap_area
-                    best_face = face
+        if overlap_areas[best_idx] > 0:
+            return detected_faces[best_idx]
 
         # If no face overlaps the focus person body, focus on the largest face
-        if best_face is None:
-            best_face = self._find_largest_face(detected_faces)
+        return self._find_largest_face(detected_faces)
 
-        return best_face
+    def _update_detected_faces(self, detected_faces, timestamp):
+        # Results may arrive out of order from the worker, never replace newer faces with older ones
+        if self._detected_faces_timestamp is not None and timestamp < self._detected_faces_timestamp:
+            return False
 
-    def detect(self):
-        image = self._video_source.read_frame()
+        self._detected_faces = detected_faces
+        self._detected_faces_timestamp = timestamp
 
-        draw = None
-        updated_od = False
-        updated_fd = False
-        if self._display_preview:
-            orig_image = Image.fromarray(image)
-            annot_image = orig_image.resize((self.DisplayWidth, self.DisplayHeight))
-            draw = ImageDraw.Draw(annot_image)
+        self._cached_faces += sum(1 for face in detected_faces if face.is_cached)
+        self._encoded_faces += sum(1 for face in detected_faces if not face.is_cached)
+        self._cache_identities(detected_faces)
+
+        # Find the face which belongs to the self._focus_person. Faces are only detected on the main camera
+        focus_person = self._focus_person if self._is_on_main_camera(self._focus_person) else None
+        self._focus_face = self._find_focus_face(self._detected_faces, focus_person)
+
+        return True
 
-        if self._ctr % self._object_detection_freq == 0:
-            # Update focus person at specified fequency
-            self._focus_person, self._focus_person_face_rect = self._find_person(image)
-            updated_od = True
+    def _is_unknown_person_engaged(self):
+        # Someone is in front of us whose face we have not recognised yet
+        if self._focus_person is None and self._focus_face is None:
+            return False
 
+        return self._focus_face is None or self._focus_face.name is None
+
+    def _focus_person_speed(self):
+        # Speed of the focus person box center in normalised units per second
+        if self._focus_person is None or self._focus_person.trackId is None:
+            return 0.0
+
+        if self._is_on_main_camera(self._focus_person):
+            track = self._tracker.get_track(self._focus_person.trackId)
+        else:
+            track = next((camera.tracker.get_track(self._focus_person.trackId) for camera in self._cameras
+                          if camera.camera_id == self._focus_person.cameraId), None)
+        if track is None:
+            return 0.0
 
-        self._draw_person(self._focus_person, self._focus_person_face_rect, draw)
+        vx, vy = track.velocity()
 
-        # Perform a face detection/recognition at required frequency
-        if self._ctr % self._face_detection_freq == 0:
-            updated_fd = True
-            self._detected_faces = self._find_face(image)
+        return math.hypot(vx, vy) * Const.CaptureFPS
 
-            # Find the face which belongs to the self._focus_person
-            self._focus_face = self._find_focus_face(self._detected_faces, self._focus_person)
+    def _record_stage(self, stage, duration):
+        if self._stage_timer is not None:
+            self._stage_timer.record(stage, duration)
 
-        self._draw_face(self._detected_faces, self._focus_face, draw)
+    def _record_face_timings(self, timings, faces):
+        for stage in ["convert", "locate", "encode", "match"]:
+            self._record_stage(f"face_{stage}", timings[stage])
+
+        self._scheduler.record(VisionStage.FaceDetection, timings["locate"])
+
+        # Only faces which were really encoded count towards the per face encoding cost
+        num_faces = sum(1 for face in faces if not face.is_cached)
+        if num_faces > 0:
+            self._scheduler.record(VisionStage.FaceEncoding, (timings["encode"] + timings["match"]) / num_faces)
+
+    def detect(self):
+        # Wait for a frame we have not processed yet. The frame is not copied out of the capture ring
+        capture_start = time.monotonic()
+        image, self._frame_seq, timestamp = self._video_source.read_latest(self._frame_seq,
+                                                                           ThreadedVideoReader.ReadTimeOut)
+        if image is None:
+            return None, False, False
+
+        tick_start = time.monotonic()
+        self._record_stage("capture", tick_start - capture_start)
+
+        # The previous frame is done with, its derived images go back to the pool
+        if self._frame_packet is not None:
+            self._frame_packet.release()
+        packet = FramePacket(image, self._frame_pool, timestamp)
+        for (width, height, color), variant in self._video_source.read_variants().items():
+            packet.add_variant(variant, width, height, color)
+        self._frame_packet = packet
+
+        updated_fd = self._poll_face_results()
+        is_active = self._update_duty_cycle(packet)
+
+        updated_od = False
+        stage_time = 0.0
+        if is_active:
+            decision = self._scheduler.plan(unknown_person_engaged=self._is_unknown_person_engaged(),
+                                            movement_speed=self._focus_person_speed(),
+                                            face_offloaded=self._face_worker is not None,
+                                            face_busy=self._face_worker is not None and self._face_worker.queue_depth() > 0,
+                                            num_faces=len(self._detected_faces))
+            self._last_decision = decision
+
+            updated_od, od_time = self._run_object_detection(packet, decision)
+            stage_time += od_time
+
+            if decision.runs(VisionStage.FaceDetection):
+                updated, fd_time = self._run_face_detection(packet, timestamp)
+                updated_fd = updated_fd or updated
+                stage_time += fd_time
 
         fps = self._fps_calc.log()
-        print(f"FPS {fps}")
+        if self._config.print_fps:
+            print(f"FPS {fps}")
+
+        self._submit_preview(packet, fps)
+        self._scheduler.record_overhead(time.monotonic() - tick_start - stage_time)
+
+        person_start = time.monotonic()
+        found_person = self._build_person(timestamp)
+        self._record_stage("person_build", time.monotonic() - person_start)
+        self._record_stage("total", time.monotonic() - tick_start)
 
-        if self._display_preview:
-            draw.text((5, 5), f"FPS {fps:.1f}", stroke_fill=(255, 255, 0), font=self._font)
+        return found_person, updated_od, updated_fd
 
-            np_image = np.array(annot_image)
-            cv2.imshow("Camera", np_image)
-            cv2.waitKey(30)
+    def _poll_face_results(self):
+        # Merge in whatever the face worker finished since the last frame, without waiting for it
+        if self._face_worker is None:
+            return False
+
+        result = self._face_worker.poll()
+        if result is None:
+            return False
+
+        self._record_face_timings(result.timings, result.faces)
+
+        return self._update_detected_faces(result.faces, result.frame_timestamp)
+
+    def _update_duty_cycle(self, packet):
+        # Returns whether the detectors run on this frame
+        if self._duty_cycle is None:
+            return True
+
+        people_in_view = self._focus_person is not None or len(self._detected_faces) > 0
+        is_active = self._duty_cycle.update(packet, people_in_view)
+
+        # Slow down the capture while idle, the motion detector still sees every captured frame
+        self._video_source.set_min_frame_interval(self._duty_cycle.frame_interval())
+        if self._od_worker is not None:
+            self._od_worker.set_active(is_active)
+
+        return is_active
+
+    def _run_object_detection(self, packet, decision):
+        # Update the focus person. Returns (whether there are new detections, seconds spent in this thread)
+        if self._od_worker is not None:
+            # The object detection process runs on its own, merge its newest result when there is one
+            od_result = self._od_worker.poll()
+            updated_od = od_result is not None
+            self._focus_person, self._focus_person_face_rect = self._find_person(
+                packet, False, od_result.frame_captured if updated_od else None)
+            if updated_od:
+                self._record_stage("object_detection", od_result.processing_time)
+
+            return updated_od, 0.0
+
+        # Run the object detection when scheduled, and only predict the tracked people in between
+        updated_od = decision.runs(VisionStage.ObjectDetection)
+        od_start = time.monotonic()
+        self._focus_person, self._focus_person_face_rect = self._find_person(packet, updated_od)
+        if not updated_od:
+            return False, 0.0
+
+        od_time = time.monotonic() - od_start
+        self._scheduler.record(VisionStage.ObjectDetection, od_time)
+        self._record_stage("object_detection", od_time)
+
+        return True, od_time
+
+    def _run_face_detection(self, packet, timestamp):
+        # Hand the frame to the face worker, or detect the faces in this thread. Returns (whether the detected
+        # faces changed, seconds spent in this thread)
+        if self._pipeline == VisionPipeline.Process:
+            # Hand over the shared memory slot of the frame, nothing is copied
+            self._face_worker.submit_slot(self._video_source.read_slot(), timestamp, **self._face_detect_args())
+            return False, 0.0
+
+        if self._face_worker is not None:
+            self._face_worker.submit(packet.bgr, timestamp, **self._face_detect_args())
+            return False, 0.0
+
+        fd_start = time.monotonic()
+        detected_faces = self._find_face(packet)
+        fd_time = time.monotonic() - fd_start
+        self._record_face_timings(self._fd.last_timings, detected_faces)
+
+        return self._update_detected_faces(detected_faces, timestamp), fd_time
+
+    def _submit_preview(self, packet, fps):
+        # Only copies a downscaled frame, the renderer thread does the drawing. The preview shows the main camera
+        if self._preview is None:
+            return
 
-        self._ctr += 1
+        if self._is_on_main_camera(self._focus_person):
+            self._preview.submit(packet, self._focus_person, self._focus_person_face_rect,
+                                 self._detected_faces, self._focus_face, fps)
+        else:
+            self._preview.submit(packet, None, None, self._detected_faces, self._focus_face, fps)
 
+    def _build_person(self, timestamp):
         # Either a person body or a face must be detected to return a person object
-        found_person = None
+        if self._focus_person is not None and not self._is_on_main_camera(self._focus_person):
+            # Only seen by an extra camera, the faces of the main camera belong to somebody else
+            return Person(self._focus_person, self._focus_person_face_rect, None,
+                          self._camera_heading_offset(self._focus_person.cameraId), timestamp)
+
         if self._focus_person is not None or self._focus_face is not None:
-            found_person = Person(self._focus_person, self._focus_person_face_rect, self._focus_face)
+            return Person(self._focus_person, self._focus_person_face_rect, self._focus_face,
+                          timestamp=timestamp)
 
-        return found_person, updated_od, updated_fd
+        return None
+
+    def people(self):
+        # Every tracked person of all cameras, with the camera id and the heading offset of its camera so
+        # Person.camera_heading() gives the direction of everyone around the robot
+        return [Person(person, self._person_face_rect(person), None, self._camera_heading_offset(person.cameraId))
+                for person in self._tracked_people()]
+
+    def stop(self):
+        self._video_source.stop()
+
+        for camera in self._cameras:
+            camera.stop()
+
+        for worker in [self._od_worker, self._face_worker, self._preview, self._live_view]:
+            if worker is not None:
+                worker.stop()
+
+        if self._pipeline == VisionPipeline.Process:
+            # Everybody is done with the shared frames
+            self._video_source.ring().unlink()
+
+    def set_brain_state(self, brain_state):
+        if self._duty_cycle is not None:
+            self._duty_cycle.set_brain_state(brain_state)
+
+    def duty_cycle_stats(self):
+        if self._duty_cycle is None:
+            return None
+
+        return {"active_ticks": self._duty_cycle.active_ticks,
+                "gated_ticks": self._duty_cycle.gated_ticks}
+
+    def identity_cache_stats(self):
+        # Faces which were encoded and matched vs. took their identity from the cache
+        return {"encoded_faces": self._encoded_faces,
+                "cached_faces": self._cached_faces,
+                "cached_tracks": len(self._identity_cache) if self._identity_cache is not None else 0}
+
+    def last_schedule_decision(self):
+        return self._last_decision
+
+    def schedule_decisions(self):
+        # Recent scheduler decisions, for inspection
+        return self._scheduler.decisions()
+
+    def face_worker_stats(self):
+        if self._face_worker is None:
+            return None
+
+        return {"queue_depth": self._face_worker.queue_depth(),
+                "dropped_frames": self._face_worker.dropped_frames,
+                "processed_frames": self._face_worker.processed_frames,
+                "last_processing_time": self._face_worker.last_processing_time,
+                "restarts": self._face_worker.restarts,
+                "disabled": self._face_worker.disabled}
 
     def register_new_face(self, face_obj):
-        self._fd.register_new_face(face_obj)
\ No newline at end of file
+        if self._face_worker is not None:
+            self._face_worker.register_new_face(face_obj)
+        else:
+            self._fd.register_new_face(face_obj)
\ No newline at end of file
@@ -0,0 +1,104 @@
+import math
+import time
+import numpy as np
+
+from const import Const
+
+
+class TargetPredictor(object):
+    # Constant velocity Kalman filter on the heading and pitch of the tracked face, in head angles (degrees).
+    # Measurements are stamped with the capture time of their frame, and predict() extrapolates to when the
+    # setpoint will have reached the servos, so the head aims where the person will be rather than where
+    # they were when the frame was taken
+    AccelerationNoise = 150.0       # deg/s^2, how quickly a person changes their angular speed
+    MeasurementNoise = 1.5          # deg, jitter of the face center from frame to frame
+    InitialSpeed = 60.0             # deg/s, spread of the unknown speed of a new target
+    MaxPredictionTime = 0.5         # s, never extrapolate further than this past the last measurement
+    LostTimeOut = 1.0               # s without a measurement before the target is dropped
+    GateDistance = 25.0             # deg, a jump larger than this is somebody else, start over
+
+    def __init__(self, command_latency=Const.HeadCommandLatency, acceleration_noise=AccelerationNoise,
+                 measurement_noise=MeasurementNoise):
+        self._command_latency = command_latency
+        self._acceleration_noise = acceleration_noise
+        self._measurement_noise = measurement_noise
+
+        # Rows are heading and pitch, columns angle and angular speed. Both axes see the same measurement times
+        # and noise, so they share one covariance
+        self._x = None
+        self._P = None
+        self._timestamp = None
+        self._source = None
+
+        # Capture to servo time of the last prediction, in seconds
+        self.latency = None
+
+    def reset(self):
+        self._x = None
+        self._P = None
+        self._timestamp = None
+        self._source = None
+
+    def _propagate(self, dt):
+        F = np.array([[1.0, dt], [0.0, 1.0]])
+        q = self._acceleration_noise ** 2
+        Q = q * np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]])
+
+        return self._x @ F.T, F @ self._P @ F.T + Q
+
+    def update(self, heading, pitch, timestamp, source=None):
+        # Add the measured angles of a frame captured at timestamp (time.monotonic()). source tells apart the
+        # cameras, whose angles do not continue each other
+        z = np.array([heading, pitch], dtype=np.float64)
+
+        if self._x is not None and (source != self._source or timestamp - self._timestamp > self.LostTimeOut):
+            self.reset()
+
+        if self._x is not None:
+            if timestamp <= self._timestamp:
+                # Same frame again, or late
+                return
+
+            x, P = self._propagate(timestamp - self._timestamp)
+            y = z - x[:, 0]
+
+            if np.max(np.abs(y)) > self.GateDistance:
+                self.reset()
+            else:
+                S = P[0, 0] + self._measurement_noise ** 2
+                K = P[:, 0] / S
+                self._x = x + y[:, None] * K[None, :]
+                self._P = P - np.outer(K, P[0, :])
+                self._timestamp = timestamp
+                return
+
+        self._x = np.stack([z, np.zeros(2)], axis=1)
+        self._P = np.diag([self._measurement_noise ** 2, self.InitialSpeed ** 2])
+        self._timestamp = timestamp
+        self._source = source
+
+    def predict(self, now=None):
+        # (heading, pitch) the head should be sent to now, None without a recent target
+        if self._x is None:
+            return None
+
+        if now is None:
+            now = time.monotonic()
+
+        if now - self._timestamp > self.LostTimeOut:
+            return None
+
+        target_time = now + self._command_latency
+        self.latency = target_time - self._timestamp
+        dt = min(max(0.0, self.latency), self.MaxPredictionTime)
+
+        heading, pitch = self._x[:, 0] + self._x[:, 1] * dt
+
+        return float(heading), float(pitch)
+
+    def speed(self):
+        # Angular speed of the target in deg/s
+        if self._x is None:
+            return 0.0
+
+        return math.sqrt(float(self._x[0, 1]) ** 2 + float(self._x[1, 1]) ** 2)
@@ -0,0 +1,112 @@
+import numpy as np
+
+from .rectArea import RectArea
+
+
+class BoxArray(object):
+    # Structure of arrays for many boxes: (N, 4) x1, y1, x2, y2 plus optional per box scores and names.
+    # Area / intersection math runs on all boxes at once, RectArea views are only created for single boxes
+
+    @staticmethod
+    def fromRects(rects, scores=None, names=None):
+        boxes = np.array([[rect.x1, rect.y1, rect.x2, rect.y2] for rect in rects], dtype=np.float64)
+        return BoxArray(boxes.reshape(-1, 4), scores, names)
+
+    def __init__(self, boxes, scores=None, names=None):
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+        if scores is None:
+            scores = np.ones(len(self.boxes))
+        if names is None:
+            names = [None] * len(self.boxes)
+
+        self.scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+        self.names = np.empty(len(self.boxes), dtype=object)
+        self.names[:] = list(names)
+
+    def __len__(self):
+        return self.boxes.shape[0]
+
+    def append(self, rect, score=1.0, name=None):
+        return BoxArray(np.vstack([self.boxes, [[rect.x1, rect.y1, rect.x2, rect.y2]]]),
+                        np.append(self.scores, score), list(self.names) + [name])
+
+    def select(self, indices):
+        # Subset by an index array or a boolean mask
+        return BoxArray(self.boxes[indices], self.scores[indices], self.names[indices])
+
+    def rect(self, i):
+        x1, y1, x2, y2 = self.boxes[i].tolist()
+        return RectArea(x1, y1, x2, y2)
+
+    def lengths(self):
+        return self.boxes[:, 2] - self.boxes[:, 0]
+
+    def heights(self):
+        return self.boxes[:, 3] - self.boxes[:, 1]
+
+    def area(self):
+        return self.lengths() * self.heights()
+
+    def scale(self, scaleX, scaleY):
+        return BoxArray(self.boxes * [scaleX, scaleY, scaleX, scaleY], self.scores, self.names)
+
+    def nameMask(self, names=None, exclusionNames=()):
+        # True for boxes whose name is in names (any name if None) and not in exclusionNames
+        mask = np.ones(len(self), dtype=bool)
+
+        if names is not None:
+            mask &= np.isin(self.names, list(names))
+        if len(exclusionNames) > 0:
+            mask &= ~np.isin(self.names, list(exclusionNames))
+
+        return mask
+
+    def intersectArea(self, rect):
+        # Intersection area of every box with a single RectArea
+        ix1 = np.maximum(self.boxes[:, 0], rect.x1)
+        iy1 = np.maximum(self.boxes[:, 1], rect.y1)
+        ix2 = np.minimum(self.boxes[:, 2], rect.x2)
+        iy2 = np.minimum(self.boxes[:, 3], rect.y2)
+
+        return np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+
+    def intersectAreas(self, other):
+        # (N, M) intersection areas against another BoxArray
+        ix1 = np.maximum(self.boxes[:, None, 0], other.boxes[None, :, 0])
+        iy1 = np.maximum(self.boxes[:, None, 1], other.boxes[None, :, 1])
+        ix2 = np.minimum(self.boxes[:, None, 2], other.boxes[None, :, 2])
+        iy2 = np.minimum(self.boxes[:, None, 3], other.boxes[None, :, 3])
+
+        return np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+
+    def iou(self, other):
+        # (N, M) intersection over union against another BoxArray
+        intersection = self.intersectAreas(other)
+        union = self.area()[:, None] + other.area()[None, :] - intersection
+
+        return np.where(union > 0, intersection / np.maximum(union, 1e-12), 0.0)
+
+    def sortedByScore(self):
+        return self.select(np.argsort(-self.scores, kind="stable"))
+
+    def nms(self, iouThreshold, perName=True):
+        # Greedy non-max suppression. Returns the indices of the kept boxes, highest score first
+        order = np.argsort(-self.scores, kind="stable")
+        iou = self.iou(self)
+
+        if perName:
+            # Boxes with a different name never suppress each other
+            iou = np.where(self.names[:, None] == self.names[None, :], iou, 0.0)
+
+        suppressed = np.zeros(len(self), dtype=bool)
+        keep = []
+
+        for i in order:
+            if suppressed[i]:
+                continue
+
+            keep.append(i)
+            suppressed |= iou[i] > iouThreshold
+
+        return np.array(keep, dtype=np.int64)
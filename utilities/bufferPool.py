@@ -0,0 +1,47 @@
+import threading
+import weakref
+import numpy as np
+
+
+class BufferPool(object):
+    # A bounded set of equally shaped buffers. acquire() hands out a free buffer, which goes back to the pool by
+    # itself once the returned array is garbage collected. Keep the returned array itself, slices of it do not
+    # hold the buffer. When max_buffers are in use acquire() returns None instead of allocating, so the memory
+    # taken stays bounded whatever the callers hold on to
+
+    def __init__(self, shape, dtype=np.uint8, max_buffers=8):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.max_buffers = max_buffers
+
+        self._lock = threading.Lock()
+        self._free = []
+        self._num_buffers = 0
+
+        # Number of acquire calls turned down because every buffer was in use
+        self.exhausted = 0
+
+    def acquire(self):
+        with self._lock:
+            if len(self._free) > 0:
+                buffer = self._free.pop()
+            elif self._num_buffers < self.max_buffers:
+                buffer = np.empty(self.shape, dtype=self.dtype)
+                self._num_buffers += 1
+            else:
+                self.exhausted += 1
+                return None
+
+        # Hand out a view, the pool keeps the buffer and gets it back when the view is gone
+        view = buffer.view()
+        weakref.finalize(view, self._release, buffer)
+
+        return view
+
+    def _release(self, buffer):
+        with self._lock:
+            self._free.append(buffer)
+
+    def in_use(self):
+        with self._lock:
+            return self._num_buffers - len(self._free)
@@ -0,0 +1,46 @@
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class StageTimer(object):
+    # Collect durations (seconds) of named pipeline stages, for benchmarks and profiling
+
+    def __init__(self):
+        self._durations = {}
+
+    def record(self, stage, duration):
+        self._durations.setdefault(stage, []).append(duration)
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def stages(self):
+        return list(self._durations.keys())
+
+    def durations(self, stage):
+        return list(self._durations.get(stage, []))
+
+    def reset(self):
+        self._durations = {}
+
+    def summary(self):
+        # Per stage count and latency percentiles in milliseconds
+        result = {}
+
+        for stage, durations in self._durations.items():
+            durations_ms = np.array(durations) * 1000
+            result[stage] = {"count": len(durations_ms),
+                             "p50_ms": float(np.percentile(durations_ms, 50)),
+                             "p90_ms": float(np.percentile(durations_ms, 90)),
+                             "p99_ms": float(np.percentile(durations_ms, 99)),
+                             "mean_ms": float(np.mean(durations_ms)),
+                             "total_ms": float(np.sum(durations_ms))}
+
+        return result
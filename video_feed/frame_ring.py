@@ -0,0 +1,76 @@
+import threading
+import numpy as np
+
+
+class FrameRing(object):
+    # A small ring of preallocated frame buffers shared by one writer (capture) thread and one reader.
+    # The writer never touches the newest published frame nor the frame last handed to the reader, so the
+    # reader can use its frame without a copy until it asks for the next one
+    MinSize = 3
+
+    def __init__(self, shape, dtype=np.uint8, size=MinSize):
+        size = max(size, self.MinSize)
+
+        self._buffers = [np.empty(shape, dtype=dtype) for _ in range(size)]
+        self._seqs = [0] * size
+        self._timestamps = [None] * size
+
+        self._cond = threading.Condition()
+        self._latest_slot = None
+        self._reader_slot = None
+        self._last_seq = 0
+        self._write_slot = -1
+        self._closed = False
+
+    def acquire_write_slot(self):
+        # Return (slot, buffer) for the writer to fill
+        with self._cond:
+            for _ in range(len(self._buffers)):
+                self._write_slot = (self._write_slot + 1) % len(self._buffers)
+                if self._write_slot != self._latest_slot and self._write_slot != self._reader_slot:
+                    break
+
+            return self._write_slot, self._buffers[self._write_slot]
+
+    def publish(self, slot, timestamp):
+        # Make the filled slot the newest frame. Returns its sequence number
+        with self._cond:
+            self._last_seq += 1
+            self._seqs[slot] = self._last_seq
+            self._timestamps[slot] = timestamp
+            self._latest_slot = slot
+            self._cond.notify_all()
+
+            return self._last_seq
+
+    def close(self):
+        # No more frames will be published, wake up any waiting reader
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reader_slot(self):
+        # Slot of the frame last handed to the reader
+        with self._cond:
+            return self._reader_slot
+
+    def last_seq(self):
+        with self._cond:
+            return self._last_seq
+
+    def latest(self, after_seq=None, timeout=None):
+        # Return (image, seq, timestamp) of the newest frame. If after_seq is given, wait up to timeout seconds
+        # for a frame newer than after_seq. Returns (None, after_seq, None) if there is none
+        with self._cond:
+            if after_seq is not None:
+                self._cond.wait_for(lambda: self._last_seq > after_seq or self._closed, timeout)
+
+                if self._last_seq <= after_seq:
+                    return None, after_seq, None
+
+            if self._latest_slot is None:
+                return None, 0, None
+
+            self._reader_slot = self._latest_slot
+
+            return self._buffers[self._reader_slot], self._seqs[self._reader_slot], self._timestamps[self._reader_slot]
@@ -0,0 +1,143 @@
+from .video_reader import VideoReader
+from .shared_frame_ring import SharedFrameRing
+import multiprocessing
+import time
+import numpy as np
+import cv2
+
+
+class ProcessVideoReader(VideoReader):
+    # Capture frames in a separate process into a SharedFrameRing. Same reading interface as
+    # ThreadedVideoReader, and the ring can be handed to other processes (detectors) which read the same frames.
+    # source_factory must be picklable (a class or functools.partial) and creates the VideoReader in the
+    # capture process. Frames are resized to frame_shape if the source delivers another size
+    ReadTimeOut = 1.0
+    StopTimeOut = 5
+
+    def __init__(self, source_factory, frame_shape, ring_size=SharedFrameRing.MinSize, drop_frames=True):
+        ctx = multiprocessing.get_context("spawn")
+
+        self._ring = SharedFrameRing(frame_shape, np.uint8, ring_size, ctx)
+        self._min_frame_interval = ctx.RawValue("d", 0.0)
+        self._last_read_seq = ctx.RawValue("q", 0)
+        self._stop_event = ctx.Event()
+        self._read_slot = None
+
+        self._process = ctx.Process(target=_capture_main,
+                                    args=(source_factory, self._ring, self._min_frame_interval, self._last_read_seq,
+                                          drop_frames, self._stop_event))
+        self._process.daemon = True
+        self._process.start()
+
+    def ring(self):
+        return self._ring
+
+    def read_slot(self):
+        # Ring slot of the frame last returned by read_latest, still held by this reader
+        return self._read_slot
+
+    def set_min_frame_interval(self, interval):
+        # Capture at most one frame every interval seconds, 0 for the full source rate
+        self._min_frame_interval.value = interval
+
+    def last_seq(self):
+        return self._ring.last_seq()
+
+    def read_latest(self, after_seq=None, timeout=None):
+        # Return (image, seq, timestamp) of the newest frame without a copy. The image stays valid until the
+        # next read
+        slot, image, seq, timestamp = self._ring.latest(after_seq, timeout)
+        if slot is None:
+            return None, seq, None
+
+        if self._read_slot is not None:
+            self._ring.release(self._read_slot)
+        self._read_slot = slot
+        self._last_read_seq.value = seq
+
+        return image, seq, timestamp
+
+    def read_frame(self, show_preview=False):
+        img, _, _ = self.read_latest(self._last_read_seq.value, self.ReadTimeOut)
+
+        if img is None:
+            return None
+
+        if show_preview:
+            cv2.imshow("preview", img)
+            cv2.waitKey(1)
+
+        return img
+
+    def stop(self):
+        self._stop_event.set()
+        self._process.join(self.StopTimeOut)
+
+        if self._process.is_alive():
+            self._process.terminate()
+
+        self._ring.close()
+
+
+def _read_into(video_source, buffer):
+    # Decode straight into the ring slot when the source has the ring frame size
+    if video_source.read_frame_into(buffer) is None:
+        return False
+
+    return True
+
+
+def _read_resized(video_source, buffer):
+    image = video_source.read_frame()
+    if image is None:
+        return False
+
+    cv2.resize(image, (buffer.shape[1], buffer.shape[0]), dst=buffer, interpolation=cv2.INTER_AREA)
+
+    return True
+
+
+def _capture_main(source_factory, ring, min_frame_interval, last_read_seq, drop_frames, stop_event):
+    video_source = source_factory()
+
+    # The first frame tells whether the source needs resizing to the ring frame size
+    first_frame = video_source.read_frame()
+    if first_frame is None:
+        ring.close()
+        return
+
+    read = _read_into if first_frame.shape == ring.shape else _read_resized
+    slot, buffer = ring.acquire_write_slot()
+    if read is _read_into:
+        np.copyto(buffer, first_frame)
+    else:
+        cv2.resize(first_frame, (buffer.shape[1], buffer.shape[0]), dst=buffer, interpolation=cv2.INTER_AREA)
+    seq = ring.publish(slot, time.monotonic())
+
+    while not stop_event.is_set():
+        if not drop_frames:
+            # Replaying a recording, wait until the reader took the last frame
+            while last_read_seq.value < seq and not stop_event.is_set():
+                time.sleep(0.001)
+
+        if min_frame_interval.value > 0:
+            stop_event.wait(min_frame_interval.value)
+
+        slot, buffer = ring.acquire_write_slot()
+        if slot is None:
+            if not drop_frames:
+                time.sleep(0.001)
+                continue
+
+            # Every slot is still in use. Keep draining the source so we do not fall behind the camera
+            if video_source.read_frame() is None:
+                break
+            continue
+
+        if not read(video_source, buffer):
+            ring.abandon(slot)
+            break
+
+        seq = ring.publish(slot, time.monotonic())
+
+    ring.close()
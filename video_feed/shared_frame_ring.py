@@ -0,0 +1,142 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class SharedFrameRing(object):
+    # A ring of frame buffers in shared memory, written by one capture process and read by any number of
+    # processes without pickling or copying the frames. Every reader holds a reference on the slot it uses and
+    # releases it when done; the writer only reuses slots nobody holds. Pass the ring to child processes as a
+    # Process argument, they attach to the same memory
+    MinSize = 4
+
+    def __init__(self, shape, dtype=np.uint8, size=MinSize, ctx=None):
+        if ctx is None:
+            ctx = multiprocessing.get_context("spawn")
+
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.size = max(size, self.MinSize)
+        self._frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self._frame_bytes * self.size)
+        self._is_owner = True
+
+        self._cond = ctx.Condition()
+        self._refs = ctx.RawArray("i", self.size)
+        self._seqs = ctx.RawArray("q", self.size)
+        self._timestamps = ctx.RawArray("d", self.size)
+        self._latest_slot = ctx.RawValue("i", -1)
+        self._last_seq = ctx.RawValue("q", 0)
+        self._closed = ctx.RawValue("b", 0)
+
+        self._buffers = self._map_buffers()
+
+    def _map_buffers(self):
+        return [np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf,
+                           offset=slot * self._frame_bytes) for slot in range(self.size)]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shm"] = self._shm.name
+        del state["_buffers"]
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = self._attach(state["_shm"])
+        self._is_owner = False
+        self._buffers = self._map_buffers()
+
+    @staticmethod
+    def _attach(name):
+        # Only the creating process unlinks the memory. Child processes share its resource tracker, newer
+        # Pythons can skip the tracking altogether
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            return shared_memory.SharedMemory(name=name)
+
+    def buffer(self, slot):
+        return self._buffers[slot]
+
+    def acquire_write_slot(self):
+        # Return (slot, buffer) of a slot no reader holds, or (None, None) when all are busy
+        with self._cond:
+            for slot in range(self.size):
+                if self._refs[slot] == 0 and slot != self._latest_slot.value:
+                    # Hold it ourselves while writing
+                    self._refs[slot] = 1
+                    return slot, self._buffers[slot]
+
+        return None, None
+
+    def publish(self, slot, timestamp):
+        # Make the written slot the newest frame. Returns its sequence number
+        with self._cond:
+            self._last_seq.value += 1
+            self._seqs[slot] = self._last_seq.value
+            self._timestamps[slot] = timestamp
+            self._refs[slot] -= 1
+            self._latest_slot.value = slot
+            self._cond.notify_all()
+
+            return self._last_seq.value
+
+    def abandon(self, slot):
+        # Give back a write slot which was not published
+        self.release(slot)
+
+    def latest(self, after_seq=None, timeout=None):
+        # Return (slot, image, seq, timestamp) of the newest frame and hold a reference on the slot, which the
+        # caller must release(). With after_seq, wait up to timeout seconds for a newer frame.
+        # Returns (None, None, after_seq, None) if there is none
+        with self._cond:
+            if after_seq is not None:
+                self._cond.wait_for(lambda: self._last_seq.value > after_seq or self._closed.value, timeout)
+
+                if self._last_seq.value <= after_seq:
+                    return None, None, after_seq, None
+
+            slot = self._latest_slot.value
+            if slot < 0:
+                return None, None, 0, None
+
+            self._refs[slot] += 1
+
+            return slot, self._buffers[slot], self._seqs[slot], self._timestamps[slot]
+
+    def retain(self, slot):
+        # Take one more reference, e.g. before handing the slot to another process
+        with self._cond:
+            self._refs[slot] += 1
+
+    def release(self, slot):
+        with self._cond:
+            self._refs[slot] = max(0, self._refs[slot] - 1)
+
+    def last_seq(self):
+        with self._cond:
+            return self._last_seq.value
+
+    def is_closed(self):
+        return bool(self._closed.value)
+
+    def close(self):
+        # No more frames will be published, wake up the waiting readers
+        with self._cond:
+            self._closed.value = 1
+            self._cond.notify_all()
+
+    def unlink(self):
+        # Free the shared memory. Only the process which created the ring does this, once everyone is done
+        self._buffers = []
+        try:
+            self._shm.close()
+        except BufferError:
+            # Somebody still holds a frame view, the mapping goes away with the process
+            pass
+
+        if self._is_owner:
+            self._shm.unlink()
@@ -0,0 +1,133 @@
+from .video_reader import VideoReader
+from .frame_ring import FrameRing
+import threading
+import time
+import numpy as np
+import cv2
+
+
+class ThreadedVideoReader(VideoReader):
+    # Capture frames from another VideoReader on a dedicated thread into a preallocated FrameRing.
+    # Every frame carries a sequence number and a monotonic capture timestamp.
+    # With drop_frames=False the capture waits for every frame to be read, for replaying recordings
+    ReadTimeOut = 1.0
+
+    def __init__(self, video_source, ring_size=FrameRing.MinSize, drop_frames=True):
+        self._video_source = video_source
+        self._drop_frames = drop_frames
+
+        # Read the first frame on the caller thread to learn the frame shape
+        first_frame = self._video_source.read_frame()
+        if first_frame is None:
+            raise RuntimeError('Could not read first frame from video source')
+
+        self._ring = FrameRing(first_frame.shape, first_frame.dtype, ring_size)
+
+        # Every ring slot has its own buffers for the variants the source delivers with the frames, and the
+        # variants its frame came with
+        self._has_variants = len(self._video_source.frame_variants()) > 0
+        first_variants = self._video_source.read_variants()
+        num_slots = max(ring_size, FrameRing.MinSize)
+        self._variant_buffers = [{key: np.empty_like(image) for key, image in first_variants.items()}
+                                 for _ in range(num_slots)]
+        self._slot_variants = [{} for _ in range(num_slots)]
+
+        slot, buffer = self._ring.acquire_write_slot()
+        np.copyto(buffer, first_frame)
+        for key, image in first_variants.items():
+            np.copyto(self._variant_buffers[slot][key], image)
+        self._slot_variants[slot] = dict(self._variant_buffers[slot])
+        self._ring.publish(slot, time.monotonic())
+
+        self._last_read_seq = 0
+        self._read_cond = threading.Condition()
+        self._min_frame_interval = 0.0
+        self._interval_event = threading.Event()
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_frames)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _capture_frames(self):
+        while self._running:
+            if not self._drop_frames:
+                # Replaying a recording, wait until the reader took the last frame before publishing the next one
+                with self._read_cond:
+                    self._read_cond.wait_for(lambda: not self._running or
+                                             self._last_read_seq >= self._ring.last_seq())
+                if not self._running:
+                    break
+
+            slot, buffer = self._ring.acquire_write_slot()
+            image = self._video_source.read_frame_into(buffer)
+
+            if image is None:
+                # End of stream
+                break
+
+            if self._has_variants:
+                variants = self._video_source.read_variants_into(self._variant_buffers[slot])
+                if variants is None:
+                    break
+                # Keep the buffers of variants the first frame did not have
+                self._variant_buffers[slot].update(variants)
+                self._slot_variants[slot] = variants
+
+            self._ring.publish(slot, time.monotonic())
+
+            # Throttle the capture rate if asked to. set_min_frame_interval wakes us up early
+            if self._min_frame_interval > 0:
+                self._interval_event.wait(self._min_frame_interval)
+                self._interval_event.clear()
+
+        self._ring.close()
+
+    def set_min_frame_interval(self, interval):
+        # Capture at most one frame every interval seconds, 0 for the full source rate
+        if interval != self._min_frame_interval:
+            self._min_frame_interval = interval
+            self._interval_event.set()
+
+    def stop(self):
+        self._running = False
+        self._interval_event.set()
+        with self._read_cond:
+            self._read_cond.notify_all()
+        self._thread.join()
+
+    def last_seq(self):
+        return self._ring.last_seq()
+
+    def read_latest(self, after_seq=None, timeout=None):
+        # Return (image, seq, timestamp) of the newest frame without a copy. The image stays valid until the
+        # next read. With after_seq, wait for a frame newer than after_seq so callers can skip work on
+        # frames they already processed
+        image, seq, timestamp = self._ring.latest(after_seq, timeout)
+
+        if image is not None:
+            with self._read_cond:
+                self._last_read_seq = seq
+                self._read_cond.notify_all()
+
+        return image, seq, timestamp
+
+    def read_variants(self):
+        # Variants of the frame last returned by read_latest, valid as long as the frame
+        slot = self._ring.reader_slot()
+        if slot is None:
+            return {}
+
+        return self._slot_variants[slot]
+
+    def read_frame(self, show_preview=False):
+        # Blocks until a frame newer than the last one read is available
+        img, _, _ = self.read_latest(self._last_read_seq, self.ReadTimeOut)
+
+        if img is None:
+            return None
+
+        if show_preview:
+            cv2.imshow("preview", img)
+            cv2.waitKey(1)
+
+        return img
@@ -5,22 +5,66 @@ import time
 import numpy as np
 import cv2
 
+try:
+    from jetcam.multi_sink_camera import MultiSinkCamera, CameraSink
+except (ImportError, ValueError):
+    # Without the GStreamer python bindings the camera delivers a single BGR stream
+    MultiSinkCamera = None
+
 class VideoCSIReader(VideoReader):
-    
+
     def __init__(self, capture_width=400, capture_height=300, capture_fps=30,
-                 flip_method=0):
-        self._camera = CSICamera(capture_width=capture_width, capture_height=capture_height,
-                                 capture_fps=capture_fps, flip_method=flip_method)
-            
+                 flip_method=0, variants=None, source="csi"):
+        # variants is a list of (width, height, color) images the camera pipeline scales and converts next to
+        # the BGR frame, e.g. the detector input, so nobody has to on the CPU. source="test" runs the same
+        # pipeline on videotestsrc
+        self._variants = []
+        self._variant_images = {}
+
+        if (variants or source != "csi") and MultiSinkCamera is not None:
+            self._variants = [tuple(variant) for variant in variants or []]
+            sinks = [CameraSink("frame", capture_width, capture_height, "bgr")] + \
+                    [CameraSink(f"variant{idx}", *variant) for idx, variant in enumerate(self._variants)]
+            self._camera = MultiSinkCamera(sinks, source=source, capture_width=capture_width,
+                                           capture_height=capture_height, capture_fps=capture_fps,
+                                           flip_method=flip_method)
+        else:
+            self._camera = CSICamera(capture_width=capture_width, capture_height=capture_height,
+                                     capture_fps=capture_fps, flip_method=flip_method)
+
     def read_frame(self,  show_preview=False):
         img = self._camera.read()
-        
+
         if img is None:
             return None
-            
+
+        if self._variants:
+            self._variant_images = self.read_variants_into({})
+
         if show_preview:
             cv2.imshow("preview", img)
             cv2.waitKey(1)
-        
+
         return img
-        
+
+    def read_frame_into(self, out):
+        return self._camera.read_into(out)
+
+    def frame_variants(self):
+        return list(self._variants)
+
+    def read_variants_into(self, outs):
+        # Only images of the same camera frame as the BGR frame. A variant whose branch dropped that frame is left
+        # out, the consumers make it from the BGR frame instead
+        pts = self._camera.frame_timestamp()
+        variants = {}
+
+        for idx, variant in enumerate(self._variants):
+            image = self._camera.read_sink_at(f"variant{idx}", pts, outs.get(variant))
+            if image is not None:
+                variants[variant] = image
+
+        return variants
+
+    def read_variants(self):
+        return self._variant_images
@@ -1,21 +1,206 @@
 from .video_reader import VideoReader
-import cv2
-from PIL import Image
+from const import Const
+import threading
+import queue
 import time
 import numpy as np
+import cv2
+
+
+class ReplayMode(object):
+    Fast = "fast"           # Every frame of the clip, as fast as the reader takes them
+    RealTime = "realtime"   # Like a live camera at capture_fps: paced, and frames the reader is too slow for are lost
+
 
 class VideoOfflineReader(VideoReader):
-    
-    def __init__(self, file_path):
+    # Replay a recording. Frames are decoded ahead on a prefetch thread into a bounded queue, so decoding is not
+    # paid by the reader. start_time / end_time (seconds in the clip) limit the replay, and seek() jumps within it.
+    # grab() still decodes the frame it skips (it only saves the conversion to BGR), so only a frame or two are
+    # skipped with it. Longer jumps seek with CAP_PROP_POS_FRAMES, which decodes from the nearest key frame
+    QueueSize = 8
+    ReadTimeOut = 5.0
+
+    # Skip by seeking instead of grabbing the frames when the jump is longer than this many frames
+    MaxGrabFrames = 2
+
+    def __init__(self, file_path, mode=ReplayMode.Fast, start_time=0.0, end_time=None,
+                 capture_fps=Const.CaptureFPS, queue_size=QueueSize):
         self._cap = cv2.VideoCapture(file_path)
-            
-    def read_frame(self,  show_preview=False):
-        ret_val, img = self._cap.read()
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Could not open {file_path}")
+
+        self._mode = mode
+        self._end_time = end_time
+        self._capture_fps = capture_fps
+        self._clip_fps = self._cap.get(cv2.CAP_PROP_FPS) or capture_fps
+
+        # A live camera only ever holds the newest frame
+        self._frames = queue.Queue(1 if mode == ReplayMode.RealTime else queue_size)
+        self._free_buffers = queue.Queue()
+        self._next_index = 0
+        self._seek_time = start_time
+        self._seek_lock = threading.Lock()
+        # Bumped by every seek, frames decoded before it are not returned any more
+        self._seek_generation = 0
+
+        # Clip time (seconds) of the frame last returned
+        self.frame_time = None
+        self.decoded_frames = 0
+        self.skipped_frames = 0
+        self.dropped_frames = 0
+
+        self._end_of_stream = False
+        self._running = True
+        self._thread = threading.Thread(target=self._prefetch)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def seek(self, clip_time):
+        # Continue the replay from clip_time seconds. Frames already decoded are dropped
+        with self._seek_lock:
+            self._seek_time = clip_time
+            self._seek_generation += 1
+
+    def _skip_to(self, index):
+        # Position the capture so the next read returns frame index
+        skip = index - self._next_index
+
+        if skip < 0 or skip > self.MaxGrabFrames:
+            if self._cap.set(cv2.CAP_PROP_POS_FRAMES, index):
+                position = int(round(self._cap.get(cv2.CAP_PROP_POS_FRAMES)))
+                self.skipped_frames += max(0, min(index, position) - self._next_index)
+                self._next_index = position
+                skip = max(0, index - self._next_index)
+
+        for _ in range(skip):
+            if not self._cap.grab():
+                return False
+            self._next_index += 1
+            self.skipped_frames += 1
+
+        return True
+
+    def _decode(self):
+        try:
+            buffer = self._free_buffers.get_nowait()
+        except queue.Empty:
+            buffer = None
+
+        ret_val, img = self._cap.read(buffer)
         if not ret_val:
             return None
+
+        self._next_index += 1
+        self.decoded_frames += 1
+
+        return img
+
+    def _put(self, item):
+        # The end of stream marker (None) always waits for the reader to take the last frame, also in RealTime
+        if self._mode == ReplayMode.RealTime and item is not None:
+            # Drop the frame nobody took, like the camera sink does
+            try:
+                self._frames.get_nowait()
+                self.dropped_frames += 1
+            except queue.Empty:
+                pass
+            self._frames.put(item)
+            return
+
+        while self._running:
+            try:
+                self._frames.put(item, timeout=self.ReadTimeOut)
+                return
+            except queue.Full:
+                pass
+
+    def _flush(self):
+        while True:
+            try:
+                self._frames.get_nowait()
+            except queue.Empty:
+                return
+
+    def _prefetch(self):
+        wall_start = clip_start = None
+        tick = 0
+        generation = 0
+
+        while self._running:
+            with self._seek_lock:
+                seek_time, self._seek_time = self._seek_time, None
+                generation = self._seek_generation
+
+            if seek_time is not None:
+                self._flush()
+                wall_start = time.monotonic()
+                clip_start = seek_time
+                tick = 0
+                index = int(round(seek_time * self._clip_fps))
+            elif self._mode == ReplayMode.RealTime:
+                # The frame the camera would capture on this tick, and the time it would capture it
+                tick += 1
+                index = int(round((clip_start + tick / self._capture_fps) * self._clip_fps))
+                wait_time = wall_start + tick / self._capture_fps - time.monotonic()
+                if wait_time > 0:
+                    time.sleep(wait_time)
+            else:
+                index = self._next_index
+
+            frame_time = index / self._clip_fps
+            if (self._end_time is not None and frame_time > self._end_time) or not self._skip_to(index):
+                break
+
+            img = self._decode()
+            if img is None:
+                break
+
+            self._put((img, frame_time, generation))
+
+        self._put(None)
+
+    def _next_frame(self):
+        if self._end_of_stream:
+            return None
+
+        while True:
+            try:
+                item = self._frames.get(timeout=self.ReadTimeOut)
+            except queue.Empty:
+                return None
+
+            if item is None:
+                self._end_of_stream = True
+                return None
+
+            img, frame_time, generation = item
+            if generation == self._seek_generation:
+                self.frame_time = frame_time
+                return img
+
+    def read_frame(self,  show_preview=False):
+        img = self._next_frame()
+        if img is None:
+            return None
         if show_preview:
             cv2.imshow("preview", img)
             cv2.waitKey(1)
-        
+
         return img
-        
+
+    def read_frame_into(self, out):
+        img = self._next_frame()
+        if img is None:
+            return None
+
+        np.copyto(out, img)
+        # The decoded frame is not handed out, decode into it again
+        self._free_buffers.put(img)
+
+        return out
+
+    def stop(self):
+        self._running = False
+        self._flush()
+        self._thread.join()
+        self._cap.release()
@@ -1,4 +1,5 @@
 import abc
+import numpy as np
 
 
 class VideoReader(metaclass=abc.ABCMeta):
@@ -6,3 +7,30 @@ class VideoReader(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def read_frame(self):
         """ required method """
+
+    def read_frame_into(self, out):
+        """ Read the next frame into the preallocated out buffer. Returns out, or None if there is no frame.
+            Readers which can decode straight into out override this to avoid the copy """
+        img = self.read_frame()
+
+        if img is None:
+            return None
+
+        np.copyto(out, img)
+
+        return out
+
+    def frame_variants(self):
+        """ (width, height, color) of the extra images the source delivers with every frame, e.g. scaled and
+            converted by the camera pipeline. See FramePacket for the colors """
+        return []
+
+    def read_variants_into(self, outs):
+        """ Read the variants of the frame last read into the preallocated outs, a dict keyed like
+            frame_variants(). Returns a dict of the variants of that frame, the images being those of outs when
+            given, which lacks the variants the source lost for this frame. None if there is no frame """
+        return outs
+
+    def read_variants(self):
+        """ The variants of the frame last returned, as a dict keyed like frame_variants() """
+        return {}
@@ -3,11 +3,22 @@ from jetcam.usb_camera import USBCamera
 from PIL import Image
 import time
 import numpy as np
+import cv2
+
+try:
+    from jetcam.multi_sink_camera import MultiSinkCamera, CameraSink
+except (ImportError, ValueError):
+    MultiSinkCamera = None
 
 class VideoUSBReader(VideoReader):
 
     def __init__(self):
-        self._camera = USBCamera(width=224, height=224, capture_width=640, capture_height=480, capture_fps=30, capture_device=0)
+        if MultiSinkCamera is not None:
+            # GStreamer scales the frames, USBCamera would resize every frame on the CPU
+            self._camera = MultiSinkCamera([CameraSink("frame", 224, 224, "bgr")], source="usb", capture_width=640,
+                                           capture_height=480, capture_fps=30, capture_device=0)
+        else:
+            self._camera = USBCamera(width=224, height=224, capture_width=640, capture_height=480, capture_fps=30, capture_device=0)
 
     def read_frame(self,  show_preview=False):
         img = self._camera.read()
@@ -20,3 +31,6 @@ class VideoUSBReader(VideoReader):
             cv2.waitKey(1)
 
         return img
+
+    def read_frame_into(self, out):
+        return self._camera.read_into(out)
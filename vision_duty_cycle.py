@@ -0,0 +1,58 @@
+import time
+
+from brain_state import BrainState
+from motion_detector import MotionDetector
+from const import Const
+
+
+class VisionDutyCycle(object):
+    # Gate the expensive detectors while the bot is idle and the scene is still.
+    # Every brain state has a frame rate (None for the full capture rate). While Idle with nobody in view and
+    # no motion, the vision loop only runs the motion detector at the idle rate. Motion wakes it up at once
+    StateFPS = {BrainState.Idle: 2,
+                BrainState.Engaging: None,
+                BrainState.Conversing: None}
+
+    # Keep running at full rate for a while after the last motion
+    MotionHoldTime = 3.0
+
+    def __init__(self):
+        self._motion_detector = MotionDetector()
+        self._brain_state = BrainState.Idle
+        self._last_motion_time = None
+
+        self.active = True
+        self.active_ticks = 0
+        self.gated_ticks = 0
+
+    def set_brain_state(self, brain_state):
+        self._brain_state = brain_state
+
+    def update(self, image, people_in_view, now=None):
+        # Returns True when the detectors should run on this frame
+        if now is None:
+            now = time.monotonic()
+
+        if self._motion_detector.update(image):
+            self._last_motion_time = now
+
+        recent_motion = self._last_motion_time is not None and now - self._last_motion_time < self.MotionHoldTime
+        state_fps = self.StateFPS.get(self._brain_state)
+
+        self.active = state_fps is None or people_in_view or recent_motion
+
+        if self.active:
+            self.active_ticks += 1
+        else:
+            self.gated_ticks += 1
+
+        return self.active
+
+    def frame_interval(self):
+        # Minimum time between frames for the current state, 0 for the full capture rate
+        state_fps = self.StateFPS.get(self._brain_state)
+
+        if self.active or state_fps is None:
+            return 0.0
+
+        return 1.0 / min(state_fps, Const.CaptureFPS)
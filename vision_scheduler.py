@@ -0,0 +1,154 @@
+import time
+from collections import deque
+
+from const import Const
+
+
+class VisionStage(object):
+    ObjectDetection = "ObjectDetection"
+    FaceDetection = "FaceDetection"
+    FaceEncoding = "FaceEncoding"
+
+
+class ScheduleDecision(object):
+
+    def __init__(self, timestamp, stages, budget, estimated_cost, reasons):
+        self.timestamp = timestamp
+        self.stages = stages
+        self.budget = budget
+        self.estimated_cost = estimated_cost
+        self.reasons = reasons
+
+    def runs(self, stage):
+        return stage in self.stages
+
+    def toJson(self):
+        return {"timestamp": self.timestamp,
+                "stages": list(self.stages),
+                "budget": self.budget,
+                "estimated_cost": self.estimated_cost,
+                "reasons": dict(self.reasons)}
+
+
+class VisionScheduler(object):
+    # Decide every tick which vision stages to run so the loop stays within its target period.
+    # Keeps moving average costs of every stage, and runs the most overdue stages that fit in the budget
+    SmoothingFactor = 0.2
+
+    # Initial cost guesses in seconds, replaced by measurements as soon as the stages run
+    DefaultCosts = {VisionStage.ObjectDetection: 0.05,
+                    VisionStage.FaceDetection: 0.15,
+                    VisionStage.FaceEncoding: 0.05}
+
+    # How often we would like to run each stage (seconds), and when it is urgent
+    ObjectDetectionInterval = 0.2
+    ObjectDetectionFastInterval = 0.0       # Every tick while the tracked box moves fast
+    FaceInterval = 1.0
+    FaceUnknownPersonInterval = 0.0         # As often as possible while an unknown person is engaged
+
+    # A stage which has not run for this long runs even if it blows the budget
+    MaxStaleness = {VisionStage.ObjectDetection: 0.5,
+                    VisionStage.FaceDetection: 3.0}
+
+    # Tracked box center speed (normalised units per second) above which the person is moving fast
+    FastMovementSpeed = 0.3
+
+    MaxDecisionHistory = 200
+
+    def __init__(self, target_period=1.0 / Const.CaptureFPS):
+        self.target_period = target_period
+
+        self._costs = dict(self.DefaultCosts)
+        self._overhead = 0.0
+        self._last_run = {VisionStage.ObjectDetection: None, VisionStage.FaceDetection: None}
+        self._decisions = deque(maxlen=self.MaxDecisionHistory)
+
+    def _smooth(self, old, new):
+        return old + self.SmoothingFactor * (new - old)
+
+    def record(self, stage, duration):
+        # Feed a measured stage duration in seconds
+        self._costs[stage] = self._smooth(self._costs[stage], duration)
+
+    def record_overhead(self, duration):
+        # Feed the per tick cost of everything that is not a scheduled stage (capture, bookkeeping, ...)
+        self._overhead = self._smooth(self._overhead, duration)
+
+    def cost(self, stage):
+        return self._costs[stage]
+
+    def costs(self):
+        return dict(self._costs)
+
+    def face_cost(self, num_faces=1):
+        return self._costs[VisionStage.FaceDetection] + self._costs[VisionStage.FaceEncoding] * max(1, num_faces)
+
+    def plan(self, unknown_person_engaged=False, movement_speed=0.0, face_offloaded=False, face_busy=False,
+             num_faces=1, now=None):
+        # Return a ScheduleDecision for this tick.
+        # face_offloaded: the face stages run outside of this loop (worker), so they do not use the loop budget
+        # face_busy: the face worker is still processing, running face detection now would only queue a frame
+        if now is None:
+            now = time.monotonic()
+
+        budget = max(0.0, self.target_period - self._overhead)
+
+        od_interval = self.ObjectDetectionInterval
+        if movement_speed >= self.FastMovementSpeed:
+            od_interval = self.ObjectDetectionFastInterval
+
+        face_interval = self.FaceInterval
+        if unknown_person_engaged:
+            face_interval = self.FaceUnknownPersonInterval
+
+        candidates = []
+        reasons = {}
+
+        for stage, interval, cost in [(VisionStage.ObjectDetection, od_interval,
+                                       self._costs[VisionStage.ObjectDetection]),
+                                      (VisionStage.FaceDetection, face_interval,
+                                       0.0 if face_offloaded else self.face_cost(num_faces))]:
+            if stage == VisionStage.FaceDetection and face_busy:
+                reasons[stage] = "busy"
+                continue
+
+            last_run = self._last_run[stage]
+            age = float("inf") if last_run is None else now - last_run
+
+            # Allow half a tick of jitter so an interval of n ticks really runs every n ticks
+            if age < interval - self.target_period / 2:
+                reasons[stage] = "not due"
+                continue
+
+            # The most overdue stage (relative to its interval) goes first
+            urgency = age / max(interval, self.target_period)
+            candidates.append((urgency, stage, cost, age >= self.MaxStaleness[stage]))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+
+        stages = []
+        estimated_cost = 0.0
+        for urgency, stage, cost, is_stale in candidates:
+            if estimated_cost + cost <= budget:
+                reasons[stage] = "due"
+            elif is_stale:
+                reasons[stage] = "stale"
+            elif len(stages) == 0 and estimated_cost == 0.0 and cost > budget:
+                # A stage which can never fit the budget still runs when it is due and nothing else runs
+                reasons[stage] = "over budget"
+            else:
+                reasons[stage] = "no budget"
+                continue
+
+            stages.append(stage)
+            estimated_cost += cost
+            self._last_run[stage] = now
+
+        decision = ScheduleDecision(now, stages, budget, estimated_cost, reasons)
+        self._decisions.append(decision)
+
+        return decision
+
+    def decisions(self):
+        # Recent decisions, oldest first
+        return list(self._decisions)